@@ -4,7 +4,7 @@ from data_cleaning import safe_numeric_conversion
 import calendar
 from dateutil import parser
 import numpy as np
-from statsmodels.tsa.holtwinters import ExponentialSmoothing
+from profiling import profiled
 
 def group_data(df, group_by_columns, aggregation_rules=None):
     """
@@ -27,13 +27,14 @@ def group_data(df, group_by_columns, aggregation_rules=None):
         aggregation_rules = {'__count__': 'size'}
     
     try:
-        grouped_df = df.groupby(group_by_columns).agg(aggregation_rules).reset_index()
+        grouped_df = df.groupby(group_by_columns, observed=True).agg(aggregation_rules).reset_index()
         return grouped_df
     except Exception as e:
         st.error(f"Error during grouping: {str(e)}")
         return df
 
 
+@profiled()
 def perform_cluster_analysis(df, cluster_col, analysis_type, target_col=None, group_by_col=None, selected_clusters=None):
     """Perform various types of analysis on clustered data"""
     
@@ -52,16 +53,16 @@ def perform_cluster_analysis(df, cluster_col, analysis_type, target_col=None, gr
     try:
         if analysis_type == "cluster_summary":
             # Basic cluster summary
-            result = df_filtered.groupby(cluster_col).agg({
+            result = df_filtered.groupby(cluster_col, observed=True).agg({
                 cluster_col: 'count'
             }).rename(columns={cluster_col: 'Total_Records'})
             
             if target_col and target_col in df_filtered.columns:
                 numeric_data = safe_numeric_conversion(df_filtered[target_col])
-                df_temp = df_filtered.copy()
+                df_temp = df_filtered.copy(deep=False)
                 df_temp[f'{target_col}_numeric'] = numeric_data
                 
-                summary = df_temp.groupby(cluster_col)[f'{target_col}_numeric'].agg([
+                summary = df_temp.groupby(cluster_col, observed=True)[f'{target_col}_numeric'].agg([
                     'sum', 'mean', 'count'
                 ]).round(2)
                 summary.columns = [f'{target_col}_Total', f'{target_col}_Average', f'{target_col}_Count']
@@ -75,10 +76,10 @@ def perform_cluster_analysis(df, cluster_col, analysis_type, target_col=None, gr
                 return None, "Target column required for top clusters analysis"
             
             numeric_data = safe_numeric_conversion(df_filtered[target_col])
-            df_temp = df_filtered.copy()
+            df_temp = df_filtered.copy(deep=False)
             df_temp[f'{target_col}_numeric'] = numeric_data
             
-            result = df_temp.groupby(cluster_col)[f'{target_col}_numeric'].sum().sort_values(ascending=False).head(10)
+            result = df_temp.groupby(cluster_col, observed=True)[f'{target_col}_numeric'].sum().sort_values(ascending=False).head(10)
             result = result.to_frame(f'Total_{target_col}')
             
             return result, "Top clusters analysis completed"
@@ -89,12 +90,12 @@ def perform_cluster_analysis(df, cluster_col, analysis_type, target_col=None, gr
             
             if target_col and target_col in df_filtered.columns:
                 numeric_data = safe_numeric_conversion(df_filtered[target_col])
-                df_temp = df_filtered.copy()
+                df_temp = df_filtered.copy(deep=False)
                 df_temp[f'{target_col}_numeric'] = numeric_data
                 
-                result = df_temp.groupby([cluster_col, group_by_col])[f'{target_col}_numeric'].sum().unstack(fill_value=0)
+                result = df_temp.groupby([cluster_col, group_by_col], observed=True)[f'{target_col}_numeric'].sum().unstack(fill_value=0)
             else:
-                result = df_filtered.groupby([cluster_col, group_by_col]).size().unstack(fill_value=0)
+                result = df_filtered.groupby([cluster_col, group_by_col], observed=True).size().unstack(fill_value=0)
             
             return result, "Categorical analysis completed"
         
@@ -107,16 +108,16 @@ def perform_cluster_analysis(df, cluster_col, analysis_type, target_col=None, gr
             for cluster in df_filtered[cluster_col].unique():
                 cluster_data = df_filtered[df_filtered[cluster_col] == cluster]
                 
-                breakdown = cluster_data.groupby(group_by_col).agg({
+                breakdown = cluster_data.groupby(group_by_col, observed=True).agg({
                     cluster_col: 'count'
                 }).rename(columns={cluster_col: 'Record_Count'})
                 
                 if target_col and target_col in df_filtered.columns:
                     numeric_data = safe_numeric_conversion(cluster_data[target_col])
-                    cluster_data_temp = cluster_data.copy()
+                    cluster_data_temp = cluster_data.copy(deep=False)
                     cluster_data_temp[f'{target_col}_numeric'] = numeric_data
                     
-                    summary = cluster_data_temp.groupby(group_by_col)[f'{target_col}_numeric'].sum()
+                    summary = cluster_data_temp.groupby(group_by_col, observed=True)[f'{target_col}_numeric'].sum()
                     breakdown[f'Total_{target_col}'] = summary
                 
                 breakdown['Cluster'] = cluster
@@ -145,16 +146,16 @@ def filter_trade_data(df, trade_type_col, country_col, supplier_col,
     st.write(f"- Supplier Country: `{selected_supplier}`")
 
     if selected_trade_type and trade_type_col in df.columns:
-        df = df[df[trade_type_col].astype(str).apply(normalize) == normalize(selected_trade_type)]
+        df = df[df[trade_type_col].astype(object).astype(str).apply(normalize) == normalize(selected_trade_type)]
     if selected_country and country_col in df.columns:
         if "All" not in selected_country:
             normalized_selected = set(normalize(val) for val in selected_country)
-            df = df[df[country_col].astype(str).apply(normalize).isin(normalized_selected)]
+            df = df[df[country_col].astype(object).astype(str).apply(normalize).isin(normalized_selected)]
 
     if selected_supplier and supplier_col in df.columns:
         if "All" not in selected_supplier:
             normalized_suppliers = set(normalize(val) for val in selected_supplier)
-            df = df[df[supplier_col].astype(str).apply(normalize).isin(normalized_suppliers)]
+            df = df[df[supplier_col].astype(object).astype(str).apply(normalize).isin(normalized_suppliers)]
 
 
     st.success(f"Filtered data shape: {df.shape}")
@@ -163,22 +164,23 @@ def filter_trade_data(df, trade_type_col, country_col, supplier_col,
 import pandas as pd
 import numpy as np
 
+@profiled()
 def perform_trade_analysis(df, product_col, quantity_col, value_col, importer_col, supplier_col):
     results = {}
 
     try:
         # 1. Which importer country is importing the most from a particular supplier country for the selected product?
-        most_importing = df.groupby([importer_col, supplier_col])[value_col].sum().reset_index()
+        most_importing = df.groupby([importer_col, supplier_col], observed=True)[value_col].sum().reset_index()
         most_importing = most_importing.sort_values(by=value_col, ascending=False).head(10)
         results["1. Top Importer-Supplier Combinations"] = most_importing
 
         # 2. What are the top countries exporting for a given product?
-        top_exporting = df.groupby(supplier_col)[value_col].sum().reset_index()
+        top_exporting = df.groupby(supplier_col, observed=True)[value_col].sum().reset_index()
         top_exporting = top_exporting.sort_values(by=value_col, ascending=False).head(10)
         results["2. Top Exporting Countries"] = top_exporting
 
         # 3. What are the top importing cities/states for a given product from a supplier country?
-        top_importing_cities = df.groupby([importer_col, supplier_col])[value_col].sum().reset_index()
+        top_importing_cities = df.groupby([importer_col, supplier_col], observed=True)[value_col].sum().reset_index()
         top_importing_cities = top_importing_cities.sort_values(by=value_col, ascending=False).head(10)
         results["3. Top Importing Cities/States by Supplier"] = top_importing_cities
 
@@ -189,7 +191,7 @@ def perform_trade_analysis(df, product_col, quantity_col, value_col, importer_co
         results["4. Export Dominance Share"] = dominant_export
 
         # 5. Which supplier country is sending the highest value of the product to particular importer country/city?
-        top_supplier_to_importer = df.groupby([supplier_col, importer_col])[value_col].sum().reset_index()
+        top_supplier_to_importer = df.groupby([supplier_col, importer_col], observed=True)[value_col].sum().reset_index()
         top_supplier_to_importer = top_supplier_to_importer.sort_values(by=value_col, ascending=False).head(10)
         results["5. Highest Supplier to Importer Values"] = top_supplier_to_importer
 
@@ -213,14 +215,14 @@ def perform_trade_analysis(df, product_col, quantity_col, value_col, importer_co
 
         # 7. Which supplier country is giving the lowest/highest average value per unit to an importer country?
         df["Unit_Value"] = df[value_col] / df[quantity_col].replace(0, np.nan)
-        avg_unit_value = df.groupby([supplier_col, importer_col])["Unit_Value"].mean().reset_index()
+        avg_unit_value = df.groupby([supplier_col, importer_col], observed=True)["Unit_Value"].mean().reset_index()
         highest_avg = avg_unit_value.sort_values(by="Unit_Value", ascending=False).head(5)
         lowest_avg = avg_unit_value.sort_values(by="Unit_Value", ascending=True).head(5)
         results["7A. Highest Avg Value per Unit"] = highest_avg
         results["7B. Lowest Avg Value per Unit"] = lowest_avg
 
         # 8. Heatmap: For selected item+HSCode, which importer/supplier pairs show highest trade value
-        heatmap_data = df.groupby([importer_col, supplier_col])[value_col].sum().reset_index()
+        heatmap_data = df.groupby([importer_col, supplier_col], observed=True)[value_col].sum().reset_index()
         heatmap_pivot = heatmap_data.pivot(index=importer_col, columns=supplier_col, values=value_col).fillna(0)
         results["8. Importer-Supplier Heatmap Data"] = heatmap_pivot
 
@@ -230,59 +232,6 @@ def perform_trade_analysis(df, product_col, quantity_col, value_col, importer_co
     return results
 
 
-def analyze_trend(df, trade_type, product_name, selected_years):
-    """
-    Analyze trend in trade value for a selected product across years.
-    """
-    try:
-        if "item_description" not in df.columns or "cth_hscode" not in df.columns:
-            return ""
-
-        if "year_extracted" in df.columns:
-            year_col = "year_extracted"
-        elif "year" in df.columns:
-            year_col = "year"
-        elif "Month" in df.columns:
-            df["year_temp"] = pd.to_datetime(df["Month"], errors="coerce").dt.year
-            year_col = "year_temp"
-        else:
-            return ""
-
-        item_col = "item_description"
-        trade_col = "Type"
-        value_col = df.select_dtypes(include="number").columns[0]
-
-        filtered = df[
-            (df[trade_col].str.lower() == trade_type.lower())
-            & (df[item_col].str.lower() == product_name.lower())
-            & (df[year_col].isin(selected_years))
-        ]
-
-        if filtered.empty or len(filtered[year_col].unique()) < 2:
-            return ""
-
-        trend = filtered.groupby(year_col)[value_col].sum().reset_index()
-        trend = trend.sort_values(by=year_col)
-
-        y1, y2 = trend.iloc[0][year_col], trend.iloc[-1][year_col]
-        v1, v2 = trend.iloc[0][value_col], trend.iloc[-1][value_col]
-
-        if v2 > v1:
-            status = "increased"
-        elif v2 < v1:
-            status = "decreased"
-        else:
-            status = "remained constant"
-
-        change = v2 - v1
-        percent = (change / v1) * 100 if v1 != 0 else 0
-        return f"From {y1} to {y2}, the trade value has **{status}** from **{v1:,.0f}** to **{v2:,.0f}** (change: {percent:.2f}%)."
-
-    except Exception as e:
-        return f"Trend analysis failed: {e}"
-
-
-
 def get_fy(date):
     if pd.isnull(date): return None
     if date.month <= 3:
@@ -291,11 +240,12 @@ def get_fy(date):
         return f"FY {date.year}-{str(date.year + 1)[-2:]}"
 
 
+@profiled()
 def full_periodic_analysis(df, date_col, value_col):
     if date_col not in df.columns or value_col not in df.columns:
         return None, "Required columns not found"
 
-    df_clean = df.copy()
+    df_clean = df.copy(deep=False)
     df_clean["_numeric"] = safe_numeric_conversion(df_clean[value_col])
 
     df_clean["Parsed_Date"] = pd.to_datetime(df_clean[date_col], errors="coerce")
@@ -319,21 +269,125 @@ def full_periodic_analysis(df, date_col, value_col):
     }," All time-based averages computed"
 
 
-def analyze_trend(df, trade_type, product_name, selected_years):
-    df_filtered = df[
-        (df["Type"] == trade_type) &
-        (df["Item_Description_cluster"] == product_name) &
-        (df["YEAR"].isin(selected_years))
-    ]
+TREND_KEYS = ["CTH_HSCODE", "Item_Description_cluster", "Type"]
+
+
+def _pct_change(current, previous):
+    """Percentage change that yields NaN instead of inf when the base is zero."""
+    previous = previous.replace(0, np.nan)
+    return (current - previous) / previous * 100
 
+
+@profiled()
+def build_trend_table(df, value_col="Quantity", date_col="Month", key_cols=None):
+    """
+    Compute trend tables for every (HS code, item cluster, trade type) in one grouped pass.
+
+    Args:
+        df: DataFrame with the key columns, a date column and a value column
+        value_col: Numeric column to aggregate
+        date_col: Column holding the month of each record
+        key_cols: Grouping keys, defaults to TREND_KEYS (missing keys are skipped)
+
+    Returns:
+        Dictionary with "Monthly", "Quarterly", "Yearly" and "Growth" DataFrames.
+        Quarterly rows carry QoQ deltas, yearly rows YoY deltas, and "Growth"
+        holds first/last year totals, % change and CAGR per key.
+    """
+    key_cols = [col for col in (key_cols or TREND_KEYS) if col in df.columns]
+
+    # Parse dates once without touching the caller's frame
+    dates = pd.to_datetime(df[date_col], errors="coerce")
+    base = df[key_cols].copy()
+    base["year"] = dates.dt.year
+    base["month_num"] = dates.dt.month
+    base[value_col] = pd.to_numeric(df[value_col], errors="coerce").fillna(0)
+    base = base.dropna(subset=["year"])
+    base["year"] = base["year"].astype(int)
+    base["month_num"] = base["month_num"].astype(int)
+
+    # Single pass over the rows; coarser levels are rolled up from the monthly sums
+    monthly = base.groupby(key_cols + ["year", "month_num"], dropna=False, observed=True)[value_col].sum().reset_index()
+    monthly["quarter"] = (monthly["month_num"] - 1) // 3 + 1
+
+    quarterly = monthly.groupby(key_cols + ["year", "quarter"], dropna=False, observed=True)[value_col].sum().reset_index()
+    quarterly["_period"] = quarterly["year"] * 4 + quarterly["quarter"] - 1
+    previous_q = quarterly[key_cols + ["_period", value_col]].copy()
+    previous_q["_period"] += 1
+    quarterly = quarterly.merge(
+        previous_q.rename(columns={value_col: "Previous"}), on=key_cols + ["_period"], how="left"
+    )
+    quarterly["QoQ Change"] = quarterly[value_col] - quarterly["Previous"]
+    quarterly["QoQ % Change"] = _pct_change(quarterly[value_col], quarterly["Previous"])
+    quarterly = quarterly.drop(columns=["_period", "Previous"])
+
+    yearly = quarterly.groupby(key_cols + ["year"], dropna=False, observed=True)[value_col].sum().reset_index()
+    previous_y = yearly[key_cols + ["year", value_col]].copy()
+    previous_y["year"] += 1
+    yearly = yearly.merge(
+        previous_y.rename(columns={value_col: "Previous"}), on=key_cols + ["year"], how="left"
+    )
+    yearly["YoY Change"] = yearly[value_col] - yearly["Previous"]
+    yearly["YoY % Change"] = _pct_change(yearly[value_col], yearly["Previous"])
+    yearly = yearly.drop(columns=["Previous"])
+
+    # Growth summary: first vs last observed year per key
+    ordered = yearly.sort_values(key_cols + ["year"])
+    grouped = ordered.groupby(key_cols, dropna=False, observed=True)
+    growth = pd.DataFrame({
+        "First Year": grouped["year"].first(),
+        "Last Year": grouped["year"].last(),
+        "First Value": grouped[value_col].first(),
+        "Last Value": grouped[value_col].last(),
+    })
+    growth["Change"] = growth["Last Value"] - growth["First Value"]
+    growth["% Change"] = _pct_change(growth["Last Value"], growth["First Value"])
+    span = (growth["Last Year"] - growth["First Year"]).replace(0, np.nan)
+    ratio = growth["Last Value"] / growth["First Value"].where(growth["First Value"] > 0)
+    growth["CAGR %"] = (ratio.where(ratio > 0) ** (1 / span) - 1) * 100
+    growth = growth.reset_index().sort_values("CAGR %", ascending=False, na_position="last")
+
+    return {
+        "Monthly": monthly,
+        "Quarterly": quarterly,
+        "Yearly": yearly,
+        "Growth": growth.reset_index(drop=True),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def _cached_trend_table(_df, value_col, date_col, key_cols, version):
+    return build_trend_table(_df, value_col=value_col, date_col=date_col, key_cols=key_cols)
+
+
+def get_trend_table(df, value_col="Quantity", date_col="Month", key_cols=None, version=None):
+    """
+    Cached build_trend_table so repeated views are lookups instead of rescans.
+
+    The cache is keyed on version, the dataset-store key of df (see
+    dataset_store.session_version). Without one the full content hash of df
+    is used; Streamlit's own argument hashing only samples large frames.
+    """
+    if version is None:
+        from pipeline import frame_fingerprint
+
+        version = frame_fingerprint(df)
+    return _cached_trend_table(df, value_col, date_col, tuple(key_cols) if key_cols else key_cols, version)
+
+
+def analyze_trend(df, trade_type, product_name, selected_years, value_col="Quantity", date_col="Month"):
     if len(selected_years) < 2:
         return "Please select at least two years to perform trend analysis."
 
+    yearly = get_trend_table(df, value_col=value_col, date_col=date_col)["Yearly"]
+    yearly = yearly[(yearly["Type"] == trade_type) & (yearly["Item_Description_cluster"] == product_name)]
+    totals = yearly.groupby("year")[value_col].sum()
+
     years_sorted = sorted(selected_years)
     year1, year2 = years_sorted[0], years_sorted[-1]
 
-    q1 = df_filtered[df_filtered["YEAR"] == year1]["Quantity"].sum()
-    q2 = df_filtered[df_filtered["YEAR"] == year2]["Quantity"].sum()
+    q1 = totals.get(int(year1), 0)
+    q2 = totals.get(int(year2), 0)
     diff = q2 - q1
 
     trend = "increased" if diff > 0 else "decreased"
@@ -349,18 +403,10 @@ def analyze_trend(df, trade_type, product_name, selected_years):
 
 
 def comparative_analysis(df, selected_years, time_period_type, selected_quarter_or_month, selected_hscode, selected_item, quantity_col='Quantity', month_col='Month'):
-    import pandas as pd
-
-    # Convert "Month" column to datetime
-    df[month_col] = pd.to_datetime(df[month_col], errors='coerce')
-
-    # Extract year and month/quarter
-    df['year'] = df[month_col].dt.year
-    df['month_num'] = df[month_col].dt.month
-    df['quarter'] = df[month_col].dt.quarter
+    monthly = get_trend_table(df, value_col=quantity_col, date_col=month_col)["Monthly"]
 
     # Step 1: Filter by selected years
-    df_filtered = df[df['year'].isin(selected_years)]
+    df_filtered = monthly[monthly['year'].isin(selected_years)]
 
     # Step 2: Filter by time period
     if time_period_type.lower() == 'quarter':
@@ -377,7 +423,7 @@ def comparative_analysis(df, selected_years, time_period_type, selected_quarter_
     # Step 3: Filter by HS Code and Item Description
     df_filtered = df_filtered[
         (df_filtered['CTH_HSCODE'] == selected_hscode) &
-        (df_filtered['Item_Description_Cluster'] == selected_item)
+        (df_filtered['Item_Description_cluster'] == selected_item)
     ]
 
     # Step 4: Aggregate quantities by year
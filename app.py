@@ -1,10 +1,9 @@
 import streamlit as st
 import pandas as pd
 from io import BytesIO
-import plotly.express as px
-import matplotlib.pyplot as plt
-import seaborn as sns
 # Import from modularized files
+# Heavy modules (forecasting, backtesting, export_excel, matplotlib/seaborn)
+# are imported inside the sections that use them to keep cold start fast.
 from data_cleaning import (
     detect_string_columns, 
     detect_numeric_columns, 
@@ -22,7 +21,9 @@ from data_cleaning import (
     cluster_supplier_names,
     cluster_location_column,
     clean_location_name,
-    detect_categorical_columns
+    detect_categorical_columns,
+    compact_categoricals,
+    default_dedup_mode
 )
 
 from clustering import (
@@ -38,14 +39,52 @@ from analysis import (
     analyze_trend,
     comparative_analysis,
     perform_trade_analysis,
-    analyze_trend
+    get_trend_table
 )
 
-from export_excel import (
-    create_colored_excel
-)
+from timeseries import get_series_store
+
+from hs_index import get_hs_index, render_hs_drilldown
+
+from export_formats import render_download
+
+from profiling import Profiler, render_timing_panel
+
+from dataset_memory import enable_copy_on_write, render_memory_panel
+
+from dataset_store import dataset_store, session_frame, session_version
+
+from ingest_cache import ingest_cache, processed_key, upload_key
+
+from pipeline import cleaning_config, run_cleaning_job
+
+from jobs import job_runner, render_job_progress
 
-from forecasting import forecast_item
+# Pipeline versions share unchanged columns instead of holding full copies;
+# convert_to_kg's in-place writes then copy only the columns they touch.
+enable_copy_on_write()
+
+
+def load_processed(cache_key, df):
+    """Put an upload processed earlier with the same settings into session state; False on a miss."""
+    cached = ingest_cache.get(cache_key)
+    if cached is None:
+        return False
+    st.session_state["processed_key"] = cache_key
+    st.session_state["df_cleaned"] = dataset_store.share(f"{cache_key}/cleaned", lambda: drop_unwanted_columns(df))
+    st.session_state["df_final"] = dataset_store.share(f"{cache_key}/final", cached["df_final"])
+    st.session_state["converted_rows"] = cached["meta"].get("converted_rows", [])
+    st.session_state["deleted_rows"] = cached["meta"].get("deleted_rows", [])
+    st.session_state["dedup_report"] = cached["meta"].get("dedup_report")
+    st.session_state.pop("df_clustered", None)
+    if cached["df_clustered"] is not None:
+        cluster_column = cached["meta"]["cluster_column_name"]
+        st.session_state["df_clustered"] = dataset_store.share(
+            f"{cache_key}/clustered/{cluster_column}", cached["df_clustered"]
+        )
+        st.session_state["cluster_column_name"] = cluster_column
+    st.session_state["ingest_cache_hit"] = True
+    return True
 
 # App Title
 st.title("Automatic String Column Standardizer with Clustering")
@@ -54,17 +93,25 @@ st.title("Automatic String Column Standardizer with Clustering")
 if 'df_original' not in st.session_state:
     uploaded_file = st.file_uploader("Upload your CSV file", type=["csv"])
     if uploaded_file:
-        try:
-            df = pd.read_csv(uploaded_file)
-        except UnicodeDecodeError:
-            uploaded_file.seek(0)
-            df = pd.read_csv(uploaded_file, encoding='ISO-8859-1')
-        
-        st.session_state['df_original'] = df
+        def read_upload():
+            try:
+                return pd.read_csv(uploaded_file)
+            except UnicodeDecodeError:
+                uploaded_file.seek(0)
+                return pd.read_csv(uploaded_file, encoding='ISO-8859-1')
+
+        # Same bytes and pipeline settings as an earlier upload: reuse its processed data
+        key = upload_key(uploaded_file.getvalue())
+        st.session_state["upload_key"] = key
+        # Sessions on the same file share one parsed copy instead of each holding their own
+        st.session_state['df_original'] = dataset_store.share(f"{key}/original", read_upload)
+        df = session_frame(st.session_state, 'df_original')
+        # The duplicate check starts on its default settings, so look for a run made with them
+        load_processed(processed_key(key, cleaning_config(df.columns)), df)
 
 # Show uploaded file sample
 if 'df_original' in st.session_state:
-    df = st.session_state['df_original']
+    df = session_frame(st.session_state, 'df_original')
     st.subheader("Original Data Sample")
     st.dataframe(df.head(10))
     
@@ -88,81 +135,102 @@ if 'df_original' in st.session_state:
 
 
 
-    if st.button("Clean Data Automatically"):
-        with st.spinner("Standardizing and converting..."):
-
-        # Drop unnecessary columns from original df
-            df_cleaned = drop_unwanted_columns(df)
-            st.session_state["df_cleaned"] = df_cleaned
-
-        # Detect standard columns (case-insensitive)
-            df_columns_lower = [col.lower() for col in df_cleaned.columns]
-            df_col_map = {col.lower(): col for col in df_cleaned.columns}
-
-            currency_col = df_col_map.get("invoice_currency")
-            unit_col = df_col_map.get("uqc")
-            quantity_col = df_col_map.get("quantity")
-            required_value_cols_lower = ["unit_price", "total_ass_value", "invoice_unit_price_fc"]
-            value_cols = [df_col_map[col] for col in required_value_cols_lower if col in df_col_map]
-
-        # Standardize strings
-            df_clean = standardize_dataframe(df_cleaned.copy(), detect_string_columns(df_cleaned))
-
-        # Convert units
-            df_weight, converted_rows, deleted_rows = convert_to_kg(df_clean, quantity_col, unit_col)
-
-        # Progress bar
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-
-            def progress_cb(p): progress_bar.progress(min(p, 1.0))
-            def status_cb(msg): status_text.text(msg)
-            def warning_cb(msg): st.warning(msg)
-            def success_cb(msg): st.success(msg)
-
-        # Currency conversion
-            df_final = convert_sheet_to_usd(
-            df_weight,
-            currency_col=currency_col,
-            value_cols=value_cols,
-            progress_callback=progress_cb,
-            status_callback=status_cb,
-            warning_callback=warning_cb,
-            success_callback=success_cb,
+    # Repeated shipments are dropped by default only when a BE number identifies them
+    clean_config = cleaning_config(df.columns)
+    with st.expander("Duplicate Shipment Check"):
+        dedup_keys = st.multiselect(
+            "Columns that identify a shipment", list(df.columns), default=clean_config["dedup_keys"], key="dedup_keys"
         )
-            df_final = convert_month_column_to_datetime(df_final)
-            supplier_column = df_col_map.get("supplier_name")  # Case-insensitive match
-            if supplier_column:
-                df_final = cluster_supplier_names(df_final, supplier_column=supplier_column)
-                st.success("Supplier names clustered successfully.")
-
-            importer_city_col = df_col_map.get("importer_city_state")
-            if importer_city_col:
-                df_final = cluster_location_column(df_final, column=importer_city_col)
-                st.success("Importer city-state values clustered successfully.")
-
-        # Store in session state
-            st.session_state["df_final"] = df_final
+        dedup_modes = {"drop": "Drop repeats (keep the first)", "flag": "Flag repeats in Is_Duplicate", "off": "Off"}
+        dedup_mode = st.selectbox(
+            "Repeated shipments",
+            list(dedup_modes),
+            index=list(dedup_modes).index(default_dedup_mode(dedup_keys)),
+            format_func=dedup_modes.get,
+            key="dedup_mode",
+        )
+        if dedup_mode == "drop" and default_dedup_mode(dedup_keys) == "flag":
+            st.warning("Without a BE number among the keys, genuine shipments with identical values will be dropped.")
+    clean_config.update(dedup_keys=dedup_keys, dedup_mode=dedup_mode)
+    clean_key = processed_key(st.session_state["upload_key"], clean_config) if "upload_key" in st.session_state else None
+
+    track_memory = st.checkbox("Track peak memory per stage (slower)", value=False, key="track_stage_memory")
+
+    # An earlier run with the same duplicate settings is loaded instead of cleaning again
+    if st.button("Clean Data Automatically") and not (clean_key and load_processed(clean_key, df)):
+        # Runs in the background; finished stages are checkpointed so a rerun resumes
+        st.session_state["clean_key"] = clean_key
+        st.session_state["clean_job"] = job_runner.submit(
+            "Standardizing and converting",
+            run_cleaning_job,
+            df,
+            clean_config,
+            raw_key=st.session_state.get("upload_key"),
+            track_memory=track_memory,
+        )
+
+    clean_job = job_runner.get(st.session_state.get("clean_job"))
+    if clean_job is not None and not clean_job.done:
+        render_job_progress(clean_job, key="clean_job")
+    elif clean_job is not None:
+        del st.session_state["clean_job"]
+        job_runner.forget(clean_job.id)
+        for message in clean_job.messages:
+            st.warning(message)
+
+        if clean_job.status == "failed":
+            st.error(f"Cleaning failed: {clean_job.error}")
+        elif clean_job.status == "cancelled":
+            st.warning("Cleaning was cancelled. Finished stages are kept, so the next run resumes from them.")
+        else:
+            results, stage_timings = clean_job.result
+            df_final = results["final"]
+            converted_rows, deleted_rows = results["converted_rows"], results["deleted_rows"]
+
+            # Store in session state, under the settings the job ran with
+            key = st.session_state.pop("clean_key", None)
+            st.session_state["processed_key"] = key
+            st.session_state["df_cleaned"] = dataset_store.share(key and f"{key}/cleaned", results["cleaned"])
+            st.session_state["df_final"] = dataset_store.share(key and f"{key}/final", df_final)
             st.session_state["converted_rows"] = converted_rows
             st.session_state["deleted_rows"] = deleted_rows
-            st.rerun()
+            st.session_state["stage_timings"] = stage_timings
+            st.session_state["dedup_report"] = results["dedup_report"]
+            st.session_state.pop("df_clustered", None)  # clustered from the previous cleaned data
+            if key:
+                ingest_cache.put(
+                    key, df_final,
+                    converted_rows=converted_rows, deleted_rows=deleted_rows,
+                    dedup_report=results["dedup_report"],
+                )
+            st.success(f"Cleaning finished in {clean_job.elapsed:.1f}s.")
 
 
 
 # Post-Standardization Pipeline
 if 'df_final' in st.session_state:
-    df_final = st.session_state["df_final"]
-    df_cleaned = st.session_state.get("df_cleaned", df_final)  # Fallback just in case
+    df_final = session_frame(st.session_state, "df_final")
+    df_cleaned = session_frame(st.session_state, "df_cleaned", df_final)  # Fallback just in case
+    if st.session_state.pop("ingest_cache_hit", False):
+        st.info("This file was processed before, so its cleaned data was loaded from the cache.")
+    dedup_report = st.session_state.get("dedup_report")
+    if dedup_report and dedup_report["mode"] == "off":
+        st.caption("Duplicate shipment check was off for this run.")
+    elif dedup_report:
+        action = "removed" if dedup_report["mode"] == "drop" else "flagged in Is_Duplicate"
+        st.info(
+            f"Duplicate shipment check (mode: {dedup_report['mode']}): {action} "
+            f"{dedup_report['duplicates']:,} of {dedup_report['rows']:,} rows, "
+            f"matched on {', '.join(dedup_report['key_columns']) or 'no columns'}. "
+            "Change the keys or mode under Duplicate Shipment Check and clean again."
+        )
     string_cols = detect_string_columns(df_cleaned)
 
    
-    csv_final = df_final.to_csv(index=False).encode("utf-8")
-    st.download_button(
-        "Download Final Cleaned + Converted CSV",
-        csv_final,
-        "final_output.csv",
-        "text/csv"
-    )
+    render_download(df_final, "Download Final Cleaned + Converted Data", "final_output", key="final_output",
+                    version=session_version(st.session_state, "df_final"))
+    render_timing_panel(st.session_state.get("stage_timings"))
+    render_memory_panel(st.session_state)
 
     # ------------------------ CLUSTERING ------------------------
     st.subheader("Product Name Clustering")
@@ -171,14 +239,19 @@ if 'df_final' in st.session_state:
     cluster_column = st.selectbox("Choose column to cluster:", string_cols, key="cluster_column")
 
     if st.button("Create Clusters"):
-        df_clustered = add_cluster_column(df_final.copy(), cluster_column)
-        st.session_state["df_clustered"] = df_clustered
+        with Profiler(st.session_state.get("track_stage_memory", False), st.session_state.setdefault("stage_timings", [])):
+            df_clustered = add_cluster_column(df_final, cluster_column)
+            df_clustered = compact_categoricals(df_clustered, columns=[f"{cluster_column}_cluster"])
+        key = st.session_state.get("processed_key")
+        st.session_state["df_clustered"] = dataset_store.share(key and f"{key}/clustered/{cluster_column}", df_clustered)
         st.session_state["cluster_column_name"] = cluster_column
+        if key:
+            ingest_cache.put_clustered(key, df_clustered, cluster_column)
         st.rerun()
 
 # Show clustering results
 if 'df_clustered' in st.session_state:
-    df_clustered = st.session_state["df_clustered"]
+    df_clustered = session_frame(st.session_state, "df_clustered")
     cluster_column = st.session_state["cluster_column_name"]
     cluster_col = f"{cluster_column}_cluster"
 
@@ -190,33 +263,68 @@ if 'df_clustered' in st.session_state:
     st.write(f"Total unique clusters: {len(cluster_counts)}")
     st.dataframe(cluster_counts.head(3).to_frame("Count"))
 
-    csv_clustered = df_clustered.to_csv(index=False).encode('utf-8')
-    st.download_button(
-        label="Download Data with Clusters (CSV)",
-        data=csv_clustered,
-        file_name="clustered_output.csv",
-        mime="text/csv"
-    )
+    render_download(df_clustered, "Download Data with Clusters", "clustered_output", key="clustered_output",
+                    version=session_version(st.session_state, "df_clustered"))
 
     # ------------------------ EXCEL EXPORT ------------------------
     st.subheader("Color-Coded Excel Export")
+    excel_fill_mode = st.selectbox(
+        "Coloring Mode",
+        ["cells", "rows", "banding", "conditional"],
+        format_func=lambda x: {
+            "cells": "Fill every cell by cluster",
+            "rows": "Row format per cluster (faster)",
+            "banding": "Alternate band per cluster group (fastest, 2 colors)",
+            "conditional": "Conditional formatting rules per cluster"
+        }[x],
+        key="excel_fill_mode"
+    )
+    excel_streaming = st.checkbox(
+        "Streaming export (constant memory, splits sheets past 1,048,576 rows)",
+        value=len(df_clustered) > 200_000,
+        key="excel_streaming"
+    )
     if st.button("Generate Color-Coded Excel", key="excel_export"):
         with st.spinner("Creating color-coded Excel file..."):
-            excel_data = create_colored_excel(df_clustered, cluster_column)
-            st.session_state['excel_data'] = excel_data
+            # The previous export's temp file is replaced by this one
+            previous_export = st.session_state.pop('excel_file', None)
+            if previous_export is not None:
+                previous_export.release()
+            if excel_streaming:
+                from export_excel import ExportFile, create_colored_excel_streaming
+
+                excel_progress = st.progress(0)
+                excel_status = st.empty()
+
+                def excel_progress_cb(fraction, message):
+                    excel_progress.progress(min(fraction, 1.0))
+                    excel_status.text(message)
+
+                excel_path = create_colored_excel_streaming(
+                    df_clustered, cluster_column, fill_mode=excel_fill_mode, progress_callback=excel_progress_cb
+                )
+                if excel_path is not None:
+                    st.session_state['excel_file'] = ExportFile(excel_path)
+                st.session_state.pop('excel_data', None)
+            else:
+                from export_excel import create_colored_excel
+
+                st.session_state['excel_data'] = create_colored_excel(df_clustered, cluster_column, fill_mode=excel_fill_mode)
             st.session_state['excel_ready'] = True
             st.success("Excel file generated successfully!")
 
-    if st.session_state.get('excel_ready', False):
+    if st.session_state.get('excel_ready', False) and ('excel_file' in st.session_state or 'excel_data' in st.session_state):
+        excel_file = st.session_state.get('excel_file')
         st.download_button(
             "Download Excel",
-            data=st.session_state['excel_data'],
+            # A streamed workbook is read from disk only when the button is clicked
+            data=excel_file.read if excel_file is not None else st.session_state['excel_data'],
             file_name="clustered_data_colored.xlsx",
             mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
         )
 # ------------------------ ANALYTICS ------------------------
 if 'df_clustered' in st.session_state:
-    df_clustered = st.session_state["df_clustered"]
+    df_clustered = session_frame(st.session_state, "df_clustered")
     cluster_col = f"{st.session_state['cluster_column_name']}_cluster"
   
     st.subheader("Data Analytics & Insights")
@@ -245,7 +353,7 @@ if 'df_clustered' in st.session_state:
         selected_supplier = st.multiselect("Filter by Supplier Country", ["All"] + supplier_options, default=["All"])
 
         # Apply Filters
-        df_filtered = df_clustered.copy()
+        df_filtered = df_clustered.copy(deep=False)
         df_filtered = df_filtered[df_filtered[trade_type_col].str.lower() == selected_trade_type.lower()]
         if "All" not in selected_importer:
             df_filtered = df_filtered[df_filtered[importer_country_col].str.lower().isin(selected_importer)]
@@ -281,18 +389,25 @@ if 'df_clustered' in st.session_state:
 
         # Step 8 & 9: HSCode and Item + HSCode
         selected_items = []
+        selected_cth = ["All"]
         if "cth_hscode" in columns_lower and "item_description" in columns_lower:
             cth_col = col_map["cth_hscode"]
             item_col = col_map["item_description"]
 
-            # Select HSCode first
-            cth_hscode_options = sorted(df_filtered[cth_col].dropna().astype(str).unique())
+            # Select HSCode first: drill down chapter -> tariff line, options and totals from the HS index
+            hs_index = get_hs_index(df_clustered, cth_col, version=session_version(st.session_state, "df_clustered"))
+            hs_prefix = render_hs_drilldown(hs_index, "trade_hs", subset=df_filtered)
+            cth_hscode_options = hs_index.codes_under(hs_prefix, subset=df_filtered)
             selected_cth = st.multiselect("Select HSCode(s)", ["All"] + cth_hscode_options, default=["All"])
             if "All" not in selected_cth:
-                df_filtered = df_filtered[df_filtered[cth_col].astype(str).isin(selected_cth)]
+                df_filtered = df_filtered[hs_index.mask(df_filtered, values=selected_cth)]
+            elif hs_prefix:
+                df_filtered = df_filtered[hs_index.mask(df_filtered, prefixes=[hs_prefix])]
+                selected_cth = cth_hscode_options
 
             # Combo: HSCode + Description
-            df_filtered["hs_desc_combo"] = df_filtered[cth_col].astype(str) + " : " + df_filtered[item_col].astype(str)
+            # Through object: astype(str) of an empty categorical fails under copy-on-write
+            df_filtered["hs_desc_combo"] = df_filtered[cth_col].astype(object).astype(str) + " : " + df_filtered[item_col].astype(object).astype(str)
             item_combo_options = sorted(df_filtered["hs_desc_combo"].dropna().unique())
             selected_combos = st.multiselect("Select Item Description + HSCode", ["All"] + item_combo_options, default=item_combo_options[:1])
 
@@ -306,10 +421,18 @@ if 'df_clustered' in st.session_state:
         st.subheader("Final Filtered Data")
         st.dataframe(df_filtered)
 
+        report_filters = {
+            "trade_type": selected_trade_type,
+            "importers": selected_importer,
+            "suppliers": selected_supplier,
+            "years": list(selected_years_int),
+            "hscodes": selected_cth,
+        }
+
 
         # ========== CUSTOM ANALYSIS ==========
         st.markdown("### Trade Summary Analysis")
-        string_cols = df_filtered.select_dtypes(include="object").columns.tolist()
+        string_cols = df_filtered.select_dtypes(include=["object", "category"]).columns.tolist()
         numeric_cols = df_filtered.select_dtypes(include="number").columns.tolist()
 
         if string_cols and numeric_cols:
@@ -320,17 +443,21 @@ if 'df_clustered' in st.session_state:
             supplier_col = supplier_country_col
 
             if st.button("Run Full Trade Analysis"):
-                insights = perform_trade_analysis(
-                    df_filtered,
-                    product_col=product_col,
-                    quantity_col=quantity_col,
-                    value_col=value_col,
-                    importer_col=importer_col,
-                    supplier_col=supplier_col
-                )
+                with Profiler(st.session_state.get("track_stage_memory", False), st.session_state.setdefault("stage_timings", [])):
+                    insights = perform_trade_analysis(
+                        df_filtered,
+                        product_col=product_col,
+                        quantity_col=quantity_col,
+                        value_col=value_col,
+                        importer_col=importer_col,
+                        supplier_col=supplier_col
+                    )
                 for label, df_result in insights.items():
                     st.subheader(label)
                     if "Heatmap" in label:
+                        import matplotlib.pyplot as plt
+                        import seaborn as sns
+
                         fig, ax = plt.subplots(figsize=(10, 6))
                         sns.heatmap(df_result, annot=True, fmt=".1f", cmap="YlGnBu", ax=ax)
                         st.pyplot(fig)
@@ -343,11 +470,55 @@ if 'df_clustered' in st.session_state:
             st.warning("Not enough string or numeric columns to proceed.")
     
     
+    with st.expander(" Full Report Workbook (All Analyses)"):
+        st.markdown("Runs every analysis for the filters above in one pass and writes one sheet per insight.")
+        report_value_col = st.selectbox(
+            "Value Column for Report",
+            df_clustered.select_dtypes(include="number").columns.tolist(),
+            key="report_value_col"
+        )
+        include_forecasts = st.checkbox("Include forecasts", value=True, key="report_include_forecasts")
+
+        if st.button("Build Report", key="build_report_btn"):
+            from report import build_report, REPORT_SECTIONS
+
+            report_progress = st.progress(0)
+            report_status = st.empty()
+
+            def report_progress_cb(fraction, message):
+                report_progress.progress(min(fraction, 1.0))
+                report_status.text(message)
+
+            sections = [name for name, _ in REPORT_SECTIONS if include_forecasts or name != "forecasts"]
+            with st.spinner("Building report..."):
+                report_bytes, report_sheets = build_report(
+                    df_clustered,
+                    report_filters,
+                    value_col=report_value_col,
+                    product_col=cluster_col,
+                    importer_col=importer_country_col,
+                    supplier_col=supplier_country_col,
+                    sections=sections,
+                    progress_callback=report_progress_cb
+                )
+            st.session_state["report_bytes"] = report_bytes
+            st.success(f"Report ready with {len(report_sheets)} sheets.")
+
+        if "report_bytes" in st.session_state:
+            st.download_button(
+                "Download Report Workbook",
+                data=st.session_state["report_bytes"],
+                file_name="trade_report.xlsx",
+                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                key="report_download"
+            )
+
+
     with st.expander(" Forecast Product Price or Quantity"):
         st.markdown("Select an HS Code and the product you'd like to forecast.")
 
         if 'df_clustered' in st.session_state:
-            df_clustered = st.session_state["df_clustered"]
+            df_clustered = session_frame(st.session_state, "df_clustered")
             cluster_col = f"{st.session_state['cluster_column_name']}_cluster"
 
             if cluster_col not in df_clustered.columns:
@@ -355,24 +526,16 @@ if 'df_clustered' in st.session_state:
             else:
                 # Normalize HSCODE column
                 hscode_col = "CTH_HSCODE"
-                item_col = "Item_Description_cluster"
-                month_col = "Month"  # Ensure this is datetime64[ns]
-
-                df_clustered[month_col] = pd.to_datetime(df_clustered[month_col], errors='coerce')
+                series_store = get_series_store(
+                    df_clustered, key_cols=(hscode_col, cluster_col), version=session_version(st.session_state, "df_clustered")
+                )
 
                 # Step 1: Select HS Code
-                unique_hscodes = sorted(df_clustered[hscode_col].dropna().unique())
+                unique_hscodes = series_store.first_level_values()
                 selected_hscode = st.selectbox("Select HS Code", unique_hscodes, key="forecast_hscode")
 
-                # Step 2: Filter by selected HSCODE
-                hscode_filtered = df_clustered[df_clustered[hscode_col] == selected_hscode].copy()
-
-                # Step 3: Build list of products with >= 6 unique months
-                valid_items = []
-                for item in hscode_filtered[item_col].dropna().unique():
-                    months_present = hscode_filtered[hscode_filtered[item_col] == item][month_col].dt.to_period("M").nunique()
-                    if months_present >= 6:
-                        valid_items.append(item)
+                # Step 2 & 3: Products under the HS Code with >= 6 unique months
+                valid_items = series_store.items_for(selected_hscode, min_months=6)
 
                 if not valid_items:
                     st.warning("No products with 6 or more months of data for the selected HS Code.")
@@ -386,10 +549,21 @@ if 'df_clustered' in st.session_state:
                         key="forecast_metric"
                     )
 
+                    engine_choice = st.selectbox(
+                        "Forecast Engine",
+                        ["auto", "prophet", "holt_winters", "seasonal_naive", "linear"],
+                        key="forecast_engine",
+                        help="'auto' picks an engine from the series length and seasonality."
+                    )
+
                     if st.button("Run Forecast", key="run_forecast_btn"):
-                        from forecasting import forecast_item  # ensure this function is defined
+                        from forecasting import forecast_series
 
-                        forecast_df, description, plot_buf = forecast_item(hscode_filtered, item_selected, column_choice, cluster_col)
+                        if column_choice not in series_store.metrics:
+                            forecast_df, description, plot_buf = None, f"Forecast error: column `{column_choice}` not found.", None
+                        else:
+                            history = series_store.history((selected_hscode, item_selected), column_choice)
+                            forecast_df, description, plot_buf = forecast_series(history, item_selected, column_choice, engine=engine_choice)
 
                         if isinstance(description, str) and "error" in description.lower():
                             st.error(description)
@@ -398,6 +572,7 @@ if 'df_clustered' in st.session_state:
                             st.dataframe(forecast_df)
 
                             st.markdown(f" **Trend Insight:** {description}")
+                            st.caption(f"Engine: {forecast_df.attrs.get('engine', engine_choice)}")
                             st.image(plot_buf, caption="Historical (green) vs Forecast (red)", use_container_width=True)
 
                             st.download_button(
@@ -409,13 +584,116 @@ if 'df_clustered' in st.session_state:
                         else:
                             st.warning(description)
 
+                    # Step 5: Batch forecast every eligible product under the HS Code
+                    st.markdown("#### Batch Forecast (All Products in HS Code)")
+                    batch_metrics = st.multiselect(
+                        "Columns to Forecast",
+                        [m for m in ["Quantity", "Unit_Price_USD", "Total_Ass_Value_USD"] if m in series_store.metrics],
+                        default=[m for m in ["Quantity"] if m in series_store.metrics],
+                        key="batch_forecast_metrics"
+                    )
 
+                    if st.button("Forecast All Products", key="batch_forecast_btn") and batch_metrics:
+                        from forecasting import start_batch_forecast
+
+                        histories = {
+                            (item, metric): series_store.history((selected_hscode, item), metric)
+                            for item in valid_items
+                            for metric in batch_metrics
+                        }
+                        st.session_state["batch_forecast_job"] = start_batch_forecast(histories, engine=engine_choice)
+                        st.session_state["batch_forecast_hscode"] = selected_hscode
+                        st.session_state.pop("batch_forecast_result", None)
+
+                    batch_job = job_runner.get(st.session_state.get("batch_forecast_job"))
+                    if batch_job is not None and not batch_job.done:
+                        render_job_progress(batch_job, key="batch_forecast_job")
+                    elif batch_job is not None:
+                        del st.session_state["batch_forecast_job"]
+                        job_runner.forget(batch_job.id)
+                        if batch_job.status == "failed":
+                            st.error(f"Batch forecast failed: {batch_job.error}")
+                        elif batch_job.status == "cancelled":
+                            st.warning("Batch forecast was cancelled.")
+                        else:
+                            st.session_state["batch_forecast_result"] = batch_job.result
+
+                    if "batch_forecast_result" in st.session_state:
+                        batch_hscode = st.session_state["batch_forecast_hscode"]
+                        batch_table, batch_trends = st.session_state["batch_forecast_result"]
+                        st.success(f"Batch forecast for HS Code {batch_hscode} completed.")
+                        st.dataframe(batch_trends)
+                        st.dataframe(batch_table)
+
+                        st.download_button(
+                            label="Download Batch Forecast CSV",
+                            data=batch_table.to_csv(index=False),
+                            file_name=f"{batch_hscode}_batch_forecast.csv",
+                            mime="text/csv"
+                        )
+
+                        # Plots are rendered on demand only
+                        plotted = batch_trends[batch_trends["Status"] == "ok"]
+                        if not plotted.empty:
+                            plot_choice = st.selectbox(
+                                "Plot Forecast For",
+                                [f"{row.Item} | {row.Metric}" for row in plotted.itertuples()],
+                                key="batch_forecast_plot_choice"
+                            )
+                            if st.button("Show Plot", key="batch_forecast_plot_btn"):
+                                from forecasting import plot_forecast
+
+                                plot_item, plot_metric = plot_choice.split(" | ", 1)
+                                plot_rows = batch_table[(batch_table["Item"] == plot_item) & (batch_table["Metric"] == plot_metric)]
+                                plot_buf = plot_forecast(
+                                    series_store.history((batch_hscode, plot_item), plot_metric),
+                                    plot_rows[["ds", "Forecast"]].rename(columns={"Forecast": plot_metric}),
+                                    plot_item,
+                                    plot_metric
+                                )
+                                st.image(plot_buf, caption="Historical (green) vs Forecast (red)", use_container_width=True)
+
+
+                    # Step 6: Compare engines on this HS Code before choosing one
+                    st.markdown("#### Backtest Forecast Engines")
+                    backtest_horizon = st.slider("Backtest Horizon (months)", 1, 12, 3, key="backtest_horizon")
+                    if st.button("Run Backtest", key="run_backtest_btn"):
+                        from backtesting import run_backtest, summarize_backtest
+
+                        if column_choice not in series_store.metrics:
+                            st.error(f"Column `{column_choice}` not found.")
+                        else:
+                            with st.spinner("Backtesting forecast engines..."):
+                                backtest_progress = st.progress(0)
+                                backtest_histories = {
+                                    (item, column_choice): series_store.history((selected_hscode, item), column_choice)
+                                    for item in valid_items
+                                }
+                                backtest_results = run_backtest(
+                                    backtest_histories,
+                                    horizon=backtest_horizon,
+                                    progress_callback=lambda p: backtest_progress.progress(min(p, 1.0))
+                                )
+
+                            st.markdown("**Engine Summary (lower error is better)**")
+                            st.dataframe(summarize_backtest(backtest_results))
+                            st.markdown("**Per-Item Results**")
+                            st.dataframe(backtest_results)
+
+
+    # Set once years, quarters, HS code and item are all chosen below
+    comparative_selection = None
     with st.expander(" Comparative Quantity Analysis (Multi-Quarter Wise)"):
-    # Step 1: Ensure 'Month' is datetime
-        df_clustered["Month"] = pd.to_datetime(df_clustered["Month"], errors="coerce")
+    # Step 1: Monthly series store (built once per dataset)
+        hscode_col = "CTH_HSCODE"
+        item_col = "Item_Description_cluster"
+        quantity_col = "Quantity"
+        comparative_store = get_series_store(
+            df_clustered, key_cols=(hscode_col, item_col), version=session_version(st.session_state, "df_clustered")
+        )
 
         # Step 2: Select Years
-        available_years = sorted(df_clustered["Month"].dt.year.dropna().unique())
+        available_years = comparative_store.years()
         selected_years = st.multiselect("Select Years", available_years, default=available_years[:2])
 
         if len(selected_years) < 1:
@@ -438,44 +716,28 @@ if 'df_clustered' in st.session_state:
                     selected_months.extend(quarter_map[q])
 
                 # Step 4: HS Code and Item Selection
-                hscode_col = "CTH_HSCODE"
-                item_col = "Item_Description_cluster"
-                quantity_col = "Quantity"
-
-                available_hscodes = sorted(df_clustered[hscode_col].dropna().unique())
+                available_hscodes = comparative_store.first_level_values()
                 selected_hscode = st.selectbox("Select HS Code", available_hscodes)
 
-                filtered_by_hscode = df_clustered[df_clustered[hscode_col] == selected_hscode]
-                filtered_by_hscode["hs_item_combo"] = (
-                    filtered_by_hscode[hscode_col].astype(str) + " : " + filtered_by_hscode[item_col].astype(str)
-                )
-
-                combo_options = sorted(filtered_by_hscode["hs_item_combo"].dropna().unique())
+                item_options = comparative_store.items_for(selected_hscode)
+                combo_options = [f"{selected_hscode} : {item}" for item in item_options]
                 selected_combo = st.selectbox("Select Product Description", combo_options)
-                selected_item = selected_combo.split(" : ", 1)[1]
-
-                # Step 5: Filter data by year, quarter, HS Code, and item
-                filtered_df = df_clustered[
-                    (df_clustered["Month"].dt.year.isin(selected_years)) &
-                    (df_clustered["Month"].dt.month.isin(selected_months)) &
-                    (df_clustered[hscode_col] == selected_hscode) &
-                    (df_clustered[item_col] == selected_item)
-                ].copy()
-
-                # Step 6: Add Quarter column
-                filtered_df["Quarter"] = filtered_df["Month"].dt.to_period("Q").astype(str)
-                filtered_df["Year"] = filtered_df["Month"].dt.year
-
-                # Step 7: Group and summarize
-                if filtered_df.empty:
+                selected_item = item_options[combo_options.index(selected_combo)]
+                comparative_selection = (selected_years, selected_months, selected_hscode, selected_item)
+
+                # Step 5: Slice quarter totals for the selected years and quarters
+                selected_quarter_nums = sorted({(m - 1) // 3 + 1 for m in selected_months})
+                summary = comparative_store.quarterly((selected_hscode, selected_item), quantity_col)
+                summary = summary[
+                    summary["Year"].isin(selected_years) & summary["Quarter"].isin(selected_quarter_nums)
+                ].reset_index(drop=True)
+
+                # Step 6 & 7: Label quarters and summarize
+                if summary.empty:
                     st.warning("No data available for the selected filters.")
                 else:
-                    summary = (
-                        filtered_df.groupby(["Year", "Quarter"])[quantity_col]
-                        .sum()
-                        .reset_index()
-                        .rename(columns={quantity_col: "Total Quantity"})
-                    )
+                    summary["Quarter"] = summary["Year"].astype(str) + "Q" + summary["Quarter"].astype(str)
+                    summary = summary[["Year", "Quarter", "Total"]].rename(columns={"Total": "Total Quantity"})
 
                     st.markdown("### Comparative Quantity by Year and Quarter")
                     st.dataframe(summary)
@@ -500,11 +762,37 @@ if 'df_clustered' in st.session_state:
                             """)
 
 
+    with st.expander(" Product Growth Ranking (All Products)"):
+        growth_metric = st.selectbox(
+            "Metric to Rank By",
+            [c for c in ["Quantity", "Unit_Price_USD", "Total_Ass_Value_USD"] if c in df_clustered.columns],
+            key="growth_metric"
+        )
+        if growth_metric:
+            trend_tables = get_trend_table(
+                df_clustered, value_col=growth_metric, version=session_version(st.session_state, "df_clustered")
+            )
+
+            st.markdown("### Growth by HS Code, Product and Trade Type")
+            st.dataframe(trend_tables["Growth"])
+
+            level = st.radio("Period-over-Period Detail", ["Yearly", "Quarterly"], horizontal=True, key="growth_level")
+            st.dataframe(trend_tables[level])
+
+            st.download_button(
+                label="Download Growth Ranking CSV",
+                data=trend_tables["Growth"].to_csv(index=False),
+                file_name=f"growth_ranking_{growth_metric}.csv",
+                mime="text/csv"
+            )
+
+
     with st.expander(" Analysis Company Wise"):
-        df_clustered["Month"] = pd.to_datetime(df_clustered["Month"], errors="coerce")
+        # df_clustered is shared with other sessions: derived columns go into a local view
+        df_company_view = df_clustered.assign(Month=pd.to_datetime(df_clustered["Month"], errors="coerce"))
 
         # Step 1: Select Year and Quarter Group(s)
-        available_years = sorted(df_clustered["Month"].dt.year.dropna().unique())
+        available_years = sorted(df_company_view["Month"].dt.year.dropna().unique())
         selected_year = st.selectbox("Select Year", available_years, key="companywise_year")
 
         quarter_dict = {
@@ -522,31 +810,33 @@ if 'df_clustered' in st.session_state:
             selected_months = [m for q in selected_quarters for m in quarter_dict[q]]
 
             # Step 2: Select Trade Type
-            trade_types = df_clustered["Type"].dropna().unique()
+            trade_types = df_company_view["Type"].dropna().unique()
             selected_trade = st.selectbox("Select Trade Type", trade_types, key="companywise_trade_type")
 
             # Step 3: Multi-select Companies
             supplier_col = "Supplier_Name"
-            df_clustered[supplier_col] = df_clustered[supplier_col].astype(str).str.strip().str.lower()
-            unique_companies = sorted(df_clustered[supplier_col].dropna().unique())
+            suppliers = df_company_view[supplier_col].astype(object)
+            df_company_view[supplier_col] = suppliers.where(suppliers.isna(), suppliers.astype(str).str.strip().str.lower())
+            unique_companies = sorted(df_company_view[supplier_col].dropna().unique())
             selected_companies = st.multiselect("Select Company(s)", unique_companies, key="companywise_companies")
             selected_companies = [c.strip().lower() for c in selected_companies]
 
             if selected_companies:
-                df_company_filtered = df_clustered[df_clustered[supplier_col].isin(selected_companies)]
+                df_company_filtered = df_company_view[df_company_view[supplier_col].isin(selected_companies)]
 
                 # Step 4: Filter HS Codes based on selected companies
                 hscode_col = "CTH_HSCODE"
-                hs_codes_filtered = df_company_filtered[hscode_col].dropna().astype(str).unique()
-                selected_hscodes = st.multiselect("Select HS Code(s)", sorted(hs_codes_filtered), key="companywise_hscode")
+                hs_index = get_hs_index(df_clustered, hscode_col, version=session_version(st.session_state, "df_clustered"))
+                hs_codes_filtered = hs_index.codes_under(subset=df_company_filtered)
+                selected_hscodes = st.multiselect("Select HS Code(s)", hs_codes_filtered, key="companywise_hscode")
 
                 if selected_hscodes:
-                    df_hscode_filtered = df_company_filtered[df_company_filtered[hscode_col].astype(str).isin(selected_hscodes)]
+                    df_hscode_filtered = df_company_filtered[hs_index.mask(df_company_filtered, values=selected_hscodes)]
 
                     # Step 5: Product combo filtering
                     item_col = "Item_Description_cluster"
                     df_hscode_filtered["hs_item_combo"] = (
-                        df_hscode_filtered[hscode_col].astype(str) + " : " + df_hscode_filtered[item_col].astype(str)
+                        df_hscode_filtered[hscode_col].astype(object).astype(str) + " : " + df_hscode_filtered[item_col].astype(object).astype(str)
                     )
                     combo_options = sorted(df_hscode_filtered["hs_item_combo"].dropna().unique())
                     selected_combos = st.multiselect("Select HS Code + Product(s)", combo_options, key="companywise_combo")
@@ -554,13 +844,13 @@ if 'df_clustered' in st.session_state:
                     selected_items = [combo.split(" : ", 1)[1] for combo in selected_combos]
 
                     # Step 6: Filter for all selections
-                    final_filtered = df_clustered[
-                        (df_clustered["Month"].dt.year == selected_year) &
-                        (df_clustered["Month"].dt.month.isin(selected_months)) &
-                        (df_clustered["Type"] == selected_trade) &
-                        (df_clustered[supplier_col].isin(selected_companies)) &
-                        (df_clustered[hscode_col].astype(str).isin(selected_hscodes)) &
-                        (df_clustered[item_col].isin(selected_items))
+                    final_filtered = df_company_view[
+                        (df_company_view["Month"].dt.year == selected_year) &
+                        (df_company_view["Month"].dt.month.isin(selected_months)) &
+                        (df_company_view["Type"] == selected_trade) &
+                        (df_company_view[supplier_col].isin(selected_companies)) &
+                        hs_index.mask(df_company_view, values=selected_hscodes) &
+                        (df_company_view[item_col].isin(selected_items))
                     ]
 
                     if final_filtered.empty:
@@ -578,8 +868,8 @@ if 'df_clustered' in st.session_state:
 
 
                                 total_qty = company_df["Quantity"].sum()
-                                hs_used = sorted(company_df[hscode_col].astype(str).unique())
-                                items_used = sorted(company_df[item_col].astype(str).unique())
+                                hs_used = sorted(company_df[hscode_col].astype(object).astype(str).unique())
+                                items_used = sorted(company_df[item_col].astype(object).astype(str).unique())
                                 quarter_text = ", ".join(selected_quarters)
 
                                 st.markdown(f"""
@@ -602,16 +892,31 @@ if 'df_clustered' in st.session_state:
 
 
     st.subheader("Business Questions")
+    # Business questions start from the rows behind the comparative selection above
+    question_months = pd.to_datetime(df_clustered["Month"], errors="coerce")
+    if comparative_selection is not None:
+        comp_years, comp_months, comp_hscode, comp_item = comparative_selection
+        filtered_df = df_clustered[
+            (question_months.dt.year.isin(comp_years)) &
+            (question_months.dt.month.isin(comp_months)) &
+            (df_clustered["CTH_HSCODE"] == comp_hscode) &
+            (df_clustered["Item_Description_cluster"] == comp_item)
+        ].copy()
+    else:
+        # No complete comparative selection yet: answer over all rows
+        filtered_df = df_clustered.copy()
+    filtered_df["Month"] = pd.to_datetime(filtered_df["Month"], errors="coerce")
     if "CTH_HSCODE" in df_clustered.columns and "Item_Description_cluster" in df_clustered.columns:
         filtered_df["hs_item_combo"] = (
-            filtered_df["CTH_HSCODE"].astype(str) + " : " + filtered_df["Item_Description"].astype(str)
+            filtered_df["CTH_HSCODE"].astype(object).astype(str) + " : " + filtered_df["Item_Description"].astype(object).astype(str)
         )
 
     # HS Code selection
-    hs_options = sorted(filtered_df["CTH_HSCODE"].dropna().astype(str).unique())
+    hs_index = get_hs_index(df_clustered, "CTH_HSCODE", version=session_version(st.session_state, "df_clustered"))
+    hs_options = hs_index.codes_under(subset=filtered_df)
     selected_hscode = st.multiselect("Select HS Code(s)", ["All"] + hs_options, default=["All"])
     if "All" not in selected_hscode:
-        filtered_df = filtered_df[filtered_df["CTH_HSCODE"].astype(str).isin(selected_hscode)]
+        filtered_df = filtered_df[hs_index.mask(filtered_df, values=selected_hscode)]
 
     # HS Code + Item combo
     combo_options = sorted(filtered_df["hs_item_combo"].dropna().unique())
@@ -631,13 +936,13 @@ if 'df_clustered' in st.session_state:
     if "product" in filtered_df.columns and question in [
         "Most Traded Product", "Average Unit Price in Month", "Top Exporter Countries to Importer"
     ]:
-        product_options = sorted(set(filtered_df["product"].dropna().astype(str)))
+        product_options = sorted(set(filtered_df["product"].dropna().astype(object).astype(str)))
         selected_product = st.selectbox("Select a Product", product_options)
     else:
         selected_product = None
 
     if "month" in filtered_df.columns and question == "Average Unit Price in Month":
-        month_options = sorted(set(filtered_df["month"].dropna().astype(str)))
+        month_options = sorted(set(filtered_df["month"].dropna().astype(object).astype(str)))
         selected_month = st.selectbox("Select Month", month_options)
     else:
         selected_month = None
@@ -648,16 +953,16 @@ if 'df_clustered' in st.session_state:
 
             try:
                 if question == "Top Exporter Companies":
-                    result_df = filtered_df[supplier_country_col].value_counts().head(10).reset_index()
+                    result_df = filtered_df[supplier_country_col].value_counts()[lambda counts: counts > 0].head(10).reset_index()
                     result_df.columns = ['Exporter Company', 'Export Count']
 
                 elif question == "Top Importer Companies":
-                    result_df = filtered_df[importer_country_col].value_counts().head(10).reset_index()
+                    result_df = filtered_df[importer_country_col].value_counts()[lambda counts: counts > 0].head(10).reset_index()
                     result_df.columns = ['Importer Company', 'Import Count']
 
                 elif question == "Most Traded Product":
                     result_df = filtered_df[filtered_df["product"].str.contains(selected_product, case=False, na=False)]
-                    result_df = result_df["product"].value_counts().reset_index().head(10)
+                    result_df = result_df["product"].value_counts()[lambda counts: counts > 0].reset_index().head(10)
                     result_df.columns = ["Product", "Trade Count"]
 
                 elif question == "Average Unit Price in Month":
@@ -676,7 +981,7 @@ if 'df_clustered' in st.session_state:
                         (filtered_df[importer_country_col].str.lower() == "india") & 
                         (filtered_df["product"].str.contains(selected_product, case=False, na=False))
                         ]
-                    result_df = filtered[supplier_country_col].value_counts().reset_index().head(10)
+                    result_df = filtered[supplier_country_col].value_counts()[lambda counts: counts > 0].reset_index().head(10)
                     result_df.columns = ["Supplier Country", "Export Count"]
 
                 if result_df is not None:
@@ -762,7 +1067,7 @@ if 'df_clustered' in st.session_state:
     
     # Run analysis button
     if st.button("🔍 Run Analysis", key="run_analysis"):
-        with st.spinner("Analyzing data..."):
+        with st.spinner("Analyzing data..."), Profiler(st.session_state.get("track_stage_memory", False), st.session_state.setdefault("stage_timings", [])):
             result, message = perform_cluster_analysis(
                 df_clustered, 
                 cluster_col, 
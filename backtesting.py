@@ -0,0 +1,138 @@
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from forecast_engines import ENGINES, SEASON_LENGTH, get_engine
+
+DEFAULT_ENGINES = ["linear", "seasonal_naive", "holt_winters", "prophet"]
+
+
+def mape(actual, predicted):
+    """Mean absolute percentage error, ignoring zero actuals."""
+    actual, predicted = np.asarray(actual, dtype=float), np.asarray(predicted, dtype=float)
+    nonzero = actual != 0
+    if not nonzero.any():
+        return np.nan
+    return float(np.mean(np.abs((actual[nonzero] - predicted[nonzero]) / actual[nonzero])) * 100)
+
+
+def smape(actual, predicted):
+    """Symmetric MAPE in percent; points where both values are zero count as exact."""
+    actual, predicted = np.asarray(actual, dtype=float), np.asarray(predicted, dtype=float)
+    denom = np.abs(actual) + np.abs(predicted)
+    ratio = np.divide(2 * np.abs(actual - predicted), denom, out=np.zeros_like(denom), where=denom > 0)
+    return float(np.mean(ratio) * 100)
+
+
+def mase(actual, predicted, train, season=SEASON_LENGTH):
+    """Mean absolute scaled error against the in-sample seasonal (or lag-1) naive forecast."""
+    actual, predicted, train = (np.asarray(a, dtype=float) for a in (actual, predicted, train))
+    lag = season if len(train) > season else 1
+    if len(train) <= lag:
+        return np.nan
+    scale = np.mean(np.abs(train[lag:] - train[:-lag]))
+    if scale == 0:
+        return np.nan
+    return float(np.mean(np.abs(actual - predicted)) / scale)
+
+
+def rolling_origins(n, min_train, horizon, step=1):
+    """Training-set lengths for each rolling forecast origin."""
+    return list(range(min_train, n - horizon + 1, step))
+
+
+def backtest_series(history, engine_name, horizon=3, min_train=12, step=1):
+    """
+    Rolling-origin evaluation of one engine on one monthly ds/y frame.
+
+    Returns a dictionary of averaged error metrics, fit/predict latency
+    (milliseconds per origin) and the number of origins evaluated.
+    """
+    engine = get_engine(engine_name)
+    y = history["y"].to_numpy(dtype=float)
+    origins = rolling_origins(len(y), min_train, horizon, step)
+
+    result = {"Engine": engine_name, "Origins": len(origins)}
+    if not origins:
+        return {**result, "MAPE": np.nan, "sMAPE": np.nan, "MASE": np.nan, "Fit ms": np.nan, "Predict ms": np.nan, "Status": "too short"}
+
+    scores = {"MAPE": [], "sMAPE": [], "MASE": []}
+    fit_seconds = predict_seconds = 0.0
+    try:
+        for origin in origins:
+            train = history.iloc[:origin]
+            actual = y[origin:origin + horizon]
+
+            started = time.perf_counter()
+            state = engine.fit(train)
+            fitted = time.perf_counter()
+            predicted = engine.predict(state, horizon)
+            predict_seconds += time.perf_counter() - fitted
+            fit_seconds += fitted - started
+
+            scores["MAPE"].append(mape(actual, predicted))
+            scores["sMAPE"].append(smape(actual, predicted))
+            scores["MASE"].append(mase(actual, predicted, y[:origin]))
+    except Exception as e:
+        return {**result, "MAPE": np.nan, "sMAPE": np.nan, "MASE": np.nan, "Fit ms": np.nan, "Predict ms": np.nan, "Status": f"error: {e}"}
+
+    summary = {name: float(np.nanmean(values)) if not np.all(np.isnan(values)) else np.nan for name, values in scores.items()}
+    return {
+        **result,
+        **summary,
+        "Fit ms": fit_seconds / len(origins) * 1000,
+        "Predict ms": predict_seconds / len(origins) * 1000,
+        "Status": "ok",
+    }
+
+
+def _backtest_task(task):
+    key, history, engine_name, horizon, min_train, step = task
+    return key, backtest_series(history, engine_name, horizon, min_train, step)
+
+
+def run_backtest(histories, engines=None, horizon=3, min_train=12, step=1, max_workers=None, progress_callback=None):
+    """
+    Backtest each engine on every (item, metric) history in parallel.
+
+    Args:
+        histories: Dictionary of {(item_name, value_column): monthly ds/y frame}
+        engines: Engine names to compare, defaults to DEFAULT_ENGINES
+        horizon: Months forecast at each origin
+        min_train: Months in the first training window
+        step: Months between origins
+        max_workers: Process count, defaults to the number of CPUs
+        progress_callback: Optional callable receiving the completed fraction
+
+    Returns:
+        DataFrame with one row per item, metric and engine.
+    """
+    engines = [name for name in (engines or DEFAULT_ENGINES) if name in ENGINES]
+    tasks = [
+        (key, history, engine_name, horizon, min_train, step)
+        for key, history in histories.items()
+        for engine_name in engines
+    ]
+
+    rows = []
+    if tasks:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_backtest_task, task) for task in tasks]
+            for done, future in enumerate(as_completed(futures), start=1):
+                (item_name, value_column), result = future.result()
+                rows.append({"Item": item_name, "Metric": value_column, **result})
+                if progress_callback:
+                    progress_callback(done / len(tasks))
+
+    columns = ["Item", "Metric", "Engine", "Origins", "MAPE", "sMAPE", "MASE", "Fit ms", "Predict ms", "Status"]
+    return pd.DataFrame(rows, columns=columns).sort_values(["Item", "Metric", "Engine"]).reset_index(drop=True)
+
+
+def summarize_backtest(results):
+    """Average accuracy and latency per engine, most accurate (lowest sMAPE) first."""
+    ok = results[results["Status"] == "ok"]
+    summary = ok.groupby("Engine")[["MAPE", "sMAPE", "MASE", "Fit ms", "Predict ms"]].mean()
+    summary["Series"] = ok.groupby("Engine").size()
+    return summary.sort_values("sMAPE").reset_index()
@@ -0,0 +1,300 @@
+"""
+Headless batch run of the cleaning and clustering pipeline.
+
+Runs the same stages as the app's "Clean Data Automatically" and "Create
+Clusters" buttons (drop_unwanted_columns, deduplicate_rows, standardize_dataframe,
+convert_to_kg, convert_sheet_to_usd, month parsing, supplier and location
+clustering, then product clustering) over every file matched by the given
+paths, directories or globs. Files are processed in parallel, one per
+worker process, through pipeline.run_pipeline, so a rerun after a crash
+resumes from the stage checkpoints. Files larger than memory can be
+streamed in chunks with --out-of-core (see out_of_core.py).
+
+Output layout, one Hive-style dataset per input file (files sharing a stem
+are told apart by their relative path, see source_names):
+    <output>/source=<file stem>/year=YYYY/month=MM/part-0.parquet
+    <output>/run_summary.json
+
+Usage:
+    python batch_pipeline.py data/2024/ --output processed/
+    python batch_pipeline.py "exports/*.csv" "exports/*.xlsx" --workers 4 --cluster-column Item_Description
+    python batch_pipeline.py history/imports_2015_2024.csv --out-of-core --chunk-rows 500000
+    python batch_pipeline.py monthly/2025-01.csv --append processed/source=imports_2015_2024
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+INPUT_EXTENSIONS = (".csv", ".xlsx", ".xls", ".parquet")
+
+
+def find_inputs(patterns):
+    """Input files for a list of paths, directories (searched recursively) and globs, in sorted order."""
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, names in os.walk(pattern):
+                files.update(os.path.join(root, name) for name in names if name.lower().endswith(INPUT_EXTENSIONS))
+        else:
+            files.update(path for path in glob.glob(pattern, recursive=True) if path.lower().endswith(INPUT_EXTENSIONS))
+    return sorted(files)
+
+
+def source_names(files):
+    """
+    Output source name per input file: the file stem, or for files sharing a
+    stem (a/imports.csv and b/imports.csv, imports.csv and imports.xlsx) their
+    path relative to the group's common directory, so no two inputs write
+    into the same source=<name> dataset.
+    """
+    groups = {}
+    for path in files:
+        groups.setdefault(os.path.splitext(os.path.basename(path))[0], []).append(path)
+
+    names = {}
+    for stem, paths in groups.items():
+        if len(paths) == 1:
+            names[paths[0]] = stem
+            continue
+        common = os.path.commonpath([os.path.abspath(os.path.dirname(p)) for p in paths])
+        relative = {p: os.path.relpath(os.path.abspath(p), common) for p in paths}
+        stripped = {p: os.path.splitext(rel)[0] for p, rel in relative.items()}
+        if len(set(stripped.values())) < len(paths):
+            stripped = relative     # same directory, different extensions
+        for path, rel in stripped.items():
+            names[path] = re.sub(r"[^\w.-]+", "_", rel)
+
+    # Sanitizing can still map two paths to one name; fall back to a path hash
+    counts = {}
+    for name in names.values():
+        counts[name] = counts.get(name, 0) + 1
+    for path, name in names.items():
+        if counts[name] > 1:
+            names[path] = f"{name}-{hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:8]}"
+    return names
+
+
+def read_input(path):
+    """Read a CSV (falling back to ISO-8859-1 as the app does), Parquet or Excel file."""
+    import pandas as pd
+
+    if path.lower().endswith(".parquet"):
+        return pd.read_parquet(path)
+    if path.lower().endswith(".csv"):
+        try:
+            return pd.read_csv(path)
+        except UnicodeDecodeError:
+            return pd.read_csv(path, encoding="ISO-8859-1")
+    return pd.read_excel(path)
+
+
+def process_file(path, output_dir, config, cluster_column=None, chunk_rows=None, source=None):
+    """
+    Run the pipeline on one file and write its partitions under
+    source=<source> (default: the file stem), replacing the partitions of an
+    earlier run. With chunk_rows the file is streamed through
+    out_of_core.process_out_of_core instead of being loaded whole.
+
+    Returns:
+        Summary dict for run_summary.json; failures are reported, not raised
+    """
+    from clustering import add_cluster_column
+    from data_cleaning import compact_categoricals
+    from export_formats import write_partitioned_frame
+    from ingest_cache import upload_key
+    from pipeline import cleaning_config, run_pipeline
+
+    started = time.perf_counter()
+    source = source or os.path.splitext(os.path.basename(path))[0]
+    source_dir = os.path.join(output_dir, f"source={source}")
+    summary = {"file": path, "source": source, "status": "ok", "warnings": 0}
+    try:
+        if chunk_rows:
+            from out_of_core import process_out_of_core
+
+            result = process_out_of_core(path, source_dir, chunk_rows, config, cluster_column)
+            summary.update({key: value for key, value in result.items() if key not in ("file", "seconds")})
+            summary["seconds"] = round(time.perf_counter() - started, 3)
+            return summary
+
+        with open(path, "rb") as f:
+            raw_key = upload_key(f.read())
+        raw = read_input(path)
+        warnings = []
+        results, report = run_pipeline(
+            raw,
+            {**cleaning_config(raw.columns), **config},
+            raw_key=raw_key,
+            outputs=("final", "converted_rows", "deleted_rows", "dedup_report"),
+            callbacks={"warning_callback": warnings.append},
+        )
+        df = results["final"]
+
+        col_map = {str(col).lower(): col for col in df.columns}
+        product_col = col_map.get(str(cluster_column).lower()) if cluster_column else None
+        if product_col is not None:
+            df = add_cluster_column(df, product_col)
+            df = compact_categoricals(df, columns=[f"{product_col}_cluster"])
+
+        month_col = col_map.get("month")
+        if month_col is None:
+            raise ValueError("No Month column to partition by")
+        # Stale year=/month= partitions of an earlier run would otherwise be read with the new ones
+        shutil.rmtree(source_dir, ignore_errors=True)
+        partitions = write_partitioned_frame(df, source_dir, month_col)
+
+        summary.update(
+            rows_in=len(raw),
+            rows_out=len(df),
+            converted_rows=len(results["converted_rows"]),
+            deleted_rows=len(results["deleted_rows"]),
+            duplicate_rows=results["dedup_report"]["duplicates"],
+            warnings=len(warnings),
+            product_clusters=int(df[f"{product_col}_cluster"].nunique()) if product_col is not None else None,
+            partitions=len(partitions),
+            stages=report,
+        )
+    except Exception as e:
+        summary.update(status="failed", error=f"{type(e).__name__}: {e}")
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def run_batch(files, output_dir, config=None, cluster_column="Item_Description", workers=None, progress=None,
+              chunk_rows=None):
+    """
+    Process files across worker processes and write run_summary.json.
+
+    Args:
+        files: Input paths
+        output_dir: Root of the partitioned output
+        config: Overrides for pipeline.DEFAULT_CONFIG (e.g. supplier_threshold)
+        cluster_column: Column to product-cluster, None to skip
+        workers: Process count, defaults to the number of CPUs
+        progress: Optional callable receiving each file's summary as it finishes
+        chunk_rows: Stream each file in chunks of this many rows (out-of-core mode)
+
+    Returns:
+        The run summary dict
+    """
+    from dataset_memory import enable_copy_on_write
+
+    os.makedirs(output_dir, exist_ok=True)
+    started = time.time()
+    summaries = []
+    sources = source_names(files)
+    # Workers may be spawned rather than forked, so each one turns copy-on-write on itself
+    with ProcessPoolExecutor(max_workers=workers, initializer=enable_copy_on_write) as pool:
+        futures = [
+            pool.submit(process_file, path, output_dir, config or {}, cluster_column, chunk_rows, sources[path])
+            for path in files
+        ]
+        for future in as_completed(futures):
+            summaries.append(future.result())
+            if progress:
+                progress(summaries[-1])
+
+    summaries.sort(key=lambda s: s["file"])
+    ok = [s for s in summaries if s["status"] == "ok"]
+    run_summary = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(started)),
+        "seconds": round(time.time() - started, 3),
+        "output": os.path.abspath(output_dir),
+        "config": config or {},
+        "cluster_column": cluster_column,
+        "chunk_rows": chunk_rows,
+        "files": len(summaries),
+        "failed": len(summaries) - len(ok),
+        "rows_in": sum(s["rows_in"] for s in ok),
+        "rows_out": sum(s["rows_out"] for s in ok),
+        "results": summaries,
+    }
+    with open(os.path.join(output_dir, "run_summary.json"), "w", encoding="utf-8") as f:
+        json.dump(run_summary, f, indent=2, default=str)
+    return run_summary
+
+
+def main():
+    from dataset_memory import enable_copy_on_write
+    from out_of_core import DEFAULT_CHUNK_ROWS
+
+    enable_copy_on_write()
+
+    arg_parser = argparse.ArgumentParser(description="Run the cleaning and clustering pipeline over many files.")
+    arg_parser.add_argument("inputs", nargs="+", help="Files, directories or glob patterns (.csv, .xlsx, .xls, .parquet)")
+    arg_parser.add_argument("--output", "-o", default="processed", help="Output directory for Parquet partitions")
+    arg_parser.add_argument("--workers", type=int, default=None, help="Worker processes, defaults to the CPU count")
+    arg_parser.add_argument("--cluster-column", default="Item_Description", help="Column to product-cluster")
+    arg_parser.add_argument("--no-product-clusters", action="store_true", help="Skip product clustering")
+    arg_parser.add_argument("--supplier-threshold", type=int, default=None, help="Supplier clustering threshold (0-100)")
+    arg_parser.add_argument("--location-threshold", type=int, default=None, help="Location clustering threshold (0-100)")
+    arg_parser.add_argument("--dedup", choices=["drop", "flag", "off"], default=None,
+                            help="Drop repeated shipments, flag them in Is_Duplicate or keep them (default: drop when "
+                                 "a BE number is among the keys, otherwise flag)")
+    arg_parser.add_argument("--dedup-keys", nargs="+", default=None, help="Columns that identify a shipment")
+    arg_parser.add_argument("--out-of-core", action="store_true", help="Stream files in chunks instead of loading them whole")
+    arg_parser.add_argument("--chunk-rows", type=int, default=None, help="Rows per chunk in out-of-core mode")
+    arg_parser.add_argument("--append", metavar="MASTER", help="Append the files, in order, to this master dataset")
+    args = arg_parser.parse_args()
+
+    files = find_inputs(args.inputs)
+    if not files:
+        arg_parser.error("no input files matched")
+
+    if args.append:
+        from master_dataset import append_to_master
+
+        # Appends change the shared master and its aggregates, so they run one file at a time
+        for path in files:
+            result = append_to_master(path, args.append, args.chunk_rows or DEFAULT_CHUNK_ROWS)
+            print(f"  appended {path}: {result['rows_out']:,} rows ({result['duplicate_rows']:,} duplicates) "
+                  f"into {len(result['months'])} month(s), "
+                  f"new names {result['new_names']}, {result['refreshed_keys']} trend keys refreshed")
+        return
+
+    config = {}
+    if args.supplier_threshold is not None:
+        config["supplier_threshold"] = args.supplier_threshold
+    if args.location_threshold is not None:
+        config["location_threshold"] = args.location_threshold
+    if args.dedup_keys:
+        from data_cleaning import default_dedup_mode
+
+        config["dedup_keys"] = args.dedup_keys
+        config["dedup_mode"] = default_dedup_mode(args.dedup_keys)
+    if args.dedup is not None:
+        config["dedup_mode"] = args.dedup
+
+    def report(summary):
+        if summary["status"] == "ok":
+            print(f"  ok      {summary['file']}: {summary['rows_in']:,} -> {summary['rows_out']:,} rows "
+                  f"({summary.get('duplicate_rows', 0):,} duplicates), "
+                  f"{summary['partitions']} partitions, {summary['seconds']:.1f} s")
+        else:
+            print(f"  FAILED  {summary['file']}: {summary['error']}")
+
+    print(f"Processing {len(files)} file(s) into {args.output}")
+    run_summary = run_batch(
+        files,
+        args.output,
+        config,
+        cluster_column=None if args.no_product_clusters else args.cluster_column,
+        workers=args.workers,
+        progress=report,
+        chunk_rows=(args.chunk_rows or DEFAULT_CHUNK_ROWS) if args.out_of_core else None,
+    )
+    print(f"\n{run_summary['files'] - run_summary['failed']}/{run_summary['files']} files, "
+          f"{run_summary['rows_out']:,} rows in {run_summary['seconds']:.1f} s. "
+          f"Summary: {os.path.join(args.output, 'run_summary.json')}")
+    sys.exit(1 if run_summary["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import pandas as pd
 import re
 from difflib import SequenceMatcher
+from profiling import profiled
 
 
 def extract_core_product_name(text):
@@ -83,12 +84,13 @@ def cluster_product_names(series, similarity_threshold=0.8):
     return series.map(lambda x: clusters.get(x, str(x).lower().strip() if pd.notna(x) else x))
 
 
+@profiled()
 def add_cluster_column(df, column_name):
     """Add a cluster column for the specified column"""
     if column_name not in df.columns:
         return df
     
-    df_copy = df.copy()
+    df_copy = df.copy(deep=False)
     cluster_col_name = f"{column_name}_cluster"
     df_copy[cluster_col_name] = cluster_product_names(df_copy[column_name])
     
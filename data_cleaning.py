@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import re
 import unicodedata
@@ -8,6 +9,7 @@ from typing import Dict, List, Optional, Tuple
 import time
 from datetime import datetime
 from io import BytesIO
+from profiling import profiled
 def is_email(value):
     """Check if a value is a valid email address."""
     email_pattern = re.compile(
@@ -108,6 +110,7 @@ def safe_numeric_conversion(series):
     
     return series.apply(convert_value)
 
+@profiled()
 def drop_unwanted_columns(df):
     """
     Drops unwanted columns from the dataframe regardless of casing.
@@ -140,6 +143,161 @@ def drop_unwanted_columns(df):
 
     return df_cleaned
 
+
+# Columns that identify one shipment, matched case-insensitively; whichever are present are used
+DEDUP_KEYS = [
+    "BE_No", "BE_Number", "BE_Date", "Month", "CTH_HSCODE", "Item_Description",
+    "Supplier_Name", "Importer_City_State", "Quantity", "UQC", "Total_Ass_Value",
+]
+
+
+# Shipment identifiers: repeats are only dropped by default when one of these is a key
+DEDUP_ID_KEYS = ["BE_No", "BE_Number"]
+
+
+def resolve_dedup_keys(columns, keys=None):
+    """The dedup key columns present in `columns`, with the frame's own casing."""
+    col_map = {str(col).lower(): col for col in columns}
+    return [col_map[str(key).lower()] for key in (DEDUP_KEYS if keys is None else keys) if str(key).lower() in col_map]
+
+
+def default_dedup_mode(key_cols):
+    """
+    "drop" when the keys include a shipment identifier, otherwise "flag":
+    without a bill of entry number two genuine shipments with the same
+    values in the same month look like duplicates.
+    """
+    ids = {key.lower() for key in DEDUP_ID_KEYS}
+    return "drop" if any(str(col).lower() in ids for col in key_cols) else "flag"
+
+
+def _column_hashes(series):
+    """uint64 hash per value; text is trimmed and lower-cased, numeric text hashes like the number."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return pd.util.hash_array(series.to_numpy("datetime64[ns]").view("int64"))
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return pd.util.hash_array(series.to_numpy(dtype="float64", na_value=np.nan))
+
+    # Normalize each distinct value once, then spread the hashes back over the rows
+    codes, uniques = pd.factorize(series)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip().str.lower()
+    numbers = pd.to_numeric(text, errors="coerce")
+    unique_hashes = np.where(
+        numbers.notna(),
+        pd.util.hash_array(numbers.to_numpy(dtype="float64")),
+        pd.util.hash_array(text.to_numpy(dtype=object)),
+    )
+    missing = pd.util.hash_array(np.array([np.nan]))[0]
+    return np.where(codes >= 0, unique_hashes[codes] if len(uniques) else missing, missing)
+
+
+def row_hashes(df, key_cols):
+    """
+    64-bit hash of every row over key_cols, computed column-wise.
+
+    Text is compared trimmed and case-insensitively, and numbers stored as
+    text in one file and as numbers in another hash alike.
+    """
+    columns = {col: _column_hashes(df[col]) for col in key_cols}
+    return pd.util.hash_pandas_object(pd.DataFrame(columns, index=df.index), index=False).to_numpy()
+
+
+class RowHashSet:
+    """
+    Set of uint64 row hashes for dedup across chunks or files.
+
+    Hashes are kept in sorted numpy runs (8 bytes per row) that are merged
+    as they grow, so membership tests are binary searches. At tens of millions
+    of rows the chance of any two distinct rows sharing a 64-bit hash stays
+    below one in a thousand.
+    """
+
+    def __init__(self, hashes=None):
+        self._runs = []
+        if hashes is not None and len(hashes):
+            self._runs.append(np.sort(pd.unique(np.asarray(hashes, dtype=np.uint64))))
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    def __contains__(self, value):
+        return bool(self.contains(np.array([value], dtype=np.uint64))[0])
+
+    def contains(self, hashes):
+        """Boolean array: which hashes are already in the set."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        # Sorted queries make the binary searches walk each run in order (much more cache friendly)
+        order = np.argsort(hashes)
+        queries = hashes[order]
+        found_sorted = np.zeros(len(hashes), dtype=bool)
+        for run in self._runs:
+            pos = np.searchsorted(run, queries)
+            found_sorted |= run[np.minimum(pos, len(run) - 1)] == queries
+        found = np.empty_like(found_sorted)
+        found[order] = found_sorted
+        return found
+
+    def check_and_add(self, hashes):
+        """
+        Boolean duplicate mask for a batch: a row is a duplicate if its hash
+        was added before or appears earlier in the batch. New hashes are added.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        duplicate = pd.Series(hashes).duplicated().to_numpy() | self.contains(hashes)
+        self._add_new(np.sort(hashes[~duplicate]))
+        return duplicate
+
+    def add(self, hashes):
+        new = np.sort(pd.unique(np.asarray(hashes, dtype=np.uint64)))
+        self._add_new(new[~self.contains(new)])
+
+    def _add_new(self, new):
+        """Add sorted, unique hashes that are not in the set yet."""
+        if len(new):
+            self._runs.append(new)
+        # Keep run sizes decreasing so there are only O(log n) runs to search
+        while len(self._runs) > 1 and len(self._runs[-1]) >= len(self._runs[-2]) // 2:
+            last = self._runs.pop()
+            # Both runs are sorted and disjoint: a linear merge, no re-sort
+            self._runs[-1] = np.insert(self._runs[-1], np.searchsorted(self._runs[-1], last), last)
+
+    def to_array(self):
+        return np.sort(np.concatenate(self._runs)) if self._runs else np.array([], dtype=np.uint64)
+
+
+@profiled()
+def deduplicate_rows(df, key_cols=None, mode="flag", seen=None):
+    """
+    Find repeated shipments by hashing key columns and drop or flag them.
+
+    Args:
+        df: DataFrame to check
+        key_cols: Columns that identify a shipment, defaults to those of DEDUP_KEYS present
+        mode: "drop" keeps the first occurrence, "flag" keeps every row and
+              adds a boolean Is_Duplicate column
+        seen: Optional RowHashSet of rows from earlier chunks/files; rows
+              already in it count as duplicates and new rows are added to it
+
+    Returns:
+        (DataFrame, report dict with key_columns, mode, rows, duplicates and kept)
+    """
+    key_cols = resolve_dedup_keys(df.columns, key_cols)
+    report = {"key_columns": key_cols, "mode": mode, "rows": len(df), "duplicates": 0, "kept": len(df)}
+    if not key_cols or len(df) == 0:
+        return df, report
+
+    hashes = row_hashes(df, key_cols)
+    duplicate = seen.check_and_add(hashes) if seen is not None else pd.Series(hashes).duplicated().to_numpy()
+    report["duplicates"] = int(duplicate.sum())
+
+    if mode == "flag":
+        df = df.copy(deep=False)
+        df["Is_Duplicate"] = duplicate
+    else:
+        df = df[~duplicate]
+        report["kept"] = len(df)
+    return df, report
+
 #def clean_pin(value):
   #  """Clean PIN codes by removing prefixes and extracting 6-digit codes."""
   #  if pd.isna(value):
@@ -181,14 +339,70 @@ def standardize_value(val, col_name=""):
     return val_str
 
 
+@profiled()
 def standardize_dataframe(df, string_cols):
     """Standardize string columns in a DataFrame."""
-    df = df.copy()
+    # Shallow copy: only the standardized columns get new buffers
+    df = df.copy(deep=False)
     for col in string_cols:
         df[col] = df[col].apply(lambda x: standardize_value(x, col_name=col))
     return df
 
 
+# Encode a text column when it has at most this many distinct values per row
+CATEGORY_MAX_RATIO = 0.05
+# ...and at most this share of its distinct values parse as numbers
+CATEGORY_MAX_NUMERIC_SHARE = 0.1
+# Measure and date columns are never encoded, even when stored as text
+MEASURE_COLUMN_HINTS = ("quantity", "qty", "value", "price", "amount", "month", "date")
+
+
+@profiled()
+def compact_categoricals(df, columns=None, max_ratio=CATEGORY_MAX_RATIO, exclude=()):
+    """
+    Dictionary-encode low-cardinality text columns as pandas categoricals.
+
+    Columns such as Type, UQC, Invoice_Currency, countries, cities and the
+    _cluster columns repeat a handful of values, so storing each distinct
+    string once plus small integer codes cuts their memory several times over
+    and turns filters and group-bys into integer operations. Only real text
+    is encoded: mixed numeric-text columns (a Quantity with a few stray
+    strings) stay as they are so arithmetic and Parquet writes keep working.
+
+    Args:
+        df: DataFrame to encode (not modified)
+        columns: Columns to consider, defaults to every object/string column
+        max_ratio: Largest distinct-values-to-rows ratio that still gets encoded
+        exclude: Further columns never to encode (e.g. the configured quantity and value columns)
+
+    Returns:
+        DataFrame sharing all other columns with df.
+    """
+    if len(df) == 0:
+        return df
+    if columns is None:
+        columns = [col for col in df.columns if pd.api.types.is_object_dtype(df[col]) or pd.api.types.is_string_dtype(df[col])]
+    skip = {col for col in exclude if col}
+
+    df = df.copy(deep=False)
+    for col in columns:
+        if col not in df.columns or col in skip or isinstance(df[col].dtype, pd.CategoricalDtype):
+            continue
+        if any(hint in str(col).lower() for hint in MEASURE_COLUMN_HINTS):
+            continue
+        try:
+            uniques = df[col].dropna().unique()
+        except TypeError:
+            # Unhashable cell values (lists, dicts) can't be encoded
+            continue
+        if len(uniques) > max_ratio * len(df) or pd.api.types.infer_dtype(uniques, skipna=True) != "string":
+            continue
+        if pd.to_numeric(pd.Series(uniques), errors="coerce").notna().mean() > CATEGORY_MAX_NUMERIC_SHARE:
+            continue
+        df[col] = df[col].astype("category")
+    return df
+
+
 def convert_df_to_csv_bytes(df):
     """Convert DataFrame to CSV bytes for download."""
     return df.to_csv(index=False).encode('utf-8')
@@ -224,6 +438,7 @@ def extract_numeric_quantity(val):
     match = re.match(r'^\s*(\d+(?:\.\d+)?)', str(val))
     return float(match.group(1)) if match else None
 
+@profiled()
 def convert_to_kg(df, quantity_col="Quantity", unit_col="UQC"):
     changed_rows = []
     rows_to_delete = []
@@ -299,9 +514,11 @@ def fetch_supported_currencies():
     except Exception:
         return None
 
-def convert_sheet_to_usd(df, currency_col, value_cols, progress_callback=None, status_callback=None, warning_callback=None, success_callback=None):
-    df_result = df.copy()
-    rate_cache = {}
+@profiled()
+def convert_sheet_to_usd(df, currency_col, value_cols, progress_callback=None, status_callback=None, warning_callback=None, success_callback=None, rate_cache=None):
+    df_result = df.copy(deep=False)
+    # Pass a shared dict to look each currency up once across several frames (e.g. chunks of one file)
+    rate_cache = {} if rate_cache is None else rate_cache
     total_rows = len(df)
 
     for idx, row in df.iterrows():
@@ -357,6 +574,7 @@ def get_conversion_rate(from_currency, to_currency="USD"):
     return rate
 
 
+@profiled()
 def convert_month_column_to_datetime(df):
     """
     Converts various messy date formats in the 'Month' column to datetime (e.g., 2020-04-01).
@@ -420,32 +638,39 @@ def clean_supplier_name(name):
     return name.strip()
 
 
-def cluster_supplier_names(df, supplier_column="Supplier_Name", threshold=90):
+def supplier_cluster_mapping(unique_names, threshold=90, canonical_names=None):
     """
-    Clusters similar supplier names using fuzzy matching and replaces the original column.
+    {name: canonical cluster name} for supplier names, in first-seen order.
+    Each name joins the first canonical name it matches, otherwise it starts a new cluster.
+    canonical_names seeds the clusters from an earlier run (new clusters are appended to it).
     """
-    if supplier_column not in df.columns:
-        return df
-
-    unique_names = df[supplier_column].dropna().unique()
-    clusters = []
-    canonical_names = []
+    canonical_names = [] if canonical_names is None else canonical_names
     name_to_cluster = {}
 
     for name in unique_names:
         cleaned = clean_supplier_name(name)
         matched = False
-        for i, canon in enumerate(canonical_names):
+        for canon in canonical_names:
             if fuzz.token_sort_ratio(cleaned, canon) > threshold:
-                clusters[i].append(name)
                 name_to_cluster[name] = canon  # Use canonical cluster name
                 matched = True
                 break
         if not matched:
-            clusters.append([name])
             canonical_names.append(cleaned)
             name_to_cluster[name] = cleaned
 
+    return name_to_cluster
+
+
+@profiled()
+def cluster_supplier_names(df, supplier_column="Supplier_Name", threshold=90):
+    """
+    Clusters similar supplier names using fuzzy matching and replaces the original column.
+    """
+    if supplier_column not in df.columns:
+        return df
+
+    name_to_cluster = supplier_cluster_mapping(df[supplier_column].dropna().unique(), threshold)
     df[supplier_column] = df[supplier_column].map(name_to_cluster).fillna(df[supplier_column])
     return df
 
@@ -482,16 +707,9 @@ def clean_location_name(name):
     return name
 
 
-def cluster_location_column(df, column="Importer_City_State", threshold=90):
-    """
-    Cluster and replace messy city-state strings using fuzzy matching.
-    """
-    if column not in df.columns:
-        return df
-
-    unique_values = df[column].dropna().unique()
-    canonical_names = []
-    clusters = []
+def location_cluster_mapping(unique_values, threshold=90, canonical_names=None):
+    """{city-state string: canonical cluster name}, built like supplier_cluster_mapping."""
+    canonical_names = [] if canonical_names is None else canonical_names
     value_to_cluster = {}
 
     for val in unique_values:
@@ -506,5 +724,17 @@ def cluster_location_column(df, column="Importer_City_State", threshold=90):
             canonical_names.append(cleaned)
             value_to_cluster[val] = cleaned
 
+    return value_to_cluster
+
+
+@profiled()
+def cluster_location_column(df, column="Importer_City_State", threshold=90):
+    """
+    Cluster and replace messy city-state strings using fuzzy matching.
+    """
+    if column not in df.columns:
+        return df
+
+    value_to_cluster = location_cluster_mapping(df[column].dropna().unique(), threshold)
     df[column] = df[column].map(value_to_cluster).fillna(df[column])
-    return df
\ No newline at end of file
+    return df
@@ -0,0 +1,108 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+# Warn in the app when the session's dataset versions together exceed this
+MEMORY_BUDGET_MB = float(os.environ.get("DATASET_MEMORY_BUDGET_MB", 4096))
+
+# Session-state keys of the pipeline's dataset versions, oldest first
+SESSION_VERSIONS = ["df_original", "df_cleaned", "df_final", "df_clustered"]
+
+
+def enable_copy_on_write():
+    """
+    Turn on pandas copy-on-write (the default from pandas 3).
+
+    With it, shallow copies and column subsets share column buffers until one
+    side writes, so each pipeline version only owns the columns it changed.
+    """
+    if int(pd.__version__.split(".")[0]) < 3:
+        pd.set_option("mode.copy_on_write", True)
+
+
+def _column_arrays(df):
+    """{column: ndarray} for numpy-backed columns, without copying."""
+    arrays = {}
+    for col in df.columns:
+        values = df[col].array
+        data = getattr(values, "_ndarray", None)
+        if data is None:
+            data = getattr(values, "_data", None) if not hasattr(values, "categories") else values.codes
+        if isinstance(data, np.ndarray):
+            arrays[col] = data
+    return arrays
+
+
+def version_memory_report(versions):
+    """
+    Memory held by each dataset version and how much of it is shared.
+
+    Args:
+        versions: Ordered dictionary of {version name: DataFrame}, oldest first
+
+    Returns:
+        DataFrame with one row per version: rows, columns, total MB (deep,
+        including string payloads), MB owned by that version alone, MB shared
+        with an earlier version and the names of the shared columns.
+    """
+    rows = []
+    earlier = []
+    for name, df in versions.items():
+        if df is None:
+            continue
+        sizes = df.memory_usage(deep=True, index=False)
+        arrays = _column_arrays(df)
+
+        shared_cols = [
+            col for col, data in arrays.items()
+            if any(np.may_share_memory(data, other) for prev in earlier for other in prev.values())
+        ]
+        total = float(sizes.sum())
+        shared = float(sizes[shared_cols].sum()) if shared_cols else 0.0
+        rows.append({
+            "Version": name,
+            "Rows": len(df),
+            "Columns": df.shape[1],
+            "Total MB": round(total / 1024 ** 2, 2),
+            "Own MB": round((total - shared) / 1024 ** 2, 2),
+            "Shared MB": round(shared / 1024 ** 2, 2),
+            "Shared Columns": ", ".join(map(str, shared_cols)),
+        })
+        earlier.append(arrays)
+
+    return pd.DataFrame(rows, columns=["Version", "Rows", "Columns", "Total MB", "Own MB", "Shared MB", "Shared Columns"])
+
+
+def session_footprint_mb(report):
+    """Memory actually held by all versions: each buffer counted once."""
+    return float(report["Own MB"].sum()) if not report.empty else 0.0
+
+
+def render_memory_panel(session_state, budget_mb=MEMORY_BUDGET_MB):
+    """Streamlit expander with the per-version memory report and a budget check."""
+    import streamlit as st
+
+    from dataset_store import dataset_store, session_frame
+
+    versions = {key: session_frame(session_state, key) for key in SESSION_VERSIONS if key in session_state}
+    if not versions:
+        return
+    report = version_memory_report(versions)
+    footprint = session_footprint_mb(report)
+
+    with st.expander("🧠 Memory Footprint"):
+        st.dataframe(report)
+        st.write(f"Used by this session: {footprint:,.1f} MB (budget {budget_mb:,.0f} MB)")
+        if footprint > budget_mb:
+            st.warning(
+                "Dataset versions exceed the memory budget "
+                "(set DATASET_MEMORY_BUDGET_MB to change it). Consider filtering the upload."
+            )
+
+        # Versions are shared with other sessions on the same upload, so they are held once per server
+        st.write(
+            f"Shared dataset cache (all sessions): {dataset_store.memory_bytes() / 1024 ** 2:,.1f} MB in memory "
+            f"of {dataset_store.max_bytes / 1024 ** 2:,.0f} MB (set SHARED_DATASET_MEMORY_MB to change it)"
+        )
+        st.dataframe(dataset_store.stats())
@@ -0,0 +1,237 @@
+"""
+Process-wide, read-only dataset cache shared by every Streamlit session.
+
+Sessions keep a DatasetRef in st.session_state instead of their own
+DataFrame, so five analysts working on the same upload hold one copy of
+it. Entries are keyed by content hash (the upload key plus the pipeline
+version name, or a fingerprint of the frame) and reference counted: a
+reference is released when the session drops it or the session itself is
+garbage collected. Once the frames in memory exceed max_bytes, the least
+recently used ones are spilled to Parquet and dropped from memory,
+unreferenced entries first; a reference to a spilled entry reloads it on
+next access.
+
+Shared frames must be treated as read-only. With pandas copy-on-write
+(see dataset_memory.enable_copy_on_write) anything derived from them, even
+a shallow copy, can be modified safely.
+"""
+import os
+import tempfile
+import threading
+import time
+import weakref
+
+import pandas as pd
+
+from export_formats import read_parquet_frame, write_parquet_frame
+
+MAX_MEMORY_BYTES = int(os.environ.get("SHARED_DATASET_MEMORY_MB", 8192)) * 1024 * 1024
+SPILL_DIR = os.environ.get(
+    "SHARED_DATASET_SPILL_DIR", os.path.join(tempfile.gettempdir(), "excel_automator", "shared")
+)
+MAX_SPILL_BYTES = int(os.environ.get("SHARED_DATASET_SPILL_MB", 16384)) * 1024 * 1024
+
+
+class _Entry:
+    def __init__(self, key, frame):
+        self.key = key
+        self.frame = frame
+        self.nbytes = int(frame.memory_usage(deep=True).sum())
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self.spill_path = None
+        self.spill_bytes = 0
+
+
+class DatasetRef:
+    """A session's handle on a shared dataset; `.frame` is the DataFrame."""
+
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        self._release = weakref.finalize(self, store._release, key)
+
+    @property
+    def frame(self):
+        return self.store._frame(self.key)
+
+    def release(self):
+        """Give up the reference now rather than when the ref is collected."""
+        self._release()
+
+
+class SharedDatasetStore:
+    """Content-addressed DataFrames with refcounts, a memory ceiling and LRU spill to disk."""
+
+    def __init__(self, max_bytes=MAX_MEMORY_BYTES, spill_dir=SPILL_DIR, max_spill_bytes=MAX_SPILL_BYTES):
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._entries = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def share(self, key, build):
+        """
+        Reference to the dataset stored under key, calling build() to create
+        it only when no session has shared it yet.
+
+        Args:
+            key: Content hash of the dataset; None hashes the built frame
+            build: Callable returning the DataFrame, or a DataFrame
+
+        Returns:
+            DatasetRef
+        """
+        if key is not None:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self.hits += 1
+                    return self._acquire(entry)
+
+        frame = build() if callable(build) else build
+        if key is None:
+            from pipeline import frame_fingerprint
+
+            key = frame_fingerprint(frame)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                # Another session may have built the same key meanwhile; the first one wins
+                self.misses += 1
+                entry = self._entries[key] = _Entry(key, frame)
+            ref = self._acquire(entry)
+            self._evict(keep=key)
+        return ref
+
+    def lookup(self, key):
+        """Reference to an already shared dataset, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return self._acquire(entry) if entry is not None else None
+
+    def _acquire(self, entry):
+        entry.refs += 1
+        entry.last_used = time.monotonic()
+        return DatasetRef(self, entry.key)
+
+    def _release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refs = max(entry.refs - 1, 0)
+
+    def _frame(self, key):
+        with self._lock:
+            entry = self._entries[key]
+            entry.last_used = time.monotonic()
+            if entry.frame is None:
+                entry.frame = read_parquet_frame(entry.spill_path)
+                self._evict(keep=key)
+            return entry.frame
+
+    def _memory_bytes(self):
+        return sum(entry.nbytes for entry in self._entries.values() if entry.frame is not None)
+
+    def _evict(self, keep=None):
+        total = self._memory_bytes()
+        if total <= self.max_bytes:
+            return
+        resident = [e for e in self._entries.values() if e.frame is not None and e.key != keep]
+        # Unreferenced entries go first, then least recently used
+        for entry in sorted(resident, key=lambda e: (e.refs > 0, e.last_used)):
+            if total <= self.max_bytes:
+                break
+            if self._spill(entry):
+                entry.frame = None
+            elif entry.refs == 0:
+                self._drop(entry)  # Could not spill, but nobody needs it
+            else:
+                continue
+            total -= entry.nbytes
+        self._trim_spill()
+
+    def _spill(self, entry):
+        if entry.spill_path is None:
+            path = os.path.join(self.spill_dir, f"{entry.key}.parquet")
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                write_parquet_frame(entry.frame, tmp_path)
+                os.replace(tmp_path, path)
+            except (OSError, ImportError, ValueError):
+                return False
+            entry.spill_path = path
+            entry.spill_bytes = os.path.getsize(path)
+        return True
+
+    def _trim_spill(self):
+        """Forget spilled entries nobody references once the spill directory is over its limit."""
+        total = sum(entry.spill_bytes for entry in self._entries.values())
+        for entry in sorted(self._entries.values(), key=lambda e: e.last_used):
+            if total <= self.max_spill_bytes:
+                break
+            if entry.refs == 0 and entry.frame is None:
+                total -= entry.spill_bytes
+                self._drop(entry)
+
+    def _drop(self, entry):
+        if entry.spill_path:
+            try:
+                os.remove(entry.spill_path)
+            except OSError:
+                pass
+        del self._entries[entry.key]
+
+    def stats(self):
+        """One row per shared dataset: references, size and where it lives."""
+        with self._lock:
+            rows = [
+                {
+                    "Key": entry.key[:16],
+                    "References": entry.refs,
+                    "MB": round(entry.nbytes / 1024 ** 2, 2),
+                    "In Memory": entry.frame is not None,
+                    "Spilled": entry.spill_path is not None,
+                }
+                for entry in sorted(self._entries.values(), key=lambda e: e.last_used, reverse=True)
+            ]
+        return pd.DataFrame(rows, columns=["Key", "References", "MB", "In Memory", "Spilled"])
+
+    def memory_bytes(self):
+        with self._lock:
+            return self._memory_bytes()
+
+    def clear(self):
+        """Drop every dataset no session references."""
+        with self._lock:
+            for entry in [e for e in self._entries.values() if e.refs == 0]:
+                self._drop(entry)
+
+
+dataset_store = SharedDatasetStore()
+
+
+def session_frame(session_state, name, default=None):
+    """
+    The DataFrame behind a session-state entry, resolving DatasetRefs.
+
+    Shared frames come back as a shallow copy, so a session that assigns a
+    column changes only its own view (copy-on-write keeps the buffers shared
+    until then) and never the frame other sessions read.
+    """
+    value = session_state.get(name, default)
+    return value.frame.copy(deep=False) if isinstance(value, DatasetRef) else value
+
+
+def session_version(session_state, name):
+    """
+    Dataset-store key (content hash) of a session-state entry, None when it
+    is not a shared dataset. Caches built from a dataset key on this rather
+    than on Streamlit's hash of the frame, which samples large frames.
+    """
+    value = session_state.get(name)
+    return value.key if isinstance(value, DatasetRef) else None
@@ -1,9 +1,19 @@
+import os
+import tempfile
+import weakref
 import pandas as pd
+import numpy as np
 from io import BytesIO
-import openpyxl
-from openpyxl.styles import PatternFill
+import xlsxwriter
+from xlsxwriter.utility import xl_col_to_name
 import random
 
+FILL_MODES = ["cells", "rows", "banding", "conditional"]
+DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+BAND_COLORS = ["E6F3FF", "FFFFFF"]
+EXCEL_MAX_DATA_ROWS = 1_048_576 - 1  # sheet row limit minus the header row
+CHUNK_ROWS = 50_000
+
 
 def generate_colors(n):
     """Generate n distinct colors for clusters"""
@@ -27,59 +37,253 @@ def generate_colors(n):
         return colors + additional_colors
 
 
-def create_colored_excel(df, cluster_column):
-    """Create an Excel file with color-coded clusters"""
+class ClusterFormats:
+    """One cached xlsxwriter format per cluster color (plus a date variant), created on first use."""
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self._fills = {}
+        self._dates = {}
+        self.date = workbook.add_format({"num_format": DATETIME_FORMAT})
+
+    def fill(self, color_hex):
+        if color_hex not in self._fills:
+            self._fills[color_hex] = self.workbook.add_format({"bg_color": f"#{color_hex}", "pattern": 1})
+        return self._fills[color_hex]
+
+    def date_fill(self, color_hex):
+        if color_hex not in self._dates:
+            self._dates[color_hex] = self.workbook.add_format(
+                {"bg_color": f"#{color_hex}", "pattern": 1, "num_format": DATETIME_FORMAT}
+            )
+        return self._dates[color_hex]
+
+
+def excel_columns(df):
+    """
+    Column-wise object arrays ready for xlsxwriter: NaN/NaT become None and
+    datetimes become Python datetimes. Also returns the datetime column positions.
+    """
+    columns = []
+    date_positions = []
+    for pos, col in enumerate(df.columns):
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            values = series.astype(object).to_numpy()
+            date_positions.append(pos)
+        else:
+            values = series.to_numpy(dtype=object)
+        missing = pd.isna(series).to_numpy()
+        if missing.any():
+            values = values.copy()
+            values[missing] = None
+        columns.append(values)
+    return columns, date_positions
+
+
+def write_data_rows(worksheet, formats, columns, date_positions, row_colors, fill_mode="cells", start_row=1):
+    """
+    Write data rows in one pass, coloring each row by its cluster color.
+
+    Args:
+        worksheet: xlsxwriter worksheet
+        formats: ClusterFormats for the workbook
+        columns: Column-wise value arrays from excel_columns (same length as row_colors)
+        date_positions: Positions of datetime columns
+        row_colors: Hex color per row
+        fill_mode: "cells" formats every cell, "rows"/"banding" use one row format
+                   per row, "conditional" writes no fills (rules are added separately)
+        start_row: Zero-based worksheet row of the first data row
+    """
+    for offset, (values, color) in enumerate(zip(zip(*columns), row_colors)):
+        row = start_row + offset
+        if fill_mode == "cells":
+            worksheet.write_row(row, 0, values, formats.fill(color))
+        elif fill_mode in ("rows", "banding"):
+            worksheet.set_row(row, None, formats.fill(color))
+            worksheet.write_row(row, 0, values)
+        else:
+            worksheet.write_row(row, 0, values)
+
+        for pos in date_positions:
+            if values[pos] is not None:
+                date_format = formats.date if fill_mode == "conditional" else formats.date_fill(color)
+                worksheet.write_datetime(row, pos, values[pos], date_format)
+
+
+def add_cluster_conditional_formats(worksheet, formats, cluster_colors, cluster_col_idx, first_row, last_row, n_cols):
+    """One formula rule per cluster, coloring rows whose cluster cell matches."""
+    if last_row < first_row:
+        return
+    col_letter = xl_col_to_name(cluster_col_idx)
+    for cluster, color in cluster_colors.items():
+        literal = str(cluster).replace('"', '""')
+        if len(literal) > 200:  # Excel formula length limits
+            continue
+        worksheet.conditional_format(first_row, 0, last_row, n_cols - 1, {
+            "type": "formula",
+            "criteria": f'=${col_letter}{first_row + 1}="{literal}"',
+            "format": formats.fill(color),
+        })
+
+
+def write_cluster_summary(workbook, formats, cluster_summary, row_colors):
+    """Cluster_Summary sheet with one colored row per cluster."""
+    summary_sheet = workbook.add_worksheet('Cluster_Summary')
+    summary_sheet.write_row(0, 0, [str(col) for col in cluster_summary.columns])
+    columns, date_positions = excel_columns(cluster_summary)
+    write_data_rows(summary_sheet, formats, columns, date_positions, row_colors)
+
+
+def data_sheet_names(n_rows, max_rows_per_sheet=EXCEL_MAX_DATA_ROWS):
+    """'Clustered_Data' when the rows fit one sheet, else Clustered_Data_1..N."""
+    n_sheets = max(1, -(-n_rows // max_rows_per_sheet))
+    if n_sheets == 1:
+        return ['Clustered_Data']
+    return [f'Clustered_Data_{i}' for i in range(1, n_sheets + 1)]
+
+
+def write_colored_workbook(workbook, df, cluster_col, fill_mode="cells", chunk_rows=CHUNK_ROWS,
+                           max_rows_per_sheet=EXCEL_MAX_DATA_ROWS, progress_callback=None):
+    """
+    Write cluster-sorted, colored data sheets plus Cluster_Summary into an open workbook.
+
+    Rows are sorted through an index permutation and converted chunk by chunk,
+    so only one chunk of cell values exists at a time. Data rows beyond
+    max_rows_per_sheet continue on the next Clustered_Data_N sheet.
+    """
+    # Sort by cluster to group similar items together (NaN clusters last)
+    codes, uniques = pd.factorize(df[cluster_col], sort=True)
+    n_groups = len(uniques) + (1 if (codes < 0).any() else 0)
+    codes = np.where(codes < 0, len(uniques), codes)
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+
+    # Get unique clusters and assign colors
+    colors = generate_colors(n_groups)
+    if fill_mode == "banding":
+        row_palette = [BAND_COLORS[i % len(BAND_COLORS)] for i in range(n_groups)]
+    else:
+        row_palette = colors
+
+    formats = ClusterFormats(workbook)
+    header = [str(col) for col in df.columns]
+    cluster_col_idx = df.columns.get_loc(cluster_col)
+    n_rows = len(df)
+    sheet_names = data_sheet_names(n_rows, max_rows_per_sheet)
+    cluster_colors = dict(zip(uniques, colors))
+
+    written = 0
+    for sheet_no, sheet_name in enumerate(sheet_names):
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, header)
+        sheet_start = sheet_no * max_rows_per_sheet
+        sheet_end = min(sheet_start + max_rows_per_sheet, n_rows)
+
+        for start in range(sheet_start, sheet_end, chunk_rows):
+            end = min(start + chunk_rows, sheet_end)
+            chunk = df.iloc[order[start:end]]
+            columns, date_positions = excel_columns(chunk)
+            row_colors = [row_palette[code] for code in sorted_codes[start:end]]
+            write_data_rows(worksheet, formats, columns, date_positions, row_colors, fill_mode,
+                            start_row=1 + start - sheet_start)
+
+            written = end
+            if progress_callback:
+                progress_callback(written / n_rows, f"Wrote {written:,} of {n_rows:,} rows ({sheet_name})")
+
+        if fill_mode == "conditional":
+            add_cluster_conditional_formats(
+                worksheet, formats, cluster_colors, cluster_col_idx,
+                1, sheet_end - sheet_start, len(header)
+            )
+
+    # Create a summary sheet with cluster information
+    counts = np.bincount(codes, minlength=n_groups)[:len(uniques)]
+    cluster_summary = pd.DataFrame({cluster_col: uniques, 'Count': counts, 'Color': colors[:len(uniques)]})
+    write_cluster_summary(workbook, formats, cluster_summary, colors[:len(uniques)])
+    return sheet_names
+
+
+def create_colored_excel(df, cluster_column, fill_mode="cells"):
+    """
+    Create an Excel file with color-coded clusters.
+
+    fill_mode: "cells" (default) fills every data cell, "rows" applies one
+    row format per row, "banding" alternates two colors between cluster
+    groups, and "conditional" adds one conditional-format rule per cluster
+    instead of writing fills.
+    """
     cluster_col = f"{cluster_column}_cluster"
-    
+
     if cluster_col not in df.columns:
         return None
-    
-    # Sort by cluster to group similar items together
-    df_sorted = df.sort_values(by=cluster_col).reset_index(drop=True)
-    
-    # Get unique clusters and assign colors
-    unique_clusters = df_sorted[cluster_col].unique()
-    colors = generate_colors(len(unique_clusters))
-    cluster_colors = dict(zip(unique_clusters, colors))
-    
+    if fill_mode not in FILL_MODES:
+        raise ValueError(f"fill_mode must be one of {FILL_MODES}")
+
     # Create Excel file in memory
     output = BytesIO()
-    
-    # Write to Excel
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        # Write main data sheet
-        df_sorted.to_excel(writer, sheet_name='Clustered_Data', index=False)
-        
-        # Get the workbook and worksheet
-        workbook = writer.book
-        worksheet = writer.sheets['Clustered_Data']
-        
-        # Apply colors to rows based on clusters
-        cluster_col_idx = df_sorted.columns.get_loc(cluster_col) + 1  # +1 for Excel 1-based indexing
-        
-        for row in range(2, len(df_sorted) + 2):  # Start from row 2 (after header)
-            cluster_value = df_sorted.iloc[row-2][cluster_col]
-            color_hex = cluster_colors.get(cluster_value, 'FFFFFF')
-            fill = PatternFill(start_color=color_hex, end_color=color_hex, fill_type='solid')
-            
-            # Apply color to entire row
-            for col in range(1, len(df_sorted.columns) + 1):
-                worksheet.cell(row=row, column=col).fill = fill
-        
-        # Create a summary sheet with cluster information
-        cluster_summary = df_sorted.groupby(cluster_col).size().reset_index(name='Count')
-        cluster_summary['Color'] = cluster_summary[cluster_col].map(cluster_colors)
-        cluster_summary.to_excel(writer, sheet_name='Cluster_Summary', index=False)
-        
-        # Apply colors to summary sheet
-        summary_sheet = writer.sheets['Cluster_Summary']
-        for row in range(2, len(cluster_summary) + 2):
-            cluster_value = cluster_summary.iloc[row-2][cluster_col]
-            color_hex = cluster_colors.get(cluster_value, 'FFFFFF')
-            fill = PatternFill(start_color=color_hex, end_color=color_hex, fill_type='solid')
-            
-            for col in range(1, len(cluster_summary.columns) + 1):
-                summary_sheet.cell(row=row, column=col).fill = fill
-    
+    workbook = xlsxwriter.Workbook(output, {"in_memory": True, "nan_inf_to_errors": True})
+    write_colored_workbook(workbook, df, cluster_col, fill_mode)
+    workbook.close()
+
     output.seek(0)
-    return output.getvalue()
\ No newline at end of file
+    return output.getvalue()
+
+
+def create_colored_excel_streaming(df, cluster_column, fill_mode="cells", path=None, chunk_rows=CHUNK_ROWS,
+                                   max_rows_per_sheet=EXCEL_MAX_DATA_ROWS, progress_callback=None):
+    """
+    Constant-memory variant of create_colored_excel that writes to a file.
+
+    Rows are flushed to disk as they are written, data past the sheet row
+    limit is split across Clustered_Data_1..N, and progress_callback(fraction,
+    message) is called after every chunk.
+
+    Returns:
+        Path of the written .xlsx file (a new temp file when path is None),
+        or None if the cluster column is missing.
+    """
+    cluster_col = f"{cluster_column}_cluster"
+
+    if cluster_col not in df.columns:
+        return None
+    if fill_mode not in FILL_MODES:
+        raise ValueError(f"fill_mode must be one of {FILL_MODES}")
+
+    if path is None:
+        handle, path = tempfile.mkstemp(prefix="clustered_", suffix=".xlsx")
+        os.close(handle)
+
+    workbook = xlsxwriter.Workbook(path, {"constant_memory": True, "nan_inf_to_errors": True})
+    try:
+        write_colored_workbook(workbook, df, cluster_col, fill_mode, chunk_rows, max_rows_per_sheet, progress_callback)
+    finally:
+        workbook.close()
+    return path
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class ExportFile:
+    """
+    A temp export file owned by one session. The file is deleted on release()
+    (e.g. when a newer export replaces it) or when the object is collected
+    with the session state at the end of the session.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._remove = weakref.finalize(self, _remove_file, path)
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def release(self):
+        self._remove()
@@ -0,0 +1,244 @@
+import importlib.util
+import json
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# label: (file extension, mime type, required optional module)
+EXPORT_FORMATS = {
+    "CSV": (".csv", "text/csv", None),
+    "CSV (gzip)": (".csv.gz", "application/gzip", None),
+    "CSV (zstd)": (".csv.zst", "application/zstd", "zstandard"),
+    "Parquet (snappy)": (".parquet", "application/vnd.apache.parquet", "pyarrow"),
+    "Parquet (zstd)": (".parquet", "application/vnd.apache.parquet", "pyarrow"),
+    "Feather (Arrow IPC)": (".feather", "application/vnd.apache.arrow.file", "pyarrow"),
+}
+
+MAX_PAYLOAD_CACHE_BYTES = 512 * 1024 * 1024
+
+
+def available_formats():
+    """Export formats whose optional dependencies are installed."""
+    return [
+        label for label, (_, _, module) in EXPORT_FORMATS.items()
+        if module is None or importlib.util.find_spec(module) is not None
+    ]
+
+
+def arrow_safe(df):
+    """
+    Make a frame writable by Arrow: mixed-type object columns become strings
+    and non-string column names are stringified. Other dtypes are kept.
+    """
+    mixed = [
+        col for col in df.columns
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed")
+    ]
+    if not mixed and all(isinstance(col, str) for col in df.columns):
+        return df
+
+    safe = df.copy()
+    for col in mixed:
+        safe[col] = safe[col].astype("string")
+    safe.columns = [str(col) for col in safe.columns]
+    return safe
+
+
+MIXED_METADATA_KEY = b"excel_automator.mixed_columns"
+MIXED_NUMERIC_PREFIX = "__numeric__"
+
+
+def write_parquet_frame(df, path, compression="zstd"):
+    """
+    Write a working DataFrame to Parquet without losing mixed-type columns.
+
+    Object columns holding both text and numbers (e.g. Quantity after unit
+    conversion) are split into a text column and a hidden numeric column,
+    and read_parquet_frame puts them back together.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    frame = df.copy(deep=False)
+    frame.columns = [str(col) for col in frame.columns]
+    mixed = []
+    for col in list(frame.columns):
+        series = frame[col]
+        if series.dtype != object or not pd.api.types.infer_dtype(series, skipna=True).startswith("mixed"):
+            continue
+        is_number = series.map(lambda v: isinstance(v, (int, float)) and not isinstance(v, bool))
+        frame[col] = series.where(~is_number).map(lambda v: str(v) if pd.notna(v) and not isinstance(v, str) else v)
+        frame[f"{MIXED_NUMERIC_PREFIX}{col}"] = pd.to_numeric(series.where(is_number), errors="coerce")
+        mixed.append(col)
+
+    table = pa.Table.from_pandas(frame)
+    metadata = {**(table.schema.metadata or {}), MIXED_METADATA_KEY: json.dumps(mixed).encode("utf-8")}
+    pq.write_table(table.replace_schema_metadata(metadata), path, compression=compression)
+
+
+def read_parquet_frame(path, columns=None):
+    """Read a frame written by write_parquet_frame, optionally only some of its columns."""
+    import pyarrow.parquet as pq
+
+    if columns is not None:
+        schema = pq.read_schema(path)
+        companions = [f"{MIXED_NUMERIC_PREFIX}{col}" for col in columns]
+        columns = [col for col in [*columns, *companions] if col in schema.names]
+    table = pq.read_table(path, columns=columns)
+    mixed = json.loads((table.schema.metadata or {}).get(MIXED_METADATA_KEY, b"[]"))
+    df = table.to_pandas()
+    for col in [col for col in mixed if col in df.columns]:
+        numbers = df.pop(f"{MIXED_NUMERIC_PREFIX}{col}")
+        text = df[col].astype(object).where(df[col].notna(), np.nan)
+        df[col] = numbers.astype(object).where(numbers.notna(), text)
+    return df
+
+
+HIVE_DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+
+def write_partitioned_frame(df, root, date_col, basename="part-0"):
+    """
+    Write df as Hive-style Parquet partitions, root/year=YYYY/month=MM/<basename>.parquet,
+    using write_parquet_frame. Rows without a date go to the Hive default partition.
+
+    Returns:
+        List of (relative partition path, rows written)
+    """
+    dates = pd.to_datetime(df[date_col], errors="coerce")
+    written = []
+    for (year, month), part in df.groupby([dates.dt.year, dates.dt.month], dropna=False, sort=True):
+        if pd.isna(year):
+            partition = os.path.join(f"year={HIVE_DEFAULT_PARTITION}", f"month={HIVE_DEFAULT_PARTITION}")
+        else:
+            partition = os.path.join(f"year={int(year)}", f"month={int(month):02d}")
+        os.makedirs(os.path.join(root, partition), exist_ok=True)
+        path = os.path.join(root, partition, f"{basename}.parquet")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        write_parquet_frame(part, tmp_path)
+        os.replace(tmp_path, path)
+        written.append((partition, len(part)))
+    return written
+
+
+def export_dataframe(df, fmt="CSV", index=False):
+    """Serialize a DataFrame to bytes in one of EXPORT_FORMATS."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Available: {', '.join(EXPORT_FORMATS)}")
+
+    buffer = BytesIO()
+    if fmt == "CSV":
+        return df.to_csv(index=index).encode("utf-8")
+    elif fmt == "CSV (gzip)":
+        df.to_csv(buffer, index=index, compression={"method": "gzip", "compresslevel": 6, "mtime": 0})
+    elif fmt == "CSV (zstd)":
+        df.to_csv(buffer, index=index, compression={"method": "zstd", "level": 3})
+    elif fmt.startswith("Parquet"):
+        compression = "zstd" if "zstd" in fmt else "snappy"
+        arrow_safe(df).to_parquet(buffer, engine="pyarrow", compression=compression, index=index)
+    elif fmt.startswith("Feather"):
+        frame = df if index is False else df.reset_index()
+        arrow_safe(frame.reset_index(drop=True)).to_feather(buffer, compression="zstd")
+    return buffer.getvalue()
+
+
+def export_filename(base_name, fmt):
+    """File name for base_name (without extension) in the given format."""
+    return f"{base_name}{EXPORT_FORMATS[fmt][0]}"
+
+
+class PayloadCache:
+    """
+    Process-wide LRU of serialized download payloads, bounded by total bytes.
+
+    Entries are keyed on the dataset version (the dataset-store key) when the
+    caller has one, so every rerun and session viewing that dataset shares
+    one payload. Otherwise they are keyed on the identity of the source
+    DataFrame; a weak reference then guards against a recycled id() after
+    the original frame is garbage collected, so a new dataset version never
+    matches an old payload.
+    """
+
+    def __init__(self, max_bytes=MAX_PAYLOAD_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _key(self, df, fmt, index, version):
+        # Shape and schema catch in-place column edits on the same frame object
+        schema = tuple(zip(map(str, df.columns), map(str, df.dtypes)))
+        return (version or id(df), df.shape, schema, fmt, index)
+
+    def peek(self, df, fmt, index=False, version=None):
+        """Cached payload or None, without building it."""
+        key = self._key(df, fmt, index, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            ref, payload = entry
+            if ref is not None and ref() is not df:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def get(self, df, fmt, index=False, version=None):
+        """Cached payload, serializing it on first request."""
+        payload = self.peek(df, fmt, index, version)
+        if payload is not None:
+            return payload
+
+        payload = export_dataframe(df, fmt, index=index)
+        key = self._key(df, fmt, index, version)
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (None if version else weakref.ref(df), payload)
+            self._total += len(payload)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                self._drop(next(iter(self._entries)))
+        return payload
+
+    def _drop(self, key):
+        _, payload = self._entries.pop(key)
+        self._total -= len(payload)
+
+    def size_bytes(self):
+        return self._total
+
+
+payload_cache = PayloadCache()
+
+
+def render_download(df, label, base_name, key, index=False, version=None):
+    """
+    Format selector plus an on-demand download.
+
+    Nothing is serialized on a plain rerun: the payload is built when the user
+    asks for it and then served from payload_cache until the dataset changes.
+    Pass the dataset-store version for shared datasets: session_frame hands
+    out a new view of them on every rerun, so their id() never repeats.
+    """
+    fmt = st.selectbox(f"{label} format", available_formats(), key=f"{key}_format")
+    payload = payload_cache.peek(df, fmt, index, version)
+
+    if payload is None and st.button(f"Prepare {fmt} file", key=f"{key}_prepare"):
+        with st.spinner(f"Preparing {fmt} file..."):
+            payload = payload_cache.get(df, fmt, index, version)
+
+    if payload is not None:
+        st.download_button(
+            label,
+            data=payload,
+            file_name=export_filename(base_name, fmt),
+            mime=EXPORT_FORMATS[fmt][1],
+            key=f"{key}_download",
+        )
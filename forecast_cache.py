@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Per-user directory: entries are read back by every session of this user only
+CACHE_DIR = os.environ.get(
+    "FORECAST_CACHE_DIR",
+    os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "excel_automator", "forecasts"),
+)
+MAX_MEMORY_ENTRIES = 512
+MAX_DISK_BYTES = 256 * 1024 * 1024
+# Trimming stops once the disk layer is back under this share of max_disk_bytes
+TRIM_TARGET = 0.8
+
+
+def series_key(monthly_df, engine, periods, params=None):
+    """Content hash of a monthly ds/y series plus the forecast settings."""
+    digest = hashlib.sha256()
+    digest.update(monthly_df["ds"].to_numpy(dtype="datetime64[ns]").view(np.int64).tobytes())
+    digest.update(monthly_df["y"].to_numpy(dtype=np.float64).tobytes())
+    digest.update(json.dumps([engine, periods, params or {}], sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class ForecastCache:
+    """
+    Two-level forecast cache: an in-memory LRU of recent results backed by
+    .npz entries on disk (plain arrays, loaded without pickle), trimmed
+    oldest-first once a running size count passes max_disk_bytes.
+
+    Entries are forecasts (engine, ds, values), not fitted models: the key
+    already covers the series, engine, horizon and parameters, so a hit never
+    needs the model, and the statsmodels engines only serialize through
+    pickle, which this cache does not load.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_memory_entries=MAX_MEMORY_ENTRIES, max_disk_bytes=MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._disk_bytes = None     # running total of the disk layer, counted on the first put
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def get(self, key):
+        """Return the cached (engine_name, forecast_df) or None."""
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                entry = (str(data["engine"]), data["ds"], data["values"])
+            os.utime(path)  # refresh for LRU on disk
+        except (OSError, ValueError, KeyError, EOFError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+            self._remember(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._remember(key, entry)
+
+        engine_name, ds, values = entry
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.savez(
+                    f,
+                    engine=np.array(engine_name),
+                    ds=np.asarray(ds, dtype="datetime64[ns]"),
+                    values=np.asarray(values, dtype=np.float64),
+                )
+            os.replace(tmp_path, self._path(key))
+            self._count_disk(os.path.getsize(self._path(key)))
+        except OSError:
+            pass  # Disk layer is best-effort; memory still serves this session
+
+    def _remember(self, key, entry):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npz"):
+                stat = os.stat(os.path.join(self.cache_dir, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def _count_disk(self, added):
+        """Add a written entry to the running size and scan the directory only when it passes the limit."""
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            else:
+                self._disk_bytes += added
+            if self._disk_bytes > self.max_disk_bytes:
+                self._trim_disk()
+
+    def _trim_disk(self):
+        entries = self._disk_entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes * TRIM_TARGET:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+                total -= size
+            except OSError:
+                pass
+        self._disk_bytes = total
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = None
+        if os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".npz"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+
+forecast_cache = ForecastCache()
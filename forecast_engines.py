@@ -0,0 +1,181 @@
+import numpy as np
+import pandas as pd
+
+SEASON_LENGTH = 12
+SEASONALITY_THRESHOLD = 0.3
+
+
+class ForecastEngine:
+    """
+    Base forecasting engine.
+
+    fit() takes a monthly ds/y frame and returns a fitted state, predict()
+    turns that state into `periods` future values; forecast() does both.
+    Vectorized engines also implement forecast_batch() over a 2-D array whose
+    rows are series left-padded with NaN to a common length.
+    """
+    name = "base"
+    vectorized = False
+
+    def fit(self, history):
+        raise NotImplementedError
+
+    def predict(self, state, periods):
+        raise NotImplementedError
+
+    def forecast(self, history, periods):
+        return self.predict(self.fit(history), periods)
+
+    def forecast_batch(self, matrix, periods):
+        raise NotImplementedError(f"{self.name} has no batch mode")
+
+
+class ProphetEngine(ForecastEngine):
+    name = "prophet"
+
+    def fit(self, history):
+        # Heavy import kept local so the baselines never pay for it
+        from prophet import Prophet
+
+        model = Prophet()
+        model.fit(history[["ds", "y"]])
+        return model
+
+    def predict(self, state, periods):
+        future = state.make_future_dataframe(periods=periods, freq='M')
+        return state.predict(future)["yhat"].tail(periods).to_numpy()
+
+
+class HoltWintersEngine(ForecastEngine):
+    name = "holt_winters"
+
+    def fit(self, history):
+        from statsmodels.tsa.holtwinters import ExponentialSmoothing
+
+        y = history["y"].to_numpy(dtype=float)
+        seasonal = "add" if len(y) >= 2 * SEASON_LENGTH else None
+        return ExponentialSmoothing(
+            y,
+            trend="add",
+            seasonal=seasonal,
+            seasonal_periods=SEASON_LENGTH if seasonal else None,
+        ).fit()
+
+    def predict(self, state, periods):
+        return np.asarray(state.forecast(periods))
+
+
+class SeasonalNaiveEngine(ForecastEngine):
+    """Repeat the last observed year; falls back to the last value for short series."""
+    name = "seasonal_naive"
+    vectorized = True
+
+    def fit(self, history):
+        return history["y"].to_numpy(dtype=float)[None, :]
+
+    def predict(self, state, periods):
+        return self.forecast_batch(state, periods)[0]
+
+    def forecast_batch(self, matrix, periods):
+        matrix = np.asarray(matrix, dtype=float)
+        n = matrix.shape[1]
+        lengths = (~np.isnan(matrix)).sum(axis=1)
+        last = matrix[:, -1:]
+
+        if n < SEASON_LENGTH:
+            return np.repeat(last, periods, axis=1)
+
+        season_idx = n - SEASON_LENGTH + (np.arange(periods) % SEASON_LENGTH)
+        seasonal = matrix[:, season_idx]
+        return np.where((lengths >= SEASON_LENGTH)[:, None], seasonal, last)
+
+
+class LinearTrendEngine(ForecastEngine):
+    """Ordinary least-squares line over time, solved in closed form for all rows at once."""
+    name = "linear"
+    vectorized = True
+
+    def fit(self, history):
+        return history["y"].to_numpy(dtype=float)[None, :]
+
+    def predict(self, state, periods):
+        return self.forecast_batch(state, periods)[0]
+
+    def forecast_batch(self, matrix, periods):
+        matrix = np.asarray(matrix, dtype=float)
+        n = matrix.shape[1]
+        mask = ~np.isnan(matrix)
+        y = np.where(mask, matrix, 0.0)
+        t = np.arange(n, dtype=float)[None, :]
+
+        count = np.maximum(mask.sum(axis=1, keepdims=True), 1)
+        t_mean = (t * mask).sum(axis=1, keepdims=True) / count
+        y_mean = y.sum(axis=1, keepdims=True) / count
+        t_dev = np.where(mask, t - t_mean, 0.0)
+
+        var = (t_dev ** 2).sum(axis=1, keepdims=True)
+        cov = (t_dev * (y - y_mean)).sum(axis=1, keepdims=True)
+        slope = np.divide(cov, var, out=np.zeros_like(cov), where=var > 0)
+        intercept = y_mean - slope * t_mean
+
+        future_t = np.arange(n, n + periods, dtype=float)[None, :]
+        return intercept + slope * future_t
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in (ProphetEngine(), HoltWintersEngine(), SeasonalNaiveEngine(), LinearTrendEngine())
+}
+
+
+def get_engine(name):
+    if name not in ENGINES:
+        raise ValueError(f"Unknown forecast engine '{name}'. Available: {', '.join(ENGINES)}")
+    return ENGINES[name]
+
+
+def seasonal_strength(matrix, lag=SEASON_LENGTH):
+    """Lag-12 autocorrelation per row (NaN-padded rows allowed); 0 when too short."""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+    if matrix.shape[1] <= lag:
+        return np.zeros(matrix.shape[0])
+
+    mean = np.nanmean(matrix, axis=1, keepdims=True)
+    dev = matrix - mean
+    head, tail = dev[:, :-lag], dev[:, lag:]
+    both = ~np.isnan(head) & ~np.isnan(tail)
+    num = np.where(both, head * tail, 0.0).sum(axis=1)
+    den = np.nansum(dev ** 2, axis=1)
+    return np.divide(num, den, out=np.zeros_like(num), where=den > 0)
+
+
+def select_engines(matrix):
+    """Pick an engine name per row from its observed length and seasonality."""
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=float))
+    lengths = (~np.isnan(matrix)).sum(axis=1)
+    seasonal = seasonal_strength(matrix) >= SEASONALITY_THRESHOLD
+
+    names = np.full(len(matrix), LinearTrendEngine.name, dtype=object)
+    names[(lengths >= SEASON_LENGTH) & seasonal] = SeasonalNaiveEngine.name
+    names[lengths >= 2 * SEASON_LENGTH] = HoltWintersEngine.name
+    return names
+
+
+def select_engine(y):
+    """Automatic engine choice for a single series."""
+    return select_engines(np.asarray(y, dtype=float)[None, :])[0]
+
+
+def pad_histories(histories):
+    """Stack ds/y frames into a NaN left-padded 2-D array aligned on the last month."""
+    width = max((len(h) for h in histories), default=0)
+    matrix = np.full((len(histories), width), np.nan)
+    for row, history in enumerate(histories):
+        if len(history):
+            matrix[row, width - len(history):] = history["y"].to_numpy(dtype=float)
+    return matrix
+
+
+def future_months(last_ds, periods):
+    """Month-end timestamps following last_ds."""
+    return pd.date_range(start=last_ds, periods=periods + 1, freq='M')[1:]
@@ -1,77 +1,260 @@
-from prophet import Prophet
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
+import numpy as np
 from io import BytesIO
-import matplotlib.dates as mdates
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from forecast_engines import get_engine, select_engine, select_engines, pad_histories, future_months
+from forecast_cache import forecast_cache, series_key
 
-def forecast_item(df, item_name, value_column, cluster_col, date_col="Month"):
+def monthly_history(df, item_name, value_column, cluster_col, date_col="Month"):
+    """Build the zero-filled monthly ds/y frame for one item directly from raw rows."""
+    # Filter data for the selected item
+    filtered_df = df[df[cluster_col] == item_name].copy()
+
+    # Convert date column to datetime
+    filtered_df[date_col] = pd.to_datetime(filtered_df[date_col], errors='coerce')
+    filtered_df = filtered_df.dropna(subset=[date_col, value_column])
+
+    # Ensure numeric values
+    filtered_df[value_column] = pd.to_numeric(filtered_df[value_column], errors='coerce')
+    filtered_df = filtered_df.dropna(subset=[value_column])
+
+    # Group by Month and fill missing months
+    monthly_df = filtered_df.groupby(pd.Grouper(key=date_col, freq='M'))[value_column].sum().reset_index()
+
+    # Fill missing months with zero
+    all_months = pd.date_range(start=monthly_df[date_col].min(), end=monthly_df[date_col].max(), freq='M')
+    monthly_df = monthly_df.set_index(date_col).reindex(all_months, fill_value=0).rename_axis("ds").reset_index()
+    return monthly_df.rename(columns={value_column: "y"})
+
+
+def forecast_item(df, item_name, value_column, cluster_col, date_col="Month", engine="prophet"):
     try:
-        # Filter data for the selected item
-        filtered_df = df[df[cluster_col] == item_name].copy()
+        monthly_df = monthly_history(df, item_name, value_column, cluster_col, date_col)
+    except Exception as e:
+        return None, f"Forecast error: {e}", None
+    return forecast_series(monthly_df, item_name, value_column, engine=engine)
 
-        # Convert date column to datetime
-        filtered_df[date_col] = pd.to_datetime(filtered_df[date_col], errors='coerce')
-        filtered_df = filtered_df.dropna(subset=[date_col, value_column])
 
-        # Ensure numeric values
-        filtered_df[value_column] = pd.to_numeric(filtered_df[value_column], errors='coerce')
-        filtered_df = filtered_df.dropna(subset=[value_column])
+MIN_FORECAST_MONTHS = 6
+FORECAST_HORIZON = 12
 
-        # Group by Month and fill missing months
-        monthly_df = filtered_df.groupby(pd.Grouper(key=date_col, freq='M'))[value_column].sum().reset_index()
 
-        # Fill missing months with zero
-        all_months = pd.date_range(start=monthly_df[date_col].min(), end=monthly_df[date_col].max(), freq='M')
-        monthly_df = monthly_df.set_index(date_col).reindex(all_months, fill_value=0).rename_axis("ds").reset_index()
-        monthly_df = monthly_df.rename(columns={value_column: "y"})
+def trend_label(forecast_values):
+    """Describe the direction of a forecast from the mean month-over-month change."""
+    trend = pd.Series(forecast_values).diff().mean()
+    if trend > 0:
+        return "📈 Increasing trend in forecasted values."
+    elif trend < 0:
+        return "📉 Decreasing trend in forecasted values."
+    return "⚖️ No significant trend detected in forecast."
 
-        if len(monthly_df) < 6:
-            return None, "Not enough monthly data to reliably forecast. Please ensure at least 6 data points.", None
 
-        # Fit Prophet
-        model = Prophet()
-        model.fit(monthly_df)
+def _forecast_frame(entry, value_column):
+    engine_name, ds, values = entry
+    forecast_df = pd.DataFrame({"ds": ds, value_column: values})
+    forecast_df.attrs["engine"] = engine_name
+    return forecast_df
 
-        # Forecast next 12 months
-        future = model.make_future_dataframe(periods=12, freq='M')
-        forecast = model.predict(future)
 
-        forecast_df = forecast[["ds", "yhat"]].tail(12)
-        forecast_df = forecast_df.rename(columns={"yhat": value_column})
+def fit_forecast(monthly_df, value_column, periods=FORECAST_HORIZON, engine="prophet", use_cache=True):
+    """
+    Forecast a monthly ds/y frame and return (forecast_df, description).
 
-        # Trend analysis
-        trend = forecast_df[value_column].diff().mean()
-        if trend > 0:
-            description = "📈 Increasing trend in forecasted values."
-        elif trend < 0:
-            description = "📉 Decreasing trend in forecasted values."
-        else:
-            description = "⚖️ No significant trend detected in forecast."
+    engine is a name from forecast_engines.ENGINES or "auto" to choose by
+    series length and seasonality; the engine used is kept in forecast_df.attrs.
+    Results are cached on the series content, engine and horizon, so an
+    unchanged history is never refit.
+    """
+    if len(monthly_df) < MIN_FORECAST_MONTHS:
+        return None, "Not enough monthly data to reliably forecast. Please ensure at least 6 data points."
+
+    key = series_key(monthly_df, engine, periods) if use_cache else None
+    entry = forecast_cache.get(key) if use_cache else None
+
+    if entry is None:
+        engine_name = select_engine(monthly_df["y"].to_numpy(dtype=float)) if engine == "auto" else engine
+        values = get_engine(engine_name).forecast(monthly_df, periods)
+        entry = (engine_name, future_months(monthly_df["ds"].iloc[-1], periods), np.asarray(values, dtype=float))
+        if use_cache:
+            forecast_cache.put(key, entry)
+
+    forecast_df = _forecast_frame(entry, value_column)
+    return forecast_df, trend_label(forecast_df[value_column])
 
-        # Plot historical (green) and forecast (red) with proper x-axis alignment
-        plt.figure(figsize=(12, 6))
-        sns.lineplot(data=monthly_df, x="ds", y="y", label="Historical", color="green")
-        sns.lineplot(data=forecast_df, x="ds", y=value_column, label="Forecast", color="red")
 
-        plt.title(f"{value_column} Forecast for {item_name}")
-        plt.xlabel("Month")
-        plt.ylabel("Quantity")
-        plt.xticks(rotation=45)
+def plot_forecast(monthly_df, forecast_df, item_name, value_column):
+    """Render historical (green) and forecast (red) lines to a PNG buffer."""
+    # Plotting libraries load on first plot, not on import
+    import matplotlib.pyplot as plt
+    import matplotlib.dates as mdates
+    import seaborn as sns
 
-        # Format x-axis as dates
-        plt.gca().xaxis.set_major_locator(mdates.MonthLocator(interval=3))
-        plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
+    plt.figure(figsize=(12, 6))
+    sns.lineplot(data=monthly_df, x="ds", y="y", label="Historical", color="green")
+    sns.lineplot(data=forecast_df, x="ds", y=value_column, label="Forecast", color="red")
 
-        plt.legend()
-        plt.tight_layout()
+    plt.title(f"{value_column} Forecast for {item_name}")
+    plt.xlabel("Month")
+    plt.ylabel("Quantity")
+    plt.xticks(rotation=45)
 
-        buf = BytesIO()
-        plt.savefig(buf, format="png")
-        plt.close()
-        buf.seek(0)
+    # Format x-axis as dates
+    plt.gca().xaxis.set_major_locator(mdates.MonthLocator(interval=3))
+    plt.gca().xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m'))
 
-        return forecast_df, description, buf
+    plt.legend()
+    plt.tight_layout()
+
+    buf = BytesIO()
+    plt.savefig(buf, format="png")
+    plt.close()
+    buf.seek(0)
+    return buf
+
+
+def forecast_series(monthly_df, item_name, value_column, engine="prophet"):
+    """Forecast the next 12 months from a monthly ds/y frame (e.g. a MonthlySeriesStore slice)."""
+    try:
+        forecast_df, description = fit_forecast(monthly_df, value_column, engine=engine)
+        if forecast_df is None:
+            return None, description, None
+
+        return forecast_df, description, plot_forecast(monthly_df, forecast_df, item_name, value_column)
 
     except Exception as e:
         return None, f"Forecast error: {e}", None
+
+
+def _forecast_task(task):
+    """Process-pool worker: fit one (item, metric) series, never raising."""
+    item_name, value_column, monthly_df, engine_name = task
+    try:
+        # The parent process owns the cache; workers only fit
+        forecast_df, description = fit_forecast(monthly_df, value_column, engine=engine_name, use_cache=False)
+    except Exception as e:
+        forecast_df, description = None, f"Forecast error: {e}"
+    return item_name, value_column, engine_name, forecast_df, description
+
+
+def _vectorized_tasks(tasks, engine_name):
+    """Forecast a group of series with one batch call of a vectorized engine."""
+    histories = [history for _, _, history, _ in tasks]
+    values = get_engine(engine_name).forecast_batch(pad_histories(histories), FORECAST_HORIZON)
+
+    for (item_name, value_column, history, _), row in zip(tasks, values):
+        forecast_df = pd.DataFrame({
+            "ds": future_months(history["ds"].iloc[-1], FORECAST_HORIZON),
+            value_column: row,
+        })
+        yield item_name, value_column, engine_name, forecast_df, trend_label(row)
+
+
+def batch_forecast(histories, max_workers=None, progress_callback=None, engine="prophet"):
+    """
+    Fit every (item, metric) series, batching vectorized engines and sending
+    the rest across a process pool.
+
+    Args:
+        histories: Dictionary of {(item_name, value_column): monthly ds/y frame}
+        max_workers: Process count, defaults to the number of CPUs
+        progress_callback: Optional callable receiving the completed fraction
+        engine: Engine name from forecast_engines.ENGINES, or "auto"
+
+    Returns:
+        (forecast_table, trend_table): a long table with Item, Metric, ds and
+        Forecast columns, and one engine / trend label / status row per series.
+        Plots are not rendered here; use plot_forecast on demand.
+    """
+    forecast_columns = ["Item", "Metric", "ds", "Forecast"]
+    trend_columns = ["Item", "Metric", "Engine", "Trend", "Status"]
+    if not histories:
+        return pd.DataFrame(columns=forecast_columns), pd.DataFrame(columns=trend_columns)
+
+    keys = list(histories)
+    short = [key for key in keys if len(histories[key]) < MIN_FORECAST_MONTHS]
+    eligible = [key for key in keys if len(histories[key]) >= MIN_FORECAST_MONTHS]
+
+    if engine == "auto":
+        chosen = select_engines(pad_histories([histories[key] for key in eligible])) if eligible else []
+    else:
+        get_engine(engine)
+        chosen = [engine] * len(eligible)
+
+    # Serve unchanged histories from the forecast cache; only the rest are fit
+    cache_keys = {key: series_key(histories[key], engine, FORECAST_HORIZON) for key in eligible}
+    cached = {}
+    grouped = {}
+    for key, engine_name in zip(eligible, chosen):
+        entry = forecast_cache.get(cache_keys[key])
+        if entry is not None:
+            cached[key] = entry
+        else:
+            grouped.setdefault(engine_name, []).append((key[0], key[1], histories[key], engine_name))
+
+    forecasts = []
+    trends = [
+        {"Item": item, "Metric": metric, "Engine": None, "Trend": None,
+         "Status": "Not enough monthly data to reliably forecast. Please ensure at least 6 data points."}
+        for item, metric in short
+    ]
+    total = len(keys)
+
+    def collect(result, cache=True):
+        item_name, value_column, engine_name, forecast_df, description = result
+        if forecast_df is not None:
+            if cache:
+                forecast_cache.put(
+                    cache_keys[(item_name, value_column)],
+                    (engine_name, forecast_df["ds"].to_numpy(), forecast_df[value_column].to_numpy(dtype=float)),
+                )
+            forecasts.append(pd.DataFrame({
+                "Item": item_name,
+                "Metric": value_column,
+                "ds": forecast_df["ds"].to_numpy(),
+                "Forecast": forecast_df[value_column].to_numpy(),
+            }))
+            trends.append({"Item": item_name, "Metric": value_column, "Engine": engine_name, "Trend": description, "Status": "ok"})
+        else:
+            trends.append({"Item": item_name, "Metric": value_column, "Engine": engine_name, "Trend": None, "Status": description})
+
+        if progress_callback:
+            progress_callback(len(trends) / total)
+
+    for (item_name, value_column), entry in cached.items():
+        forecast_df = _forecast_frame(entry, value_column)
+        collect((item_name, value_column, entry[0], forecast_df, trend_label(forecast_df[value_column])), cache=False)
+
+    pooled = []
+    for engine_name, tasks in grouped.items():
+        if get_engine(engine_name).vectorized:
+            for result in _vectorized_tasks(tasks, engine_name):
+                collect(result)
+        else:
+            pooled.extend(tasks)
+
+    if pooled:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [pool.submit(_forecast_task, task) for task in pooled]
+            try:
+                for future in as_completed(futures):
+                    collect(future.result())
+            except BaseException:
+                # e.g. a cancelled job: don't start the series still queued
+                for future in futures:
+                    future.cancel()
+                raise
+
+    forecast_table = pd.concat(forecasts, ignore_index=True) if forecasts else pd.DataFrame(columns=forecast_columns)
+    trend_table = pd.DataFrame(trends, columns=trend_columns).sort_values(["Item", "Metric"]).reset_index(drop=True)
+    return forecast_table, trend_table
+
+
+def _batch_forecast_job(job, histories, max_workers, engine):
+    return batch_forecast(histories, max_workers, job.progress_callback, engine)
+
+
+def start_batch_forecast(histories, max_workers=None, engine="prophet", owner=None):
+    """Run batch_forecast as a background job and return its id in jobs.job_runner."""
+    from jobs import job_runner
+
+    return job_runner.submit("Batch forecast", _batch_forecast_job, histories, max_workers, engine, owner=owner)
@@ -0,0 +1,216 @@
+import re
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from timeseries import SERIES_METRICS
+
+HS_LEVELS = (2, 4, 6, 8)
+HS_LEVEL_NAMES = {2: "Chapter", 4: "Heading", 6: "Subheading", 8: "Tariff Line"}
+
+
+def normalize_hs_code(value):
+    """
+    Digits of an HS code, e.g. "8471.30.10", 84713010 and 84713010.0 all give
+    "84713010". Codes that lost their leading zero as numbers (9012100) get it
+    back ("09012100"). Missing values give "".
+    """
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    text = str(value).strip()
+    if re.fullmatch(r"\d+\.0+", text):
+        text = text.split(".")[0]
+    digits = re.sub(r"\D", "", text)
+    return digits.zfill(len(digits) + len(digits) % 2)
+
+
+def _cumulative_sums(ranks, df, n_codes, metrics):
+    """
+    Cumulative record counts and metric sums over the sorted codes (with a
+    leading 0) for rows of df whose code positions are ranks (-1 skipped).
+    """
+    valid = ranks >= 0
+    ranks = ranks[valid]
+    sums = {"records": np.concatenate([[0], np.cumsum(np.bincount(ranks, minlength=n_codes))])}
+    for metric in metrics:
+        if metric in df.columns:
+            weights = pd.to_numeric(df[metric], errors="coerce").fillna(0).to_numpy(dtype=float)[valid]
+            sums[metric] = np.concatenate([[0.0], np.cumsum(np.bincount(ranks, weights=weights, minlength=n_codes))])
+    return sums
+
+
+class HSCodeIndex:
+    """
+    HS code hierarchy over one dataset's rows: chapter (2 digits), heading
+    (4), subheading (6) and tariff line (8).
+
+    The distinct codes are sorted by their normalized digits, so every node of
+    the hierarchy covers a contiguous range of them, and the row positions are
+    sorted the same way, so a node's rows are one slice of `order`. Record
+    counts and metric sums are kept as cumulative sums over the sorted codes;
+    the totals of any node are a difference of two entries.
+    """
+
+    def __init__(self, hscode_col, values, codes, order, offsets, sums, metrics):
+        self.hscode_col = hscode_col
+        self.values = values            # Index of the distinct raw codes, in hierarchy order
+        self.codes = codes              # object ndarray, normalized digits of each value
+        self.order = order              # int64 row positions sorted by code
+        self.offsets = offsets          # rows of value i are order[offsets[i]:offsets[i + 1]]
+        self.sums = sums                # {"records"/metric: cumulative sums over values, leading 0}
+        self.metrics = list(metrics)
+        self.labels = [str(v) for v in values]
+        self._positions = {label: i for i, label in enumerate(self.labels)}
+
+        nodes = []
+        for level in HS_LEVELS:
+            prefixes = pd.Series([code[:level] if len(code) >= level else None for code in codes], dtype=object)
+            spans = prefixes.dropna().reset_index().groupby(0)["index"].agg(["min", "max"])
+            for code, (first, last) in spans.iterrows():
+                nodes.append((code, level, code[:level - 2], first, last + 1))
+        self.nodes = pd.DataFrame(nodes, columns=["code", "level", "parent", "first", "last"])
+
+    @classmethod
+    def from_frame(cls, df, hscode_col="CTH_HSCODE", metrics=None):
+        """Build the index in one pass over the rows; only the distinct codes are parsed."""
+        metrics = [m for m in (metrics or SERIES_METRICS) if m in df.columns]
+        row_codes, uniques = pd.factorize(df[hscode_col])
+        normalized = [normalize_hs_code(v) for v in uniques]
+        ranked = sorted((i for i, code in enumerate(normalized) if code), key=lambda i: (normalized[i], str(uniques[i])))
+
+        rank = np.full(len(uniques) + 1, -1, dtype=np.int64)     # position -1 stays -1 for missing codes
+        rank[ranked] = np.arange(len(ranked))
+        row_rank = rank[row_codes]
+        order = np.argsort(row_rank, kind="stable")
+        order = order[np.count_nonzero(row_rank < 0):]
+
+        sums = _cumulative_sums(row_rank, df, len(ranked), metrics)
+        return cls(
+            hscode_col,
+            pd.Index(uniques.take(ranked) if ranked else uniques[:0]),
+            np.array([normalized[i] for i in ranked], dtype=object),
+            order,
+            sums["records"],
+            sums,
+            metrics,
+        )
+
+    def _subset_sums(self, subset):
+        return _cumulative_sums(self._ranks(subset), subset, len(self.values), self.metrics)
+
+    def _ranks(self, subset):
+        """Position in the sorted codes of each row of subset (-1 for missing or unknown codes)."""
+        return self.values.get_indexer(subset[self.hscode_col])
+
+    def _range(self, prefix):
+        """[first, last) range of the sorted codes under a prefix."""
+        prefix = normalize_hs_code(prefix) if prefix else ""
+        if not prefix:
+            return 0, len(self.codes)
+        return (int(np.searchsorted(self.codes, prefix, side="left")),
+                int(np.searchsorted(self.codes, prefix + ":", side="left")))   # ":" sorts after "9"
+
+    def __len__(self):
+        return len(self.values)
+
+    def children(self, parent="", subset=None):
+        """Codes one level below parent ("" for chapters), optionally only those present in subset's rows."""
+        level = len(parent) + 2
+        nodes = self.nodes[(self.nodes["level"] == level) & (self.nodes["parent"] == parent)]
+        if subset is not None:
+            counts = self._subset_sums(subset)["records"]
+            nodes = nodes[counts[nodes["last"].to_numpy()] > counts[nodes["first"].to_numpy()]]
+        return nodes["code"].tolist()
+
+    def codes_under(self, prefix="", subset=None):
+        """Raw code values (as strings) under a prefix, optionally only those present in subset's rows."""
+        first, last = self._range(prefix)
+        if subset is None:
+            return self.labels[first:last]
+        present = np.bincount(np.clip(self._ranks(subset), -1, None) + 1, minlength=len(self.values) + 1)[1:]
+        return [self.labels[i] for i in range(first, last) if present[i]]
+
+    def totals(self, parent="", subset=None):
+        """
+        Record counts and metric sums for each code one level below parent,
+        from the index (whole dataset) or from subset's rows. A tariff line
+        with no children gives its own totals.
+        """
+        level = len(parent) + 2
+        nodes = self.nodes[(self.nodes["level"] == level) & (self.nodes["parent"] == parent)]
+        if nodes.empty and parent:
+            nodes = self.nodes[self.nodes["code"] == parent]
+        sums = self.sums if subset is None else self._subset_sums(subset)
+        first, last = nodes["first"].to_numpy(), nodes["last"].to_numpy()
+
+        table = pd.DataFrame({"HS Code": nodes["code"].to_numpy(),
+                              "Level": [HS_LEVEL_NAMES[l] for l in nodes["level"]]})
+        for name, cumulative in sums.items():
+            table["Records" if name == "records" else name] = cumulative[last] - cumulative[first]
+        return table[table["Records"] > 0].reset_index(drop=True)
+
+    def row_positions(self, prefix=""):
+        """Positions (in the indexed frame, ascending) of the rows under a prefix."""
+        first, last = self._range(prefix)
+        return np.sort(self.order[self.offsets[first]:self.offsets[last]])
+
+    def rows(self, df, prefix=""):
+        """Rows of the indexed frame under a prefix, without scanning the code column."""
+        return df.iloc[self.row_positions(prefix)]
+
+    def mask(self, subset, prefixes=(), values=()):
+        """Boolean mask over subset's rows whose code is under one of the prefixes or is one of the values."""
+        allowed = np.zeros(len(self.values) + 1, dtype=bool)    # last entry catches rank -1
+        for prefix in prefixes:
+            first, last = self._range(prefix)
+            allowed[first:last] = True
+        allowed[[self._positions[str(v)] for v in values if str(v) in self._positions]] = True
+        return allowed[self._ranks(subset)]
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cached_hs_index(_df, hscode_col, metrics, version):
+    return HSCodeIndex.from_frame(_df, hscode_col=hscode_col, metrics=metrics)
+
+
+def get_hs_index(df, hscode_col="CTH_HSCODE", metrics=None, version=None):
+    """
+    Shared, read-only HS index per dataset version.
+
+    version is the dataset-store key of df (see dataset_store.session_version);
+    without one the full content hash of df is used, since Streamlit's own
+    argument hashing only samples large frames.
+    """
+    if version is None:
+        from pipeline import frame_fingerprint
+
+        version = frame_fingerprint(df)
+    return _cached_hs_index(df, hscode_col, tuple(metrics) if metrics else None, version)
+
+
+def render_hs_drilldown(index, key, subset=None):
+    """
+    Chapter -> heading -> subheading -> tariff line selectboxes, each listing
+    the codes under the previous choice, followed by the totals one level
+    below the selection.
+
+    Returns:
+        The selected code prefix, "" for all codes
+    """
+    prefix = ""
+    for column, level in zip(st.columns(len(HS_LEVELS)), HS_LEVELS):
+        options = index.children(prefix, subset)
+        if not options:
+            break
+        choice = column.selectbox(HS_LEVEL_NAMES[level], ["All"] + options, key=f"{key}_{level}")
+        if choice == "All":
+            break
+        prefix = choice
+
+    totals = index.totals(prefix, subset)
+    if not totals.empty:
+        st.dataframe(totals)
+    return prefix
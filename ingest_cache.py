@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from data_cleaning import CATEGORY_MAX_RATIO, UNIT_CONVERSIONS_TO_KG
+from export_formats import read_parquet_frame, write_parquet_frame
+
+CACHE_DIR = os.environ.get(
+    "INGEST_CACHE_DIR", os.path.join(tempfile.gettempdir(), "excel_automator", "ingest")
+)
+MAX_DISK_BYTES = int(os.environ.get("INGEST_CACHE_MAX_MB", 2048)) * 1024 * 1024
+
+# Bump whenever a cleaning stage changes what it produces, so old entries stop matching
+PIPELINE_VERSION = 3
+
+
+def pipeline_config():
+    """Settings that change the processed output; part of every cache key."""
+    return {
+        "version": PIPELINE_VERSION,
+        "category_max_ratio": CATEGORY_MAX_RATIO,
+        "unit_conversions": UNIT_CONVERSIONS_TO_KG,
+    }
+
+
+def upload_key(data, config=None):
+    """Content hash of the uploaded bytes plus the pipeline configuration."""
+    digest = hashlib.sha256()
+    digest.update(data)
+    digest.update(json.dumps(config or pipeline_config(), sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def processed_key(key, config):
+    """
+    Cache key of an upload cleaned with one run's settings: the upload key
+    plus the duplicate-check keys and mode, which the user picks per run.
+    """
+    settings = {"dedup_keys": list(config.get("dedup_keys") or []), "dedup_mode": config.get("dedup_mode")}
+    digest = hashlib.sha256(key.encode("utf-8"))
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class IngestCache:
+    """
+    Processed uploads on local disk, one directory per processed_key holding
+    df_final (and df_clustered once clustering has run) as Parquet plus a
+    meta.json. Directories are evicted least-recently-used first once the
+    cache grows past max_disk_bytes.
+
+    Exchange rates are those of the day the upload was first processed.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_disk_bytes=MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """
+        Return {"df_final", "df_clustered" (or None), "meta"} for a cached
+        upload, or None on a miss.
+        """
+        entry_dir = self._dir(key)
+        meta_path = os.path.join(entry_dir, "meta.json")
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            df_final = read_parquet_frame(os.path.join(entry_dir, "df_final.parquet"))
+            df_clustered = None
+            if meta.get("cluster_column_name"):
+                df_clustered = read_parquet_frame(os.path.join(entry_dir, "df_clustered.parquet"))
+            os.utime(meta_path)  # refresh for LRU
+        except (OSError, ValueError, ImportError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return {"df_final": df_final, "df_clustered": df_clustered, "meta": meta}
+
+    def put(self, key, df_final, **meta):
+        """Store a freshly processed upload; extra keyword arguments go to meta.json."""
+        meta["created"] = time.time()
+        self._write(key, "df_final", df_final, meta)
+
+    def put_clustered(self, key, df_clustered, cluster_column):
+        """Add the clustered frame to an existing entry."""
+        meta_path = os.path.join(self._dir(key), "meta.json")
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return
+        meta["cluster_column_name"] = cluster_column
+        self._write(key, "df_clustered", df_clustered, meta)
+
+    def _write(self, key, name, df, meta):
+        entry_dir = self._dir(key)
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            path = os.path.join(entry_dir, f"{name}.parquet")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            write_parquet_frame(df, tmp_path)
+            os.replace(tmp_path, path)
+
+            meta_path = os.path.join(entry_dir, "meta.json")
+            with open(f"{meta_path}.tmp", "w", encoding="utf-8") as f:
+                json.dump(meta, f, default=str)
+            os.replace(f"{meta_path}.tmp", meta_path)
+            self._trim_disk()
+        except (OSError, ImportError, ValueError):
+            pass  # Cache is best-effort; the session already has the data
+
+    def _trim_disk(self):
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            entry_dir = self._dir(key)
+            meta_path = os.path.join(entry_dir, "meta.json")
+            if not os.path.isfile(meta_path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(entry_dir) if entry.is_file())
+            entries.append((os.stat(meta_path).st_mtime, size, entry_dir))
+
+        total = sum(size for _, size, _ in entries)
+        with self._lock:
+            for _, size, entry_dir in sorted(entries):
+                if total <= self.max_disk_bytes:
+                    break
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                total -= size
+
+    def size_bytes(self):
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        return sum(
+            os.path.getsize(os.path.join(root, name))
+            for root, _, files in os.walk(self.cache_dir)
+            for name in files
+        )
+
+    def clear(self):
+        if os.path.isdir(self.cache_dir):
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+ingest_cache = IngestCache()
@@ -0,0 +1,208 @@
+"""
+In-process background jobs for long pipeline stages.
+
+Streamlit reruns the whole script on every widget interaction, so heavy work
+runs here instead: JobRunner executes jobs on a shared thread pool (or a
+process pool for picklable CPU-bound functions) and keeps them in a registry
+by id. Sessions store job ids, poll status/progress on reruns and pick up the
+result once the job is done. Cancellation is cooperative: thread jobs call
+job.progress_callback() / job.check_cancelled(), which raise JobCancelled
+once cancel() has been requested.
+"""
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+MAX_THREAD_JOBS = int(os.environ.get("JOB_RUNNER_THREADS", 4))
+# Finished jobs are dropped from the registry after this many seconds
+JOB_RETENTION_SECONDS = 3600
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested."""
+
+
+class Job:
+    """Status, progress and result of one background job."""
+
+    def __init__(self, job_id, name, owner=None):
+        self.id = job_id
+        self.name = name
+        self.owner = owner
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.messages = []
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self._cancel = threading.Event()
+
+    @property
+    def done(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+    @property
+    def elapsed(self):
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def report(self, progress=None, message=None):
+        """Update progress (0..1) and/or the status message; safe from any thread."""
+        if progress is not None:
+            self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+    def log(self, message):
+        """Keep a message (e.g. a warning) to show once the job finishes."""
+        self.messages.append(message)
+
+    def check_cancelled(self):
+        if self._cancel.is_set():
+            raise JobCancelled(f"{self.name} was cancelled")
+
+    def progress_callback(self, fraction):
+        """Drop-in progress_callback for pipeline functions that also honours cancellation."""
+        self.report(progress=fraction)
+        self.check_cancelled()
+
+    def cancel(self):
+        self._cancel.set()
+        if self.future is not None and self.future.cancel():
+            self._finish(CANCELLED)
+
+    @property
+    def cancel_requested(self):
+        return self._cancel.is_set()
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.result = result
+        self.error = error
+        self.finished = time.time()
+        if status == DONE:
+            self.progress = 1.0
+
+
+class JobRunner:
+    """Thread/process pools plus a registry of jobs by id."""
+
+    def __init__(self, max_threads=MAX_THREAD_JOBS, max_processes=None):
+        self._threads = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="job")
+        self._max_processes = max_processes
+        self._processes = None
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def submit(self, name, fn, *args, owner=None, use_process=False, **kwargs):
+        """
+        Start a job and return its id.
+
+        Thread jobs are called as fn(job, *args, **kwargs) so they can report
+        progress and check for cancellation. Process jobs are called as
+        fn(*args, **kwargs); fn and its arguments must be picklable, and they
+        can only be cancelled before they start.
+        """
+        self._prune()
+        with self._lock:
+            job = Job(f"job-{next(self._ids)}", name, owner)
+            self._jobs[job.id] = job
+
+        if use_process:
+            if self._processes is None:
+                from dataset_memory import enable_copy_on_write
+
+                # Worker processes run pandas code of the app, so they get its copy-on-write mode
+                self._processes = ProcessPoolExecutor(max_workers=self._max_processes,
+                                                      initializer=enable_copy_on_write)
+            job.status = RUNNING
+            job.started = time.time()
+            job.future = self._processes.submit(fn, *args, **kwargs)
+            job.future.add_done_callback(lambda future: self._collect(job, future))
+        else:
+            job.future = self._threads.submit(self._run, job, fn, args, kwargs)
+        return job.id
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            job.check_cancelled()
+            result = fn(job, *args, **kwargs)
+        except JobCancelled:
+            job._finish(CANCELLED)
+        except Exception as e:
+            job._finish(FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            job._finish(DONE, result=result)
+
+    def _collect(self, job, future):
+        if future.cancelled():
+            job._finish(CANCELLED)
+        elif future.exception() is not None:
+            e = future.exception()
+            job._finish(FAILED, error=f"{type(e).__name__}: {e}")
+        else:
+            job._finish(DONE, result=future.result())
+
+    def get(self, job_id):
+        """The Job for an id, or None if unknown or already pruned."""
+        if job_id is None:
+            return None
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, owner=None):
+        with self._lock:
+            return [job for job in self._jobs.values() if owner is None or job.owner == owner]
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is not None and not job.done:
+            job.cancel()
+
+    def forget(self, job_id):
+        """Drop a job from the registry (its result is released)."""
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values() if j.done and j.finished < cutoff]:
+                del self._jobs[job_id]
+
+
+job_runner = JobRunner()
+
+
+def render_job_progress(job, key, poll_seconds=1.0):
+    """
+    Progress bar, status line and Cancel button for a running job.
+
+    Re-renders itself every poll_seconds as a Streamlit fragment and reruns
+    the whole app once the job finishes so the caller can pick up the result.
+    """
+    import streamlit as st
+
+    @st.fragment(run_every=poll_seconds)
+    def poll():
+        st.progress(job.progress, text=f"{job.name}: {job.message or job.status} ({job.elapsed:.0f}s)")
+        if job.cancel_requested:
+            st.caption("Cancelling...")
+        elif st.button("Cancel", key=f"{key}_cancel"):
+            job.cancel()
+        if job.done:
+            st.rerun()
+
+    poll()
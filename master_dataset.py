@@ -0,0 +1,298 @@
+"""
+A stored, partitioned master dataset that grows one monthly file at a time.
+
+The master is the Parquet layout written by out_of_core.process_out_of_core
+(year=YYYY/month=MM partitions plus _clusters.json). Next to it live the
+aggregates the app reads, so they never need a scan of the rows:
+
+    <root>/_aggregates/cube.parquet                  monthly cells: trend keys x year x month,
+                                                     metric sums and a record count
+    <root>/_aggregates/trend_<metric>_<level>.parquet   analysis.build_trend_table output
+
+append_to_master cleans only the new file's rows (dropping shipments the
+master already holds, by row hash), assigns supplier and
+location clusters against the canonical names already in the master (new
+names join the first canonical they match or start a new cluster, history
+is never reclustered), writes the rows into the month partitions, adds
+their cells to the cube and rebuilds the trend tables only for the keys
+the new rows touch. MonthlySeriesStore.add_cells folds the same cells into
+a live series store.
+"""
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from analysis import TREND_KEYS, build_trend_table
+from export_formats import read_parquet_frame, write_parquet_frame, write_partitioned_frame
+from out_of_core import (
+    CLUSTERS_FILE,
+    DEFAULT_CHUNK_ROWS,
+    _clean_chunk,
+    apply_cluster_mappings,
+    iter_input_chunks,
+    load_row_hashes,
+    save_row_hashes,
+)
+from timeseries import SERIES_METRICS
+
+AGGREGATES_DIR = "_aggregates"
+CUBE_FILE = "cube.parquet"
+TREND_LEVELS = ["Monthly", "Quarterly", "Yearly", "Growth"]
+
+
+def cube_keys(columns):
+    """Trend keys present in a dataset's columns."""
+    return [col for col in TREND_KEYS if col in columns]
+
+
+def monthly_cube(df, key_cols, metrics=None, date_col="Month"):
+    """
+    Monthly cells of a frame: one row per key and month with metric sums
+    and a "records" count. Cells are additive, so cubes of disjoint row sets
+    combine with combine_cubes.
+    """
+    metrics = [m for m in (metrics or SERIES_METRICS) if m in df.columns]
+    dates = pd.to_datetime(df[date_col], errors="coerce")
+    base = df[key_cols].astype(object)
+    base["year"] = dates.dt.year
+    base["month"] = dates.dt.month
+    for metric in metrics:
+        base[metric] = pd.to_numeric(df[metric], errors="coerce").fillna(0)
+    base = base[dates.notna().to_numpy()]
+
+    grouped = base.groupby(key_cols + ["year", "month"], dropna=False)
+    cells = grouped[metrics].sum()
+    cells["records"] = grouped.size()
+    cells = cells.reset_index()
+    cells[["year", "month"]] = cells[["year", "month"]].astype(int)
+    return cells
+
+
+def combine_cubes(*cubes):
+    """Sum cells of several cubes over the same keys."""
+    cubes = [cube for cube in cubes if cube is not None and not cube.empty]
+    if not cubes:
+        return None
+    combined = pd.concat(cubes, ignore_index=True)
+    keys = [col for col in combined.columns if col in TREND_KEYS] + ["year", "month"]
+    return combined.groupby(keys, dropna=False).sum().reset_index()
+
+
+def trend_tables_from_cube(cube, metric, key_cols):
+    """build_trend_table over cube cells: each cell stands in for its month's rows."""
+    rows = cube[key_cols].copy()
+    rows["Month"] = pd.to_datetime(dict(year=cube["year"], month=cube["month"], day=1))
+    rows[metric] = cube[metric]
+    return build_trend_table(rows, value_col=metric, date_col="Month", key_cols=key_cols)
+
+
+def cube_from_partitions(root, key_cols, metrics=None):
+    """Monthly cube of a whole partitioned dataset, aggregated per part file."""
+    from out_of_core import aggregate_partitions
+
+    metrics = [m for m in (metrics or SERIES_METRICS)]
+    cells = aggregate_partitions(root, [*key_cols, "year", "month"], metrics)
+    cells = cells.drop(columns=[f"{m}_count" for m in metrics]).rename(columns={"rows": "records"})
+    return cells.dropna(subset=["year", "month"]).astype({"year": int, "month": int})
+
+
+def _aggregates_dir(root):
+    return os.path.join(root, AGGREGATES_DIR)
+
+
+def _trend_path(root, metric, level):
+    return os.path.join(_aggregates_dir(root), f"trend_{metric}_{level}.parquet")
+
+
+def save_aggregates(root, cube, key_cols):
+    """Write the cube and the full trend tables for every metric in it."""
+    os.makedirs(_aggregates_dir(root), exist_ok=True)
+    write_parquet_frame(cube, os.path.join(_aggregates_dir(root), CUBE_FILE))
+    for metric in [m for m in SERIES_METRICS if m in cube.columns]:
+        tables = trend_tables_from_cube(cube, metric, key_cols)
+        for level in TREND_LEVELS:
+            write_parquet_frame(tables[level], _trend_path(root, metric, level))
+
+
+def load_cube(root):
+    """The master's monthly cube, or None if it has not been built."""
+    path = os.path.join(_aggregates_dir(root), CUBE_FILE)
+    return read_parquet_frame(path) if os.path.exists(path) else None
+
+
+def load_trend_tables(root, metric):
+    """Stored trend tables for a metric, in the shape build_trend_table returns."""
+    return {level: read_parquet_frame(_trend_path(root, metric, level)) for level in TREND_LEVELS}
+
+
+def _key_mask(frame, keys, key_cols):
+    """Rows of frame whose key tuple is in keys (a DataFrame of key columns)."""
+    flagged = frame[key_cols].astype(object).merge(
+        keys.astype(object).drop_duplicates().assign(_hit=True), on=key_cols, how="left"
+    )
+    return flagged["_hit"].notna().to_numpy()
+
+
+def refresh_trend_tables(root, cube, affected, key_cols):
+    """Recompute the stored trend tables for the affected keys only and splice them in."""
+    affected_cube = cube[_key_mask(cube, affected, key_cols)]
+    for metric in [m for m in SERIES_METRICS if m in cube.columns]:
+        fresh = trend_tables_from_cube(affected_cube, metric, key_cols)
+        stored = load_trend_tables(root, metric)
+        for level in TREND_LEVELS:
+            table = stored[level]
+            table = table[~_key_mask(table, affected, key_cols)]
+            table = pd.concat([table, fresh[level]], ignore_index=True)
+            if level == "Growth":
+                table = table.sort_values("CAGR %", ascending=False, na_position="last")
+            else:
+                table = table.sort_values([*key_cols, "year"], kind="stable")
+            write_parquet_frame(table.reset_index(drop=True), _trend_path(root, metric, level))
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extend_cluster_mappings(mappings, unique_values, config, product_col=None):
+    """
+    Add mappings for names not seen before, matching them against the
+    existing canonical clusters first. Known names keep their cluster.
+    """
+    from clustering import cluster_product_names
+    from data_cleaning import location_cluster_mapping, supplier_cluster_mapping
+
+    builders = {
+        config.get("supplier_col"): (supplier_cluster_mapping, config["supplier_threshold"]),
+        config.get("importer_city_col"): (location_cluster_mapping, config["location_threshold"]),
+    }
+    for col, values in unique_values.items():
+        if col == product_col:
+            mapping = mappings.setdefault(f"{product_col}_cluster", {})
+            new = pd.Series([v for v in values if str(v) not in mapping], dtype=object)
+            mapping.update({str(k): v for k, v in zip(new, cluster_product_names(new))})
+        elif col in builders:
+            build, threshold = builders[col]
+            mapping = mappings.setdefault(col, {})
+            new = [v for v in values if str(v) not in mapping]
+            canonical = list(dict.fromkeys(mapping.values()))
+            mapping.update({str(k): v for k, v in build(new, threshold, canonical).items()})
+    return mappings
+
+
+def append_to_master(path, root, chunk_rows=DEFAULT_CHUNK_ROWS, progress=None):
+    """
+    Append one new file to a master dataset built by process_out_of_core.
+
+    Appending the same file again replaces its earlier rows rather than
+    duplicating them. Repeats of rows already in the master, or within the
+    file, are dropped even when the master was built with dedup_mode
+    "flag": consecutive exports overlap, and a flagged repeat would still
+    be counted in the cube and trend tables.
+
+    Args:
+        path: The new file (CSV, Parquet or Excel)
+        root: Master dataset root
+        chunk_rows: Rows per streamed chunk
+        progress: Optional callable receiving a status message
+
+    Returns:
+        Summary dict with row counts, the months written, new names per
+        column and the number of refreshed trend keys
+    """
+    with open(os.path.join(root, CLUSTERS_FILE), encoding="utf-8") as f:
+        clusters = json.load(f)
+    config = clusters["config"]
+    # The master's partitions carry Is_Duplicate; rows kept here are all first occurrences
+    flagged = config.get("dedup_mode", "flag") == "flag"
+    if config.get("dedup_mode", "flag") != "off":
+        config = {**config, "dedup_mode": "drop"}
+    product_col = clusters.get("product_col")
+    mappings = clusters["mappings"]
+    string_cols, month_col = clusters.get("string_cols"), clusters.get("month_col", "Month")
+    tag = f"append-{_file_digest(path)[:16]}"
+
+    rate_cache = {}
+    # Rows already in the master (except an earlier copy of this file) count as duplicates
+    seen = load_row_hashes(root, exclude=tag)
+    stored_hashes = seen.to_array()
+    rows_in = rows_out = duplicates = 0
+    months = set()
+    new_names = {}
+    cube = None
+    for n, chunk in enumerate(iter_input_chunks(path, chunk_rows)):
+        rows_in += len(chunk)
+        if string_cols is None:
+            from data_cleaning import detect_string_columns, drop_unwanted_columns
+
+            string_cols = detect_string_columns(drop_unwanted_columns(chunk))
+        chunk, _, _, chunk_duplicates = _clean_chunk(chunk, string_cols, config, rate_cache, seen)
+        duplicates += chunk_duplicates
+        if flagged:
+            chunk["Is_Duplicate"] = False
+
+        unique_values = {
+            col: dict.fromkeys(chunk[col].dropna().unique())
+            for col in (config.get("supplier_col"), config.get("importer_city_col"), product_col)
+            if col and col in chunk.columns
+        }
+        known = {col: len(mappings.get(col if col != product_col else f"{col}_cluster", {})) for col in unique_values}
+        extend_cluster_mappings(mappings, unique_values, config, product_col)
+        for col in unique_values:
+            added = len(mappings[col if col != product_col else f"{col}_cluster"]) - known[col]
+            new_names[col] = new_names.get(col, 0) + added
+
+        chunk = apply_cluster_mappings(chunk, mappings, product_col)
+        if n == 0:
+            # Drop partitions from an earlier append of this same file
+            for old in _tagged_parts(root, tag):
+                os.remove(old)
+        written = write_partitioned_frame(chunk, root, month_col, basename=f"{tag}-{n:05d}")
+        months.update(partition for partition, _ in written)
+        rows_out += len(chunk)
+        cube = combine_cubes(cube, monthly_cube(chunk, cube_keys(chunk.columns), date_col=month_col))
+        if progress:
+            progress(f"Appended chunk {n + 1} ({rows_out:,} rows)")
+
+    save_row_hashes(root, tag, np.setdiff1d(seen.to_array(), stored_hashes, assume_unique=True))
+    clusters["mappings"] = mappings
+    clusters.setdefault("appended", []).append({"file": path, "tag": tag, "rows": rows_out})
+    with open(os.path.join(root, CLUSTERS_FILE), "w", encoding="utf-8") as f:
+        json.dump(clusters, f, default=str)
+
+    refreshed = 0
+    if cube is not None:
+        key_cols = [col for col in cube.columns if col in TREND_KEYS]
+        stored = load_cube(root)
+        reappended = any(entry["tag"] == tag for entry in clusters["appended"][:-1])
+        if stored is None or reappended:
+            # No aggregates yet, or this file's earlier rows were replaced: rebuild from the partitions
+            save_aggregates(root, cube_from_partitions(root, key_cols), key_cols)
+        else:
+            merged = combine_cubes(stored, cube)
+            write_parquet_frame(merged, os.path.join(_aggregates_dir(root), CUBE_FILE))
+            affected = cube[key_cols].drop_duplicates()
+            refresh_trend_tables(root, merged, affected, key_cols)
+            refreshed = len(affected)
+
+    return {
+        "file": path,
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "duplicate_rows": duplicates,
+        "months": sorted(months),
+        "new_names": new_names,
+        "refreshed_keys": refreshed,
+    }
+
+
+def _tagged_parts(root, tag):
+    return glob.glob(os.path.join(root, "year=*", "month=*", f"{tag}-*.parquet"))
@@ -0,0 +1,422 @@
+"""
+Out-of-core processing for inputs larger than memory.
+
+The input is streamed in chunks of chunk_rows. Each chunk goes through the
+row-local stages (drop_unwanted_columns, deduplicate_rows against the row
+hashes of earlier chunks, standardize_dataframe, convert_to_kg,
+convert_sheet_to_usd and month parsing) and is staged as
+Parquet, while the distinct supplier, location and product names are
+collected. Clustering needs to see every name, so it is done once over
+those distinct values (supplier_cluster_mapping, location_cluster_mapping,
+cluster_product_names), giving a global name -> cluster mapping. A second
+pass applies the mappings to the staged chunks and writes the dataset as
+Hive-style Parquet partitions:
+
+    <output>/year=YYYY/month=MM/part-NNNNN.parquet
+    <output>/_clusters.json         the mappings and canonical names used
+    <output>/_summary.json          row counts of the run
+    <output>/_aggregates/           monthly cube and trend tables (see master_dataset.py)
+    <output>/_row_hashes/           64-bit hashes of the stored rows, for dedup of appends
+
+Memory use is bounded by one chunk plus the distinct names. The analytics
+helpers below run over the partitions the same way: each part file is
+read for the needed columns only, months outside the filter are skipped
+without being opened, and every file is reduced to a partial aggregate
+before the partials are combined.
+"""
+import glob
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 250_000
+CLUSTERS_FILE = "_clusters.json"
+SUMMARY_FILE = "_summary.json"
+STAGING_DIR = "_staging"
+# Row hashes of the stored rows, for dedup of later appends (one file per append)
+ROW_HASHES_DIR = "_row_hashes"
+
+
+def iter_input_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yield DataFrames of at most chunk_rows rows from a CSV or Parquet file.
+
+    Excel workbooks cannot be read incrementally, so they are loaded once
+    and then split.
+    """
+    lower = path.lower()
+    if lower.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    elif lower.endswith(".csv"):
+        # Same fallback as the app, decided from the head of the file rather than mid-stream
+        with open(path, "rb") as f:
+            head = f.read(1024 * 1024)
+        try:
+            head.decode("utf-8")
+            encoding = "utf-8"
+        except UnicodeDecodeError as e:
+            # A multi-byte character cut at the end of the sample is still UTF-8
+            encoding = "utf-8" if e.start >= len(head) - 3 else "ISO-8859-1"
+        yield from pd.read_csv(path, chunksize=chunk_rows, encoding=encoding, encoding_errors="replace")
+    else:
+        df = pd.read_excel(path)
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+
+
+def _clean_chunk(chunk, string_cols, config, rate_cache, seen=None):
+    """
+    The row-local cleaning stages for one chunk, deduplicating against the
+    RowHashSet `seen` (rows of earlier chunks) when one is given.
+
+    Returns:
+        (chunk, converted rows, deleted rows, duplicate rows)
+    """
+    from data_cleaning import (
+        drop_unwanted_columns,
+        deduplicate_rows,
+        standardize_dataframe,
+        convert_to_kg,
+        convert_sheet_to_usd,
+        convert_month_column_to_datetime,
+    )
+
+    chunk = drop_unwanted_columns(chunk)
+    duplicates = 0
+    if config.get("dedup_mode", "flag") != "off":
+        chunk, report = deduplicate_rows(chunk, config.get("dedup_keys"), config.get("dedup_mode", "flag"), seen=seen)
+        duplicates = report["duplicates"]
+    chunk = standardize_dataframe(chunk, [c for c in string_cols if c in chunk.columns])
+    converted = deleted = 0
+    if config.get("quantity_col") and config.get("unit_col"):
+        chunk, converted_rows, deleted_rows = convert_to_kg(chunk.copy(deep=False), config["quantity_col"], config["unit_col"])
+        converted, deleted = len(converted_rows), len(deleted_rows)
+    if config.get("currency_col"):
+        chunk = convert_sheet_to_usd(chunk, config["currency_col"], config["value_cols"], rate_cache=rate_cache)
+    chunk = convert_month_column_to_datetime(chunk.copy(deep=False))
+    return chunk, converted, deleted, duplicates
+
+
+def load_row_hashes(root, exclude=None):
+    """RowHashSet of the rows already in a dataset, optionally without one append tag's rows."""
+    from data_cleaning import RowHashSet
+
+    arrays = [
+        np.load(path) for path in sorted(glob.glob(os.path.join(root, ROW_HASHES_DIR, "*.npy")))
+        if os.path.splitext(os.path.basename(path))[0] != exclude
+    ]
+    return RowHashSet(np.concatenate(arrays) if arrays else None)
+
+
+def save_row_hashes(root, name, hashes):
+    os.makedirs(os.path.join(root, ROW_HASHES_DIR), exist_ok=True)
+    np.save(os.path.join(root, ROW_HASHES_DIR, f"{name}.npy"), hashes)
+
+
+def build_cluster_mappings(unique_values, config, product_col=None):
+    """
+    Global {column: {value: cluster}} mappings from the distinct values of
+    the supplier, location and product columns, in first-seen order so the
+    result matches clustering the whole dataset in memory.
+    """
+    from clustering import cluster_product_names
+    from data_cleaning import location_cluster_mapping, supplier_cluster_mapping
+
+    mappings = {}
+    supplier_col, location_col = config.get("supplier_col"), config.get("importer_city_col")
+    if supplier_col in unique_values:
+        mappings[supplier_col] = supplier_cluster_mapping(list(unique_values[supplier_col]), config["supplier_threshold"])
+    if location_col in unique_values:
+        mappings[location_col] = location_cluster_mapping(list(unique_values[location_col]), config["location_threshold"])
+    if product_col in unique_values:
+        names = pd.Series(list(unique_values[product_col]), dtype=object)
+        mappings[f"{product_col}_cluster"] = dict(zip(names, cluster_product_names(names)))
+    return mappings
+
+
+def apply_cluster_mappings(df, mappings, product_col=None):
+    """Replace supplier/location names by their clusters and add the product cluster column."""
+    df = df.copy(deep=False)
+    for col, mapping in mappings.items():
+        if product_col is not None and col == f"{product_col}_cluster":
+            if product_col in df.columns:
+                # Names outside the mapping get the same fallback as cluster_product_names
+                df[col] = df[product_col].map(mapping).fillna(df[product_col].map(
+                    lambda x: str(x).lower().strip() if pd.notna(x) else x
+                ))
+        elif col in df.columns:
+            df[col] = df[col].map(mapping).fillna(df[col])
+    return df
+
+
+def process_out_of_core(path, output_dir, chunk_rows=DEFAULT_CHUNK_ROWS, config=None,
+                        cluster_column="Item_Description", progress=None):
+    """
+    Clean and cluster a file of any size into year/month Parquet partitions.
+
+    Args:
+        path: CSV, Parquet or Excel input
+        output_dir: Dataset root; existing year=/month= partitions are replaced
+        chunk_rows: Rows per streamed chunk
+        config: Overrides for pipeline.DEFAULT_CONFIG (e.g. supplier_threshold)
+        cluster_column: Column to product-cluster, None to skip
+        progress: Optional callable receiving a status message
+
+    Returns:
+        Summary dict (also written to <output_dir>/_summary.json)
+    """
+    from export_formats import read_parquet_frame, write_parquet_frame, write_partitioned_frame
+    from pipeline import cleaning_config
+
+    started = time.perf_counter()
+    staging = os.path.join(output_dir, STAGING_DIR)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    # Pass 1: row-local stages per chunk, staged to disk, plus the distinct names
+    string_cols = stage_config = product_col = month_col = None
+    unique_values = {}
+    from data_cleaning import RowHashSet
+
+    rate_cache = {}
+    seen = RowHashSet()
+    rows_in = converted = deleted = duplicates = 0
+    n_chunks = 0
+    for n_chunks, chunk in enumerate(iter_input_chunks(path, chunk_rows), start=1):
+        rows_in += len(chunk)
+        if stage_config is None:
+            from data_cleaning import detect_string_columns, drop_unwanted_columns
+
+            # Decided on the first chunk so every chunk is cleaned the same way
+            string_cols = detect_string_columns(drop_unwanted_columns(chunk))
+            stage_config = {**cleaning_config(chunk.columns), **(config or {})}
+            col_map = {str(col).lower(): col for col in chunk.columns}
+            product_col = col_map.get(str(cluster_column).lower()) if cluster_column else None
+            month_col = col_map.get("month", "Month")
+
+        chunk, chunk_converted, chunk_deleted, chunk_duplicates = _clean_chunk(
+            chunk, string_cols, stage_config, rate_cache, seen
+        )
+        converted += chunk_converted
+        deleted += chunk_deleted
+        duplicates += chunk_duplicates
+        for col in (stage_config["supplier_col"], stage_config["importer_city_col"], product_col):
+            if col and col in chunk.columns:
+                unique_values.setdefault(col, {}).update(dict.fromkeys(chunk[col].dropna().unique()))
+        write_parquet_frame(chunk, os.path.join(staging, f"part-{n_chunks - 1:05d}.parquet"))
+        if progress:
+            progress(f"Cleaned chunk {n_chunks} ({rows_in:,} rows read)")
+
+    if stage_config is None:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise ValueError(f"{path} has no rows")
+
+    # Clustering over distinct values only
+    if progress:
+        progress(f"Clustering {sum(len(v) for v in unique_values.values()):,} distinct names")
+    mappings = build_cluster_mappings(unique_values, stage_config, product_col)
+
+    # Pass 2: apply the mappings and write year/month partitions
+    for old in [*glob.glob(os.path.join(output_dir, "year=*")), os.path.join(output_dir, ROW_HASHES_DIR)]:
+        shutil.rmtree(old, ignore_errors=True)
+    save_row_hashes(output_dir, "base", seen.to_array())
+    from master_dataset import combine_cubes, cube_keys, monthly_cube, save_aggregates
+
+    partitions = set()
+    rows_out = 0
+    cube = None
+    for part in sorted(glob.glob(os.path.join(staging, "part-*.parquet"))):
+        df = apply_cluster_mappings(read_parquet_frame(part), mappings, product_col)
+        rows_out += len(df)
+        basename = os.path.splitext(os.path.basename(part))[0]
+        partitions.update(p for p, _ in write_partitioned_frame(df, output_dir, month_col, basename=basename))
+        cube = combine_cubes(cube, monthly_cube(df, cube_keys(df.columns), date_col=month_col))
+        os.remove(part)
+        if progress:
+            progress(f"Wrote {basename} ({rows_out:,} rows)")
+    shutil.rmtree(staging, ignore_errors=True)
+    if cube is not None:
+        save_aggregates(output_dir, cube, cube_keys(cube.columns))
+
+    with open(os.path.join(output_dir, CLUSTERS_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "config": stage_config,
+            "product_col": product_col,
+            "string_cols": string_cols,
+            "month_col": month_col,
+            "mappings": {col: {str(k): v for k, v in mapping.items()} for col, mapping in mappings.items()},
+        }, f, default=str)
+
+    summary = {
+        "file": path,
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "converted_rows": converted,
+        "deleted_rows": deleted,
+        "duplicate_rows": duplicates,
+        "chunks": n_chunks,
+        "partitions": len(partitions),
+        "distinct_names": {col: len(values) for col, values in unique_values.items()},
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2, default=str)
+    return summary
+
+
+# ------------------------ ANALYTICS OVER PARTITIONS ------------------------
+
+_PARTITION_RE = re.compile(r"year=(?P<year>[^/\\]+)[/\\]month=(?P<month>[^/\\]+)")
+
+
+def partition_files(root, start=None, end=None):
+    """
+    Part files under root, pruned by month from the directory names alone.
+
+    Args:
+        start, end: Optional inclusive bounds, anything pd.Period(..., "M") accepts
+
+    Returns:
+        List of (path, pd.Period or None for undated rows)
+    """
+    start = pd.Period(start, "M") if start is not None else None
+    end = pd.Period(end, "M") if end is not None else None
+    files = []
+    for path in sorted(glob.glob(os.path.join(root, "year=*", "month=*", "*.parquet"))):
+        match = _PARTITION_RE.search(os.path.relpath(path, root))
+        try:
+            period = pd.Period(year=int(match["year"]), month=int(match["month"]), freq="M")
+        except (TypeError, ValueError):
+            period = None
+        if (start is not None or end is not None) and period is None:
+            continue
+        if (start is not None and period < start) or (end is not None and period > end):
+            continue
+        files.append((path, period))
+    return files
+
+
+def _apply_filters(df, filters):
+    """filters: {column: value or list of values}."""
+    if not filters:
+        return df
+    mask = np.ones(len(df), dtype=bool)
+    for col, value in filters.items():
+        values = value if isinstance(value, (list, tuple, set)) else [value]
+        mask &= df[col].isin(values).to_numpy()
+    return df[mask]
+
+
+def read_partitions(root, columns=None, filters=None, start=None, end=None):
+    """Load the matching rows of a partitioned dataset, reading only the needed columns."""
+    from export_formats import read_parquet_frame
+
+    needed = None if columns is None else list(dict.fromkeys([*columns, *(filters or {})]))
+    frames = []
+    for path, _ in partition_files(root, start, end):
+        df = _apply_filters(read_parquet_frame(path, needed), filters)
+        if len(df):
+            frames.append(df if columns is None else df[columns])
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def aggregate_partitions(root, by, values, filters=None, start=None, end=None, max_workers=None):
+    """
+    Sum and count of value columns per group, pushed down to each part file.
+
+    Every file is read for the by/value/filter columns only and reduced to
+    per-group partial sums and counts in a worker thread; the partials are
+    then combined, so only one file's columns are in memory per worker.
+    "year" and "month" can be used in `by` even though they only exist in
+    the partition paths.
+
+    Returns:
+        DataFrame with the by columns, then "<value>" (sum) and "<value>_count"
+        for every value column, plus "rows"
+    """
+    from export_formats import read_parquet_frame
+
+    by, values = list(by), list(values)
+    path_cols = [col for col in by if col in ("year", "month")]
+    file_cols = list(dict.fromkeys([*[c for c in by if c not in path_cols], *values, *(filters or {})]))
+
+    def partial(item):
+        path, period = item
+        df = _apply_filters(read_parquet_frame(path, file_cols), filters)
+        if df.empty:
+            return None
+        df = df.assign(**{col: pd.to_numeric(df[col], errors="coerce") for col in values})
+        for col in path_cols:
+            df[col] = getattr(period, col) if period is not None else np.nan
+        grouped = df.groupby(by, observed=True, dropna=False)
+        part = grouped[values].agg(["sum", "count"])
+        part.columns = [col if stat == "sum" else f"{col}_count" for col, stat in part.columns]
+        part["rows"] = grouped.size()
+        return part
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        partials = [p for p in pool.map(partial, partition_files(root, start, end)) if p is not None]
+
+    columns = [*by, *[c for v in values for c in (v, f"{v}_count")], "rows"]
+    if not partials:
+        return pd.DataFrame(columns=columns)
+    combined = pd.concat(partials)
+    combined.index = combined.index.set_names(by)
+    return combined.groupby(level=by, dropna=False).sum().reset_index()[columns]
+
+
+def partitioned_trade_analysis(root, quantity_col, value_col, importer_col, supplier_col,
+                               filters=None, start=None, end=None):
+    """
+    The tables of analysis.perform_trade_analysis computed from pushed-down
+    aggregates instead of a loaded DataFrame.
+
+    Average value per unit is total value over total quantity per pair
+    (the in-memory version averages per-row ratios, which needs every row).
+    """
+    agg = aggregate_partitions(
+        root, [importer_col, supplier_col, "year"], [value_col, quantity_col], filters, start, end
+    )
+    results = {}
+    pairs = agg.groupby([importer_col, supplier_col], observed=True)[[value_col, quantity_col]].sum().reset_index()
+
+    top_pairs = pairs[[importer_col, supplier_col, value_col]].sort_values(by=value_col, ascending=False).head(10)
+    results["1. Top Importer-Supplier Combinations"] = top_pairs
+    top_exporting = agg.groupby(supplier_col, observed=True)[value_col].sum().reset_index()
+    top_exporting = top_exporting.sort_values(by=value_col, ascending=False).head(10)
+    results["2. Top Exporting Countries"] = top_exporting
+    results["3. Top Importing Cities/States by Supplier"] = top_pairs
+
+    dominant_export = top_exporting.copy()
+    dominant_export["% Share"] = dominant_export[value_col] / dominant_export[value_col].sum() * 100
+    results["4. Export Dominance Share"] = dominant_export
+
+    results["5. Highest Supplier to Importer Values"] = (
+        pairs[[supplier_col, importer_col, value_col]].sort_values(by=value_col, ascending=False).head(10)
+    )
+
+    trend_df = agg.dropna(subset=["year"]).groupby("year")[value_col].sum().reset_index().sort_values(by="year")
+    trend_df["Change"] = trend_df[value_col].diff()
+    trend_df["% Change"] = trend_df[value_col].pct_change() * 100
+    results["6. Trade Value Trend Over Time"] = trend_df
+
+    pairs["Unit_Value"] = pairs[value_col] / pairs[quantity_col].replace(0, np.nan)
+    unit_values = pairs[[supplier_col, importer_col, "Unit_Value"]].dropna(subset=["Unit_Value"])
+    results["7A. Highest Avg Value per Unit"] = unit_values.sort_values(by="Unit_Value", ascending=False).head(5)
+    results["7B. Lowest Avg Value per Unit"] = unit_values.sort_values(by="Unit_Value", ascending=True).head(5)
+
+    results["8. Importer-Supplier Heatmap Data"] = (
+        pairs.pivot(index=importer_col, columns=supplier_col, values=value_col).fillna(0)
+    )
+    return results
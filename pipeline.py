@@ -0,0 +1,359 @@
+"""
+The cleaning pipeline as a DAG of named stages with on-disk checkpoints.
+
+Each stage declares the artifacts it reads and writes plus the config keys
+it depends on. A stage's key hashes its name, version, config values and
+the keys of the stages that produced its inputs, so changing one stage's
+settings invalidates only that stage and the ones downstream of it.
+Finished stages are checkpointed under their key (DataFrames as Parquet,
+anything else as JSON); running again with the same upload and settings
+loads what already finished and resumes from the first missing stage.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import pandas as pd
+
+from data_cleaning import (
+    CATEGORY_MAX_RATIO,
+    drop_unwanted_columns,
+    deduplicate_rows,
+    resolve_dedup_keys,
+    default_dedup_mode,
+    detect_string_columns,
+    standardize_dataframe,
+    convert_to_kg,
+    convert_sheet_to_usd,
+    convert_month_column_to_datetime,
+    cluster_supplier_names,
+    cluster_location_column,
+    compact_categoricals,
+)
+from export_formats import read_parquet_frame, write_parquet_frame
+
+CHECKPOINT_DIR = os.environ.get(
+    "PIPELINE_CHECKPOINT_DIR", os.path.join(tempfile.gettempdir(), "excel_automator", "checkpoints")
+)
+MAX_CHECKPOINT_BYTES = int(os.environ.get("PIPELINE_CHECKPOINT_MAX_MB", 4096)) * 1024 * 1024
+
+
+class Stage:
+    """
+    One pipeline step.
+
+    func receives the input artifacts positionally plus a `context` dict
+    (config values and UI callbacks) and returns one value per output.
+    """
+
+    def __init__(self, name, func, inputs, outputs, config_keys=(), version=1):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.config_keys = list(config_keys)
+        self.version = version
+
+    def key(self, input_keys, config):
+        digest = hashlib.sha256()
+        payload = {
+            "stage": self.name,
+            "version": self.version,
+            "config": {k: config.get(k) for k in self.config_keys},
+            "inputs": input_keys,
+        }
+        digest.update(json.dumps(payload, sort_keys=True, default=str).encode("utf-8"))
+        return digest.hexdigest()
+
+
+def _dedupe(df, context):
+    mode = context.get("dedup_mode", "flag")
+    if mode == "off":
+        return df, {"key_columns": [], "mode": mode, "rows": len(df), "duplicates": 0, "kept": len(df)}
+    return deduplicate_rows(df, context.get("dedup_keys"), mode)
+
+
+def _standardize(df, context):
+    return standardize_dataframe(df, detect_string_columns(df))
+
+
+def _convert_units(df, context):
+    # convert_to_kg edits rows in place; the shallow copy keeps the input artifact intact
+    return convert_to_kg(df.copy(deep=False), context["quantity_col"], context["unit_col"])
+
+
+def _convert_currency(df, context):
+    if not context.get("currency_col"):
+        return df
+    return convert_sheet_to_usd(
+        df,
+        currency_col=context["currency_col"],
+        value_cols=context["value_cols"],
+        progress_callback=context.get("progress_callback"),
+        status_callback=context.get("status_callback"),
+        warning_callback=context.get("warning_callback"),
+        success_callback=context.get("success_callback"),
+    )
+
+
+def _cluster_suppliers(df, context):
+    if not context.get("supplier_col"):
+        return df
+    return cluster_supplier_names(df.copy(deep=False), supplier_column=context["supplier_col"],
+                                  threshold=context["supplier_threshold"])
+
+
+def _cluster_locations(df, context):
+    if not context.get("importer_city_col"):
+        return df
+    return cluster_location_column(df.copy(deep=False), column=context["importer_city_col"],
+                                   threshold=context["location_threshold"])
+
+
+def _compact(df, context):
+    measures = [context.get("quantity_col"), *(context.get("value_cols") or [])]
+    return compact_categoricals(df, max_ratio=context["category_max_ratio"],
+                                exclude=measures + [f"{col}_USD" for col in measures if col])
+
+
+CLEANING_STAGES = [
+    Stage("drop_columns", lambda df, context: drop_unwanted_columns(df), ["raw"], ["cleaned"]),
+    Stage("dedupe", _dedupe, ["cleaned"], ["deduped", "dedup_report"], ["dedup_keys", "dedup_mode"]),
+    Stage("standardize", _standardize, ["deduped"], ["standardized"]),
+    Stage("convert_units", _convert_units, ["standardized"], ["weight", "converted_rows", "deleted_rows"],
+          ["quantity_col", "unit_col"]),
+    Stage("convert_currency", _convert_currency, ["weight"], ["usd"], ["currency_col", "value_cols"]),
+    Stage("parse_dates", lambda df, context: convert_month_column_to_datetime(df.copy(deep=False)), ["usd"], ["dated"]),
+    Stage("cluster_suppliers", _cluster_suppliers, ["dated"], ["suppliers"], ["supplier_col", "supplier_threshold"]),
+    Stage("cluster_locations", _cluster_locations, ["suppliers"], ["locations"], ["importer_city_col", "location_threshold"]),
+    Stage("compact_categoricals", _compact, ["locations"], ["final"], ["category_max_ratio", "quantity_col", "value_cols"]),
+]
+
+DEFAULT_CONFIG = {
+    "supplier_threshold": 90,
+    "location_threshold": 90,
+    "category_max_ratio": CATEGORY_MAX_RATIO,
+    "dedup_mode": "flag",
+}
+
+
+def cleaning_config(columns):
+    """Pipeline config for a raw frame's columns, matched case-insensitively as app.py does."""
+    col_map = {str(col).lower(): col for col in columns}
+    value_cols = [col_map[col] for col in ["unit_price", "total_ass_value", "invoice_unit_price_fc"] if col in col_map]
+    dedup_keys = resolve_dedup_keys(columns)
+    return {
+        **DEFAULT_CONFIG,
+        "quantity_col": col_map.get("quantity"),
+        "unit_col": col_map.get("uqc"),
+        "currency_col": col_map.get("invoice_currency"),
+        "value_cols": value_cols,
+        "supplier_col": col_map.get("supplier_name"),
+        "importer_city_col": col_map.get("importer_city_state"),
+        "dedup_keys": dedup_keys,
+        "dedup_mode": default_dedup_mode(dedup_keys),
+    }
+
+
+def frame_fingerprint(df):
+    """Content hash of a DataFrame, for raw inputs that have no upload hash."""
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(json.dumps([str(c) for c in df.columns]).encode("utf-8"))
+    return digest.hexdigest()
+
+
+class CheckpointStore:
+    """Stage outputs on disk, one directory per stage key, trimmed oldest-first."""
+
+    def __init__(self, root=CHECKPOINT_DIR, max_bytes=MAX_CHECKPOINT_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def _dir(self, key):
+        return os.path.join(self.root, key)
+
+    def has(self, key):
+        return os.path.isfile(os.path.join(self._dir(key), "_DONE"))
+
+    def touch(self, key):
+        """Mark a finished stage as just used (for LRU); False if it is not on disk."""
+        try:
+            os.utime(os.path.join(self._dir(key), "_DONE"))
+            return True
+        except OSError:
+            return False
+
+    def load(self, key, name):
+        stage_dir = self._dir(key)
+        self.touch(key)
+        parquet_path = os.path.join(stage_dir, f"{name}.parquet")
+        if os.path.exists(parquet_path):
+            return read_parquet_frame(parquet_path)
+        with open(os.path.join(stage_dir, f"{name}.json"), encoding="utf-8") as f:
+            return json.load(f)
+
+    def save(self, key, outputs, keep=()):
+        """
+        Write every output, then the _DONE marker, so a half-written stage
+        never counts as finished. Trimming afterwards spares the keys in keep.
+        """
+        stage_dir = self._dir(key)
+        try:
+            os.makedirs(stage_dir, exist_ok=True)
+            for name, value in outputs.items():
+                if isinstance(value, pd.DataFrame):
+                    write_parquet_frame(value, os.path.join(stage_dir, f"{name}.parquet"))
+                else:
+                    with open(os.path.join(stage_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+                        json.dump(value, f, default=str)
+            with open(os.path.join(stage_dir, "_DONE"), "w") as f:
+                f.write(str(time.time()))
+            self._trim(keep)
+        except (OSError, ImportError, ValueError):
+            shutil.rmtree(stage_dir, ignore_errors=True)  # Checkpoints are best-effort
+
+    def _trim(self, keep=()):
+        entries = []
+        for key in os.listdir(self.root):
+            done = os.path.join(self._dir(key), "_DONE")
+            if os.path.isfile(done):
+                size = sum(e.stat().st_size for e in os.scandir(self._dir(key)) if e.is_file())
+                entries.append((os.stat(done).st_mtime, size, key))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key in keep:
+                continue
+            shutil.rmtree(self._dir(key), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+checkpoint_store = CheckpointStore()
+
+
+def run_pipeline(raw, config, stages=None, raw_key=None, outputs=("final",), store=None,
+                 callbacks=None, stage_callback=None):
+    """
+    Run the stages needed for `outputs`, reusing checkpoints where possible.
+
+    Args:
+        raw: The uploaded DataFrame (artifact "raw")
+        config: Stage settings, see cleaning_config()
+        stages: Stage list in dependency order, defaults to CLEANING_STAGES
+        raw_key: Content hash of the upload; hashed from the frame if None
+        outputs: Artifact names to return
+        store: CheckpointStore, defaults to the module-level one
+        callbacks: Extra context for stage functions (progress/status/warning/success callbacks)
+        stage_callback: Optional callable(stage_name, status, done, total), status is "cached" or "ran"
+
+    Returns:
+        (dict of requested artifacts, list of {stage, status, seconds})
+    """
+    stages = stages or CLEANING_STAGES
+    store = store or checkpoint_store
+    context = {**config, **(callbacks or {})}
+
+    # Keys first: every stage's key depends only on config and upstream keys
+    artifact_keys = {"raw": raw_key or frame_fingerprint(raw)}
+    stage_keys = {}
+    producers = {}
+    for stage in stages:
+        stage_keys[stage.name] = stage.key([artifact_keys[name] for name in stage.inputs], config)
+        for name in stage.outputs:
+            artifact_keys[name] = stage_keys[stage.name]
+            producers[name] = stage
+
+    # Only stages upstream of the requested outputs are needed
+    needed = []
+    pending = list(outputs)
+    while pending:
+        name = pending.pop()
+        stage = producers.get(name)
+        if stage is not None and stage not in needed:
+            needed.append(stage)
+            pending.extend(stage.inputs)
+    needed = [stage for stage in stages if stage in needed]
+
+    artifacts = {"raw": raw}
+
+    def resolve(name):
+        if name not in artifacts:
+            artifacts[name] = store.load(stage_keys[producers[name].name], name)
+        return artifacts[name]
+
+    # Finished stages are not loaded up front: resolve() reads a checkpoint only when a stage that
+    # must run, or the caller, asks for that artifact. Touching them now puts them at the young end
+    # of the LRU, and the saves of this run never trim them.
+    cached = {stage.name for stage in needed if store.touch(stage_keys[stage.name])}
+    pinned = {stage_keys[name] for name in cached}
+    report = []
+    for done, stage in enumerate(needed, start=1):
+        key = stage_keys[stage.name]
+        started = time.perf_counter()
+        if stage.name in cached:
+            status = "cached"
+        else:
+            values = stage.func(*[resolve(name) for name in stage.inputs], context)
+            if len(stage.outputs) == 1:
+                values = (values,)
+            produced = dict(zip(stage.outputs, values))
+            artifacts.update(produced)
+            store.save(key, produced, keep=pinned)
+            status = "ran"
+        report.append({"stage": stage.name, "status": status, "seconds": round(time.perf_counter() - started, 3)})
+        if stage_callback:
+            stage_callback(stage.name, status, done, len(needed))
+
+    return {name: resolve(name) for name in outputs}, report
+
+
+def run_cleaning_job(job, raw, config, raw_key=None, track_memory=False):
+    """
+    run_pipeline as a jobs.JobRunner job: progress and stage status go to the
+    job, warnings are kept in job.messages and cancelling stops the run
+    between rows (finished stages stay checkpointed for the next run).
+
+    Returns:
+        (dict with cleaned, final, converted_rows, deleted_rows and dedup_report, profiler records)
+    """
+    from profiling import Profiler
+
+    finished = {"done": 0, "total": None}
+
+    def stage_cb(name, status, done, total):
+        finished.update(done=done, total=total)
+        job.check_cancelled()
+        label = "loaded from checkpoint" if status == "cached" else "done"
+        job.report(progress=done / total, message=f"{name.replace('_', ' ').capitalize()} {label} ({done}/{total})")
+
+    def progress_cb(fraction):
+        # Row-level progress inside a stage, on the same 0..1 scale as the whole run
+        if finished["total"]:
+            job.report(progress=(finished["done"] + fraction) / finished["total"])
+        job.check_cancelled()
+
+    def status_cb(message):
+        job.report(message=message)
+
+    with Profiler(track_memory) as profiler:
+        results, _ = run_pipeline(
+            raw,
+            config,
+            raw_key=raw_key,
+            outputs=("cleaned", "final", "converted_rows", "deleted_rows", "dedup_report"),
+            callbacks={
+                "progress_callback": progress_cb,
+                "status_callback": status_cb,
+                "warning_callback": job.log,
+            },
+            stage_callback=stage_cb,
+        )
+    return results, profiler.records
@@ -0,0 +1,198 @@
+"""
+End-to-end pipeline benchmark on synthetic trade data.
+
+Every size runs in a fresh interpreter so peak RSS belongs to that size alone.
+Stages run in the same order as the "Clean Data Automatically" button, product
+clustering and the main analyses in app.py. Each stage reports wall and CPU
+time, rows in/out, rows/s and the process peak RSS once it finishes.
+
+Currency conversion uses the fixed rates in synthetic_data.USD_RATES, so the
+numbers measure this code and not the exchange-rate API. Pass --live-rates to
+call the API as the app does.
+
+Usage:
+    python pipeline_benchmark.py                          # 10k and 100k rows
+    python pipeline_benchmark.py --sizes 10k 100k 1m 10m --timeout 3600
+    python pipeline_benchmark.py --json results.json      # also write machine-readable results
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_SIZES = ["10k", "100k"]
+
+
+def parse_size(text):
+    """'10k' -> 10000, '1m' -> 1000000, '2500' -> 2500."""
+    text = str(text).strip().lower().replace("_", "")
+    multiplier = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None where unavailable."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def pipeline_stages(live_rates=False):
+    """(name, function) pairs; each function takes and returns the working frame."""
+    import data_cleaning
+    from data_cleaning import (
+        drop_unwanted_columns, deduplicate_rows, resolve_dedup_keys, default_dedup_mode,
+        detect_string_columns, standardize_dataframe, convert_to_kg,
+        convert_sheet_to_usd, convert_month_column_to_datetime, cluster_supplier_names,
+        cluster_location_column, compact_categoricals,
+    )
+    from clustering import add_cluster_column
+    from analysis import perform_trade_analysis, full_periodic_analysis, build_trend_table
+    from timeseries import MonthlySeriesStore
+    from synthetic_data import USD_RATES
+
+    if not live_rates:
+        def fixed_rate(amount, from_currency, to_currency):
+            rate = USD_RATES.get(from_currency) if to_currency == "USD" else None
+            return rate, None if rate is None else amount * rate
+        data_cleaning.convert_currency = fixed_rate
+
+    def analysis(fn):
+        # Analyses leave the working frame unchanged
+        def run(df):
+            fn(df)
+            return df
+        return run
+
+    return [
+        ("drop_unwanted_columns", drop_unwanted_columns),
+        ("deduplicate_rows", lambda df: deduplicate_rows(df, mode=default_dedup_mode(resolve_dedup_keys(df.columns)))[0]),
+        ("standardize_dataframe", lambda df: standardize_dataframe(df, detect_string_columns(df))),
+        ("convert_to_kg", lambda df: convert_to_kg(df, "Quantity", "UQC")[0]),
+        ("convert_sheet_to_usd", lambda df: convert_sheet_to_usd(df, "Invoice_Currency", ["Unit_Price", "Total_Ass_Value"])),
+        ("convert_month_column_to_datetime", convert_month_column_to_datetime),
+        ("cluster_supplier_names", lambda df: cluster_supplier_names(df, "Supplier_Name")),
+        ("cluster_location_column", lambda df: cluster_location_column(df, "Importer_City_State")),
+        ("compact_categoricals", compact_categoricals),
+        ("add_cluster_column", lambda df: compact_categoricals(add_cluster_column(df, "Item_Description"), columns=["Item_Description_cluster"])),
+        ("perform_trade_analysis", analysis(lambda df: perform_trade_analysis(
+            df.copy(deep=False), "Item_Description_cluster", "Quantity", "Total_Ass_Value_USD",
+            "Importer_City_State", "Supplier_Country"))),
+        ("full_periodic_analysis", analysis(lambda df: full_periodic_analysis(df, "Month", "Total_Ass_Value_USD"))),
+        ("build_trend_table", analysis(lambda df: build_trend_table(df, "Quantity", "Month"))),
+        ("MonthlySeriesStore.from_frame", analysis(lambda df: MonthlySeriesStore.from_frame(df))),
+    ]
+
+
+def run_child(n_rows, dirtiness, seed, live_rates):
+    """Generate data and run every stage, printing one JSON line per stage as it finishes."""
+    sys.path.insert(0, HERE)
+    from dataset_memory import enable_copy_on_write
+    from profiling import Profiler, stage
+    from synthetic_data import generate_trade_data
+
+    enable_copy_on_write()
+
+    with Profiler(track_memory=False) as profiler:
+        with stage("generate") as handle:
+            df = generate_trade_data(n_rows, dirtiness=dirtiness, seed=seed)
+            handle.rows_out = len(df)
+        emit(profiler.records[-1], n_rows)
+
+        for name, fn in pipeline_stages(live_rates):
+            with stage(name, rows_in=len(df)) as handle:
+                df = fn(df)
+                handle.rows_out = len(df)
+            emit(profiler.records[-1], n_rows)
+
+
+def emit(record, n_rows):
+    row = {
+        "rows": n_rows,
+        "stage": record["stage"],
+        "wall_s": record["wall_s"],
+        "cpu_s": record["cpu_s"],
+        "rows_in": record["rows_in"],
+        "rows_out": record["rows_out"],
+        "rows_per_s": round(record["rows_in"] / record["wall_s"]) if record["rows_in"] and record["wall_s"] else None,
+        "peak_rss_mb": None if peak_rss_mb() is None else round(peak_rss_mb(), 1),
+        "status": record["status"],
+    }
+    print(json.dumps(row), flush=True)
+
+
+def run_size(n_rows, dirtiness=0.1, seed=0, timeout=None, live_rates=False):
+    """Run one size in a fresh interpreter; stages that did not finish are marked."""
+    command = [sys.executable, os.path.abspath(__file__), "--child", str(n_rows),
+               "--dirtiness", str(dirtiness), "--seed", str(seed)]
+    if live_rates:
+        command.append("--live-rates")
+
+    status = "ok"
+    try:
+        proc = subprocess.run(command, capture_output=True, text=True, cwd=HERE, timeout=timeout)
+        output = proc.stdout
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            status = f"error: {lines[-1] if lines else proc.returncode}"
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout.decode() if isinstance(e.stdout, bytes) else (e.stdout or "")
+        status = f"timeout after {timeout}s"
+
+    stages = [json.loads(line) for line in output.splitlines() if line.startswith("{")]
+    return {
+        "rows": n_rows,
+        "status": status,
+        "total_wall_s": round(sum(s["wall_s"] for s in stages if s["stage"] != "generate"), 3),
+        "peak_rss_mb": max((s["peak_rss_mb"] for s in stages if s["peak_rss_mb"] is not None), default=None),
+        "stages": stages,
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark the cleaning, clustering and analysis stages.")
+    arg_parser.add_argument("--sizes", nargs="+", default=DEFAULT_SIZES, help="Row counts, e.g. 10k 100k 1m 10m")
+    arg_parser.add_argument("--dirtiness", type=float, default=0.1, help="Share of messy values in the synthetic data")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--timeout", type=float, default=None, help="Seconds allowed per size")
+    arg_parser.add_argument("--live-rates", action="store_true", help="Use the exchange-rate API instead of fixed rates")
+    arg_parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    arg_parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = arg_parser.parse_args()
+
+    if args.child is not None:
+        run_child(args.child, args.dirtiness, args.seed, args.live_rates)
+        return
+
+    results = []
+    for size in args.sizes:
+        n_rows = parse_size(size)
+        result = run_size(n_rows, args.dirtiness, args.seed, args.timeout, args.live_rates)
+        results.append(result)
+
+        print(f"\n{n_rows:,} rows ({result['status']}), peak RSS {result['peak_rss_mb']} MB")
+        for s in result["stages"]:
+            rate = f"{s['rows_per_s']:>12,} rows/s" if s["rows_per_s"] else " " * 19
+            print(f"  {s['stage']:<34}{s['wall_s']:>10.3f} s {rate}  {s['peak_rss_mb']:>9} MB")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "dirtiness": args.dirtiness,
+                "seed": args.seed,
+                "results": results,
+            }, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
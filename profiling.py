@@ -0,0 +1,207 @@
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+_active_profiler = contextvars.ContextVar("active_profiler", default=None)
+
+
+def _row_count(value):
+    """Rows in a DataFrame/Series result (or the first one inside a tuple), else None."""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, tuple):
+        for item in value:
+            if isinstance(item, (pd.DataFrame, pd.Series)):
+                return len(item)
+    return None
+
+
+class Profiler:
+    """
+    Collects per-stage timings while active.
+
+    Use as a context manager around a pipeline run; every `stage()` block or
+    `@profiled` function executed inside it appends a record with wall time,
+    CPU time, rows in/out and (when track_memory is on) peak traced memory.
+
+    Pass an existing list as `records` to keep appending to one timeline
+    across several runs (e.g. cleaning, then clustering on a later rerun).
+    """
+
+    def __init__(self, track_memory=False, records=None):
+        self.track_memory = track_memory
+        self.records = records if records is not None else []
+        self._origin = None
+        self._token = None
+        self._started_tracing = False
+        self._depth = 0
+        # Highest traced peak seen by finished child stages, one slot per open stage
+        self._peak_stack = []
+
+    def __enter__(self):
+        self._origin = time.perf_counter()
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._token = _active_profiler.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _active_profiler.reset(self._token)
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    def to_frame(self):
+        columns = ["stage", "depth", "wall_s", "cpu_s", "rows_in", "rows_out", "peak_mem_mb", "start_s", "status"]
+        return pd.DataFrame(self.records, columns=columns)
+
+    def to_json(self):
+        return json.dumps({"stages": self.records}, indent=2, default=str)
+
+    def to_chrome_trace(self):
+        """Trace Event Format JSON, loadable in chrome://tracing or Perfetto."""
+        events = [
+            {
+                "name": record["stage"],
+                "ph": "X",
+                "ts": record["ts_us"],
+                "dur": record["wall_s"] * 1e6,
+                "pid": os.getpid(),
+                "tid": record["thread"],
+                "args": {
+                    "cpu_s": record["cpu_s"],
+                    "rows_in": record["rows_in"],
+                    "rows_out": record["rows_out"],
+                    "peak_mem_mb": record["peak_mem_mb"],
+                    "status": record["status"],
+                },
+            }
+            for record in self.records
+        ]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+
+class _StageHandle:
+    """Lets a stage body report its output row count."""
+
+    def __init__(self):
+        self.rows_out = None
+
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Time a block as a named stage of the active Profiler (no-op when none is active).
+
+        with stage("parse dates", rows_in=len(df)) as s:
+            ...
+            s.rows_out = len(df)
+    """
+    profiler = _active_profiler.get()
+    handle = _StageHandle()
+    if profiler is None:
+        yield handle
+        return
+
+    tracing = profiler.track_memory and tracemalloc.is_tracing()
+    if tracing:
+        outer_current, outer_peak = tracemalloc.get_traced_memory()
+        if profiler._peak_stack:
+            profiler._peak_stack[-1] = max(profiler._peak_stack[-1], outer_peak)
+        tracemalloc.reset_peak()
+        profiler._peak_stack.append(0)
+
+    started_at = time.time()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    profiler._depth += 1
+    status = "ok"
+    try:
+        yield handle
+    except Exception as e:
+        status = f"error: {e}"
+        raise
+    finally:
+        profiler._depth -= 1
+        wall = time.perf_counter() - start_wall
+        cpu = time.process_time() - start_cpu
+        peak_mb = None
+        if tracing:
+            _, peak = tracemalloc.get_traced_memory()
+            # Children reset the tracer's peak, so fold the saved peaks back in
+            peak = max(peak, profiler._peak_stack.pop())
+            if profiler._peak_stack:
+                profiler._peak_stack[-1] = max(profiler._peak_stack[-1], peak)
+            peak_mb = max(peak - outer_current, 0) / (1024 * 1024)
+
+        profiler.records.append({
+            "stage": name,
+            "depth": profiler._depth,
+            "wall_s": round(wall, 6),
+            "cpu_s": round(cpu, 6),
+            "rows_in": rows_in,
+            "rows_out": handle.rows_out,
+            "peak_mem_mb": None if peak_mb is None else round(peak_mb, 3),
+            "start_s": round(start_wall - profiler._origin, 6),
+            "status": status,
+            "ts_us": round(started_at * 1e6),
+            "thread": threading.get_ident(),
+        })
+
+
+def profiled(name=None):
+    """Decorator recording each call of the function as a stage of the active Profiler."""
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active_profiler.get() is None:
+                return func(*args, **kwargs)
+
+            rows_in = next((_row_count(a) for a in list(args) + list(kwargs.values()) if _row_count(a) is not None), None)
+            with stage(stage_name, rows_in=rows_in) as handle:
+                result = func(*args, **kwargs)
+                handle.rows_out = _row_count(result)
+            return result
+
+        return wrapper
+    return decorator
+
+
+def render_timing_panel(profiler_or_records, key="stage_timings"):
+    """Expandable Streamlit panel with the stage table and JSON / Chrome-trace downloads."""
+    import streamlit as st
+
+    if isinstance(profiler_or_records, Profiler):
+        profiler = profiler_or_records
+    else:
+        profiler = Profiler()
+        profiler.records = list(profiler_or_records or [])
+
+    if not profiler.records:
+        return
+
+    with st.expander("⏱️ Stage Timings"):
+        frame = profiler.to_frame()
+        frame.insert(0, "Stage", ["  " * depth + name for depth, name in zip(frame["depth"], frame["stage"])])
+        st.dataframe(frame.drop(columns=["stage", "depth"]))
+        top_level = frame[frame["depth"] == 0]
+        st.write(f"Total wall time: {top_level['wall_s'].sum():.2f}s, CPU time: {top_level['cpu_s'].sum():.2f}s")
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.download_button("Download Timings (JSON)", profiler.to_json(), "stage_timings.json",
+                               "application/json", key=f"{key}_json")
+        with col2:
+            st.download_button("Download Chrome Trace", profiler.to_chrome_trace(), "stage_trace.json",
+                               "application/json", key=f"{key}_trace")
@@ -0,0 +1,243 @@
+import re
+from io import BytesIO
+
+import pandas as pd
+
+from analysis import perform_trade_analysis, get_fy
+from data_cleaning import safe_numeric_conversion
+
+INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+
+
+def apply_report_filters(df, filters, trade_type_col="Type", importer_col=None, supplier_col=None,
+                         hscode_col="CTH_HSCODE", date_col="Month"):
+    """
+    Apply the analytics filters once for the whole report.
+
+    filters keys (all optional): trade_type, importers, suppliers, years, hscodes.
+    "All" in a list, or an empty list, means no filter.
+    """
+    mask = pd.Series(True, index=df.index)
+
+    trade_type = filters.get("trade_type")
+    if trade_type and trade_type_col in df.columns:
+        mask &= df[trade_type_col].astype(object).astype(str).str.lower() == str(trade_type).lower()
+
+    for key, col in (("importers", importer_col), ("suppliers", supplier_col)):
+        values = filters.get(key) or []
+        if values and "All" not in values and col in df.columns:
+            mask &= df[col].astype(object).astype(str).str.lower().isin([str(v).lower() for v in values])
+
+    hscodes = filters.get("hscodes") or []
+    if hscodes and "All" not in hscodes and hscode_col in df.columns:
+        mask &= df[hscode_col].astype(object).astype(str).isin([str(v) for v in hscodes])
+
+    years = filters.get("years") or []
+    if years and "All" not in years and date_col in df.columns:
+        mask &= pd.to_datetime(df[date_col], errors="coerce").dt.year.isin([int(y) for y in years])
+
+    return df[mask]
+
+
+class ReportContext:
+    """Filtered rows plus intermediate aggregates shared between report sections."""
+
+    def __init__(self, df, columns):
+        self.columns = columns
+        self._cache = {}
+
+        # Parse dates once for every section; the new columns go on a shallow copy
+        base = df.copy(deep=False)
+        base["_date"] = pd.to_datetime(base[columns["date"]], errors="coerce") if columns["date"] in base.columns else pd.NaT
+        base["year_extracted"] = base["_date"].dt.year
+        self.base = base
+
+    def shared(self, name, builder):
+        """Compute an intermediate once and reuse it across sections."""
+        if name not in self._cache:
+            self._cache[name] = builder()
+        return self._cache[name]
+
+    def key_cols(self):
+        cols = self.columns
+        return [col for col in (cols["hscode"], cols["product"], cols["trade_type"]) if col in self.base.columns]
+
+    def monthly_cells(self):
+        """
+        Monthly cells per HS code, product and trade type (see
+        master_dataset.monthly_cube), the one pass over the rows behind the
+        periodic averages, trends and forecasts. "_value" and "_value_count"
+        hold the sum and count of parsed values so averages come from the
+        cells too.
+        """
+        def build():
+            from master_dataset import monthly_cube
+
+            cols = self.columns
+            rows = self.base.copy(deep=False)
+            if cols["value"] in rows.columns:
+                values = safe_numeric_conversion(rows[cols["value"]])
+                rows["_value"] = values
+                rows["_value_count"] = values.notna().astype(int)
+            return monthly_cube(rows, self.key_cols(), metrics=[cols["quantity"], "_value", "_value_count"],
+                                date_col="_date")
+        return self.shared("monthly_cells", build)
+
+
+def _overview(ctx):
+    base = ctx.base
+    cols = ctx.columns
+    rows = [
+        ("Records", len(base)),
+        ("First Month", base["_date"].min()),
+        ("Last Month", base["_date"].max()),
+    ]
+    for key in ("quantity", "value"):
+        if cols[key] in base.columns:
+            rows.append((f"Total {cols[key]}", pd.to_numeric(base[cols[key]], errors="coerce").sum()))
+    return {"Overview": pd.DataFrame(rows, columns=["Metric", "Value"])}
+
+
+def _trade_analysis(ctx):
+    cols = ctx.columns
+    needed = [cols["product"], cols["quantity"], cols["value"], cols["importer"], cols["supplier"]]
+    if any(col not in ctx.base.columns for col in needed):
+        return {}
+    results = perform_trade_analysis(
+        ctx.base.copy(deep=False),
+        product_col=cols["product"],
+        quantity_col=cols["quantity"],
+        value_col=cols["value"],
+        importer_col=cols["importer"],
+        supplier_col=cols["supplier"],
+    )
+    if "error" in results:
+        return {"Trade Analysis Error": pd.DataFrame({"Error": [results["error"]]})}
+    return results
+
+
+def _periodic_averages(ctx):
+    cells = ctx.monthly_cells()
+    if cells.empty or "_value" not in cells.columns:
+        return {}
+    monthly = cells.groupby(["year", "month"])[["_value", "_value_count"]].sum().reset_index()
+    dates = pd.to_datetime(dict(year=monthly["year"], month=monthly["month"], day=1))
+    periods = {
+        "Monthly Average": dates.dt.to_period("M").astype(str),
+        "Quarterly Average": dates.dt.to_period("Q").astype(str),
+        "Financial Year Average": dates.apply(get_fy),
+        "Calendar Year Average": dates.dt.year.astype(str),
+    }
+    averages = {}
+    for name, keys in periods.items():
+        totals = monthly.groupby(keys)[["_value", "_value_count"]].sum()
+        averages[name] = (totals["_value"] / totals["_value_count"]).rename_axis("Period").reset_index(name=name)
+    return averages
+
+
+def _trends(ctx):
+    from master_dataset import trend_tables_from_cube
+
+    quantity = ctx.columns["quantity"]
+    cells = ctx.monthly_cells()
+    if quantity not in cells.columns:
+        return {}
+    tables = ctx.shared("trend_tables", lambda: trend_tables_from_cube(cells, quantity, ctx.key_cols()))
+    return {
+        "Product Growth": tables["Growth"],
+        "Yearly Comparison": tables["Yearly"],
+        "Quarterly Comparison": tables["Quarterly"],
+    }
+
+
+def _forecasts(ctx):
+    from timeseries import MonthlySeriesStore
+    from forecasting import batch_forecast
+
+    cols = ctx.columns
+    if cols["hscode"] not in ctx.base.columns or cols["product"] not in ctx.base.columns:
+        return {}
+    # Cells of the same product under several trade types add up into one series
+    store = ctx.shared("series_store", lambda: MonthlySeriesStore.from_cells(
+        ctx.monthly_cells(), key_cols=(cols["hscode"], cols["product"]), metrics=[cols["quantity"]],
+    ))
+    if cols["quantity"] not in store.metrics:
+        return {}
+
+    histories = {}
+    for hscode in store.first_level_values():
+        for item in store.items_for(hscode, min_months=6):
+            histories[(f"{hscode} : {item}", cols["quantity"])] = store.history((hscode, item), cols["quantity"])
+
+    forecast_table, trend_table = batch_forecast(histories, engine="auto")
+    return {"Forecast Trends": trend_table, "Forecasts": forecast_table}
+
+
+# Sections run in this order; periodic averages, trends and forecasts share ctx.monthly_cells()
+REPORT_SECTIONS = [
+    ("overview", _overview),
+    ("trade_analysis", _trade_analysis),
+    ("periodic_averages", _periodic_averages),
+    ("trends", _trends),
+    ("forecasts", _forecasts),
+]
+
+
+def sheet_name(title, used):
+    """Excel-safe, unique sheet name of at most 31 characters."""
+    name = INVALID_SHEET_CHARS.sub("", str(title)).strip()[:31] or "Sheet"
+    candidate, n = name, 2
+    while candidate.lower() in used:
+        suffix = f" ({n})"
+        candidate = name[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(candidate.lower())
+    return candidate
+
+
+def build_report(df, filters=None, value_col="Total_Ass_Value_USD", quantity_col="Quantity",
+                 product_col="Item_Description_cluster", importer_col="Importer_City_State",
+                 supplier_col="Supplier_Country", hscode_col="CTH_HSCODE", trade_type_col="Type",
+                 date_col="Month", sections=None, progress_callback=None):
+    """
+    Run every report section over the filtered data in one pass and write the
+    results to a single workbook, one sheet per insight.
+
+    Returns:
+        (xlsx bytes, list of sheet names)
+    """
+    columns = {
+        "value": value_col, "quantity": quantity_col, "product": product_col,
+        "importer": importer_col, "supplier": supplier_col, "hscode": hscode_col,
+        "trade_type": trade_type_col, "date": date_col,
+    }
+    filtered = apply_report_filters(
+        df, filters or {}, trade_type_col=trade_type_col, importer_col=importer_col,
+        supplier_col=supplier_col, hscode_col=hscode_col, date_col=date_col,
+    )
+    ctx = ReportContext(filtered, columns)
+
+    selected = [(name, fn) for name, fn in REPORT_SECTIONS if sections is None or name in sections]
+    output = BytesIO()
+    used = set()
+    written = []
+
+    with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+        for done, (name, section) in enumerate(selected, start=1):
+            try:
+                results = section(ctx)
+            except Exception as e:
+                results = {f"{name} error": pd.DataFrame({"Error": [str(e)]})}
+
+            for title, table in results.items():
+                if not isinstance(table, pd.DataFrame):
+                    continue
+                sheet = sheet_name(title, used)
+                keep_index = not isinstance(table.index, pd.RangeIndex)
+                table.to_excel(writer, sheet_name=sheet, index=keep_index)
+                written.append(sheet)
+
+            if progress_callback:
+                progress_callback(done / len(selected), f"Finished {name.replace('_', ' ')}")
+
+    return output.getvalue(), written
@@ -0,0 +1,105 @@
+"""
+Startup-time benchmark for the Streamlit app.
+
+Each module is imported in a fresh interpreter so the numbers are cold-import
+costs, not cache hits. The "app.py (top-level imports)" row executes only the
+import statements at the top of app.py, which is what a new Streamlit worker
+pays before the upload widget renders.
+
+Usage:
+    python startup_benchmark.py                 # table on stdout
+    python startup_benchmark.py --json out.json # also write machine-readable results
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+MODULES = [
+    "pandas",
+    "streamlit",
+    "data_cleaning",
+    "clustering",
+    "analysis",
+    "timeseries",
+    "forecasting",
+    "forecast_engines",
+    "backtesting",
+    "export_excel",
+    "matplotlib.pyplot",
+    "seaborn",
+    "plotly.express",
+    "statsmodels.tsa.holtwinters",
+    "prophet",
+]
+
+TIMER = (
+    "import time, sys\n"
+    "sys.path.insert(0, {here!r})\n"
+    "started = time.perf_counter()\n"
+    "{code}\n"
+    "print(time.perf_counter() - started)\n"
+)
+
+
+def app_import_code(app_path=os.path.join(HERE, "app.py")):
+    """Source of the top-level import statements in app.py."""
+    with open(app_path, encoding="utf-8") as f:
+        source = f.read()
+    tree = ast.parse(source)
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return "\n".join(ast.get_source_segment(source, node) for node in imports)
+
+
+def time_code(code, repeat=3):
+    """Median seconds to run `code` in a fresh interpreter, or None if it fails."""
+    timings = []
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", TIMER.format(here=HERE, code=code)],
+            capture_output=True,
+            text=True,
+            cwd=HERE,
+        )
+        if proc.returncode != 0:
+            return None, proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "failed"
+        timings.append(float(proc.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings), None
+
+
+def run_benchmark(modules=None, repeat=3):
+    """Return a list of {target, seconds, error} rows."""
+    rows = []
+    seconds, error = time_code(app_import_code(), repeat)
+    rows.append({"target": "app.py (top-level imports)", "seconds": seconds, "error": error})
+
+    for module in modules or MODULES:
+        seconds, error = time_code(f"import {module}", repeat)
+        rows.append({"target": module, "seconds": seconds, "error": error})
+    return rows
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure cold import cost of app.py and its modules.")
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per target (median is reported)")
+    arg_parser.add_argument("--json", dest="json_path", help="Write results to this JSON file")
+    arg_parser.add_argument("modules", nargs="*", help="Modules to time instead of the default list")
+    args = arg_parser.parse_args()
+
+    rows = run_benchmark(args.modules, args.repeat)
+    for row in rows:
+        value = f"{row['seconds'] * 1000:9.1f} ms" if row["seconds"] is not None else f"  n/a ({row['error']})"
+        print(f"{row['target']:<32}{value}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "repeat": args.repeat, "results": rows}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Synthetic customs trade data with the columns and messiness app.py expects.
+
+Real shipment data can't be shared, so benchmarks and demos use this instead.
+Generation is vectorized (about 3s per million rows).
+
+Usage:
+    python synthetic_data.py 100000 trade.csv               # clean-ish data
+    python synthetic_data.py 100000 trade.xlsx --dirtiness 0.3 --seed 7
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+TRADE_TYPES = ["Import", "Export"]
+
+# (HS code, base description, typical unit price in USD per kg)
+PRODUCTS = [
+    (29362800, "Vitamin E Acetate", 18.0),
+    (29362700, "Ascorbic Acid Vitamin C", 4.5),
+    (29420090, "Citicoline Sodium", 95.0),
+    (29335990, "Levetiracetam Powder", 42.0),
+    (30049099, "Paracetamol Tablets", 6.0),
+    (39011010, "Linear Low Density Polyethylene", 1.3),
+    (39021000, "Polypropylene Homopolymer", 1.2),
+    (28151100, "Caustic Soda Flakes", 0.45),
+    (15119020, "Refined Palm Olein", 0.95),
+    (17011490, "Raw Cane Sugar", 0.5),
+    (72085110, "Hot Rolled Steel Plates", 0.7),
+    (74031100, "Copper Cathodes", 8.8),
+    (85176290, "Network Switch Modules", 140.0),
+    (84713010, "Laptop Computers", 320.0),
+    (52010015, "Raw Cotton Bales", 1.9),
+    (33012400, "Peppermint Oil", 38.0),
+]
+
+PRODUCT_SUFFIXES = ["", " powder", " usp", " bp grade", " (industrial)", " 99%", " bulk", " packed"]
+
+SUPPLIERS = [
+    ("BASF SE", "Germany"), ("DSM Nutritional Products AG", "Switzerland"),
+    ("Zhejiang Medicine Co Ltd", "China"), ("Shandong Luwei Pharmaceutical Co Ltd", "China"),
+    ("Sinopec Trading Limited", "China"), ("Reliance Global Pte", "Singapore"),
+    ("Wilmar Trading Pte Ltd", "Singapore"), ("Dow Chemical Company Inc", "United States"),
+    ("Cargill Incorporated", "United States"), ("Glencore International AG", "Switzerland"),
+    ("Samsung C&T Corporation", "South Korea"), ("Mitsui & Co Ltd", "Japan"),
+    ("Olam International Limited", "Singapore"), ("Aurobindo Pharma Ltd", "India"),
+    ("Sabic Asia Pacific Pte Ltd", "Saudi Arabia"), ("Louis Dreyfus Company BV", "Netherlands"),
+]
+
+SUPPLIER_SUFFIX_VARIANTS = [" Ltd", " Limited", " LTD.", " Inc", " Co", " GmbH", " LLC", ""]
+
+CITIES = [
+    ("Mumbai", "Maharashtra", "MAH"), ("Pune", "Maharashtra", "MAH"), ("Chennai", "Tamil Nadu", "TN"),
+    ("Kolkata", "West Bengal", "WB"), ("Kochi", "Kerala", "KL"), ("Lucknow", "Uttar Pradesh", "UP"),
+    ("Visakhapatnam", "Andhra Pradesh", "AP"), ("Ahmedabad", "Gujarat", "GJ"),
+    ("Hyderabad", "Telangana", "TS"), ("Bengaluru", "Karnataka", "KA"),
+]
+
+# Unit label variants and the factor from kg to that unit
+UNITS = [
+    ("KGS", 1.0), ("kgs", 1.0), ("KG", 1.0), ("TON", 0.001), ("MTS", 0.001),
+    ("LBS", 1 / 0.453592), ("GRAM", 1000.0), ("QUINTAL", 0.01),
+]
+UNCONVERTIBLE_UNITS = ["PCS", "NOS", "BAGS", "DRUMS"]
+
+CURRENCIES = ["USD", "EUR", "CNY", "JPY", "GBP", "SGD", "INR"]
+# Approximate USD value of one unit of each currency
+USD_RATES = {"USD": 1.0, "EUR": 1.08, "CNY": 0.14, "JPY": 0.0068, "GBP": 1.27, "SGD": 0.74, "INR": 0.012}
+
+MONTH_FORMATS = ["%b-%Y", "%B-%Y", "%b-%y", "%B--%Y", "%b/%y", "%B %Y"]
+
+COLUMNS = [
+    "Type", "CTH_HSCODE", "Item_Description", "Supplier_Name", "Supplier_Country",
+    "Importer_City_State", "UQC", "Quantity", "Invoice_Currency", "Unit_Price",
+    "Total_Ass_Value", "Month",
+]
+
+
+def _messy_case(values, rng, dirtiness):
+    """Randomly upper- or lower-case and pad a fraction of the strings."""
+    values = pd.Series(values, dtype=object)
+    roll = rng.random(len(values))
+    values = values.where(roll >= dirtiness / 3, values.str.upper())
+    values = values.where((roll < dirtiness / 3) | (roll >= 2 * dirtiness / 3), values.str.lower())
+    pad = rng.random(len(values)) < dirtiness / 2
+    values[pad] = "  " + values[pad] + " "
+    return values
+
+
+def _variant_table(base_names, variants_fn, n_variants, rng):
+    """A (len(base_names), n_variants) object array of spelling variants per name."""
+    table = np.empty((len(base_names), n_variants), dtype=object)
+    for i, name in enumerate(base_names):
+        table[i, 0] = name
+        for j in range(1, n_variants):
+            table[i, j] = variants_fn(name, rng)
+    return table
+
+
+def _supplier_variant(name, rng):
+    stem = name
+    for suffix in SUPPLIER_SUFFIX_VARIANTS:
+        if suffix and stem.endswith(suffix.strip(".")):
+            stem = stem[: -len(suffix.strip("."))].rstrip()
+            break
+    variant = stem + SUPPLIER_SUFFIX_VARIANTS[rng.integers(len(SUPPLIER_SUFFIX_VARIANTS))]
+    if rng.random() < 0.3:
+        variant = variant.replace(" ", "  ", 1)
+    if rng.random() < 0.3:
+        variant = variant.replace("&", "and")
+    return variant
+
+
+def _city_variant(name, rng):
+    city, state, abbr = name.split("|")
+    options = [f"{city}/{abbr}", f"{city} {abbr}", f"{city}-{state}", f"{city.upper()}, {state.upper()}", f"{city} ({abbr})"]
+    return options[rng.integers(len(options))]
+
+
+def generate_trade_data(n_rows, dirtiness=0.1, seed=0, start_month="2019-04", n_months=60):
+    """
+    Build a synthetic shipment table.
+
+    Args:
+        n_rows: Number of shipments
+        dirtiness: 0..1, fraction of values that get messy spellings, casing,
+            odd units, unparseable quantities or missing values
+        seed: Random seed, the same seed always gives the same frame
+        start_month: First month in the data
+        n_months: Number of months covered
+
+    Returns:
+        DataFrame with the raw (uncleaned) columns listed in COLUMNS.
+    """
+    rng = np.random.default_rng(seed)
+    dirtiness = float(np.clip(dirtiness, 0.0, 1.0))
+    n_variants = 1 + int(round(dirtiness * 10))
+
+    # Skewed popularity so a few products and suppliers dominate, as in real data
+    product_idx = np.minimum(rng.zipf(1.6, n_rows) - 1, len(PRODUCTS) - 1)
+    supplier_idx = np.minimum(rng.zipf(1.4, n_rows) - 1, len(SUPPLIERS) - 1)
+    city_idx = rng.integers(len(CITIES), size=n_rows)
+    variant_idx = np.where(rng.random(n_rows) < dirtiness, rng.integers(n_variants, size=n_rows), 0)
+
+    hscodes = np.array([p[0] for p in PRODUCTS])
+    base_prices = np.array([p[2] for p in PRODUCTS])
+
+    descriptions = np.array([p[1] + suffix for p in PRODUCTS for suffix in PRODUCT_SUFFIXES], dtype=object)
+    description_idx = product_idx * len(PRODUCT_SUFFIXES) + rng.integers(len(PRODUCT_SUFFIXES), size=n_rows)
+
+    supplier_table = _variant_table([s[0] for s in SUPPLIERS], _supplier_variant, n_variants, rng)
+    city_table = _variant_table(["|".join(c) for c in CITIES], _city_variant, n_variants, rng)
+    city_table[:, 0] = [f"{c[0]}, {c[1]}" for c in CITIES]
+    supplier_countries = np.array([s[1] for s in SUPPLIERS], dtype=object)
+
+    # Quantities in kg, then expressed in a random unit
+    quantity_kg = np.round(rng.lognormal(mean=7.0, sigma=1.4, size=n_rows), 2)
+    unit_pick = np.where(rng.random(n_rows) < 0.6, 0, rng.integers(len(UNITS), size=n_rows))
+    unit_labels = np.array([u[0] for u in UNITS], dtype=object)[unit_pick]
+    quantity = np.round(quantity_kg * np.array([u[1] for u in UNITS])[unit_pick], 3)
+
+    currency = np.array(CURRENCIES, dtype=object)[np.where(rng.random(n_rows) < 0.55, 0, rng.integers(len(CURRENCIES), size=n_rows))]
+    usd_rate = pd.Series(currency).map(USD_RATES).to_numpy()
+    price_usd_per_kg = base_prices[product_idx] * rng.lognormal(0.0, 0.25, n_rows)
+    total_usd = quantity_kg * price_usd_per_kg
+    total_fc = np.round(total_usd / usd_rate, 2)
+    unit_price = np.round(total_fc / np.where(quantity == 0, 1, quantity), 4)
+
+    months = pd.period_range(start_month, periods=n_months, freq="M").to_timestamp()
+    month_idx = rng.integers(n_months, size=n_rows)
+    format_idx = np.where(rng.random(n_rows) < max(dirtiness, 0.05), rng.integers(len(MONTH_FORMATS), size=n_rows), 0)
+    # Format each (month, format) pair once and look it up per row
+    month_labels = np.array([[m.strftime(fmt) for fmt in MONTH_FORMATS] for m in months], dtype=object)
+
+    df = pd.DataFrame({
+        "Type": _messy_case(np.array(TRADE_TYPES, dtype=object)[(rng.random(n_rows) < 0.15).astype(int)], rng, dirtiness),
+        "CTH_HSCODE": hscodes[product_idx],
+        "Item_Description": _messy_case(descriptions[description_idx], rng, dirtiness),
+        "Supplier_Name": _messy_case(supplier_table[supplier_idx, variant_idx], rng, dirtiness),
+        "Supplier_Country": supplier_countries[supplier_idx],
+        "Importer_City_State": _messy_case(city_table[city_idx, variant_idx], rng, dirtiness),
+        "UQC": unit_labels,
+        "Quantity": quantity.astype(object),
+        "Invoice_Currency": currency,
+        "Unit_Price": unit_price,
+        "Total_Ass_Value": total_fc,
+        "Month": month_labels[month_idx, format_idx],
+    }, columns=COLUMNS)
+
+    # Dirt that the cleaning stages are expected to drop or repair
+    dirty = rng.random(n_rows) < dirtiness * 0.2
+    df.loc[dirty, "UQC"] = rng.choice(UNCONVERTIBLE_UNITS, size=int(dirty.sum()))
+    with_unit_text = rng.random(n_rows) < dirtiness * 0.2
+    df.loc[with_unit_text, "Quantity"] = df.loc[with_unit_text, "Quantity"].astype(str) + " " + df.loc[with_unit_text, "UQC"].astype(str).str.lower()
+    df.loc[rng.random(n_rows) < dirtiness * 0.1, "Invoice_Currency"] = pd.Series(currency).str.lower()
+    df.loc[rng.random(n_rows) < dirtiness * 0.02, "Supplier_Name"] = None
+    df.loc[rng.random(n_rows) < dirtiness * 0.02, "Month"] = "n/a"
+    return df
+
+
+def write_trade_data(df, path):
+    """Write to .csv, .parquet or .xlsx, chosen by the file extension."""
+    if path.endswith(".parquet"):
+        df.astype({"Quantity": str}).to_parquet(path, index=False)
+    elif path.endswith((".xlsx", ".xls")):
+        df.to_excel(path, index=False, engine="xlsxwriter")
+    else:
+        df.to_csv(path, index=False)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Generate synthetic customs trade data.")
+    arg_parser.add_argument("rows", type=int, help="Number of rows")
+    arg_parser.add_argument("path", help="Output file (.csv, .parquet or .xlsx)")
+    arg_parser.add_argument("--dirtiness", type=float, default=0.1, help="0..1, share of messy values")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    arg_parser.add_argument("--months", type=int, default=60, help="Months covered, starting April 2019")
+    args = arg_parser.parse_args()
+
+    df = generate_trade_data(args.rows, dirtiness=args.dirtiness, seed=args.seed, n_months=args.months)
+    write_trade_data(df, args.path)
+    print(f"Wrote {len(df):,} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_cleaning import (
+    RowHashSet,
+    deduplicate_rows,
+    default_dedup_mode,
+    resolve_dedup_keys,
+    row_hashes,
+)
+
+
+def shipments(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "BE_No": np.arange(n),
+        "Month": pd.Timestamp("2024-01-01") + pd.to_timedelta(rng.integers(0, 365, n), unit="D"),
+        "CTH_HSCODE": rng.choice([84713010, 85171300, 9012100], n),
+        "Supplier_Name": rng.choice(["Acme Ltd", "Beta Corp", "Gamma"], n),
+        "Quantity": rng.integers(1, 100, n),
+        "Total_Ass_Value": rng.random(n) * 1000,
+    })
+
+
+def test_row_hash_set_membership():
+    seen = RowHashSet(np.array([5, 1, 3], dtype=np.uint64))
+    assert len(seen) == 3
+    assert 3 in seen and 4 not in seen
+    assert seen.contains([1, 2, 5, 6]).tolist() == [True, False, True, False]
+
+
+def test_row_hash_set_merges_runs_without_duplicates():
+    rng = np.random.default_rng(1)
+    values = rng.integers(0, 2**63, 20_000, dtype=np.int64).astype(np.uint64)
+    seen = RowHashSet()
+    for batch in np.array_split(values, 40):
+        seen.add(batch)
+    seen.add(values[:500])     # already present: must not be stored twice
+
+    expected = np.sort(pd.unique(values))
+    assert len(seen) == len(expected)
+    assert np.array_equal(seen.to_array(), expected)
+    assert seen.contains(values).all()
+    assert not seen.contains(np.array([2**63 + 7], dtype=np.uint64)).any()
+
+
+def test_check_and_add_flags_repeats_within_and_across_batches():
+    seen = RowHashSet()
+    first = seen.check_and_add(np.array([10, 20, 10], dtype=np.uint64))
+    second = seen.check_and_add(np.array([20, 30, 30], dtype=np.uint64))
+    assert first.tolist() == [False, False, True]
+    assert second.tolist() == [True, False, True]
+    assert np.array_equal(seen.to_array(), np.array([10, 20, 30], dtype=np.uint64))
+
+
+def test_row_hashes_normalize_text_and_numbers():
+    left = pd.DataFrame({"Supplier_Name": ["Acme Ltd"], "Quantity": [10]})
+    right = pd.DataFrame({"Supplier_Name": ["  ACME LTD "], "Quantity": ["10"]})
+    other = pd.DataFrame({"Supplier_Name": ["Acme Ltd"], "Quantity": [11]})
+    keys = ["Supplier_Name", "Quantity"]
+    assert row_hashes(left, keys)[0] == row_hashes(right, keys)[0]
+    assert row_hashes(left, keys)[0] != row_hashes(other, keys)[0]
+
+
+def test_deduplicate_rows_drop_keeps_first_occurrence():
+    df = shipments(1_000)
+    doubled = pd.concat([df, df.iloc[:100]], ignore_index=True)
+
+    result, report = deduplicate_rows(doubled, mode="drop")
+    assert report["duplicates"] == 100
+    assert report["kept"] == len(result) == 1_000
+    assert result.index.tolist() == list(range(1_000))
+    assert "BE_No" in report["key_columns"]
+
+
+def test_deduplicate_rows_flag_keeps_every_row():
+    df = shipments(200)
+    doubled = pd.concat([df, df.iloc[:20]], ignore_index=True)
+
+    result, report = deduplicate_rows(doubled, mode="flag")
+    assert len(result) == len(doubled)
+    assert result["Is_Duplicate"].sum() == report["duplicates"] == 20
+    assert result["Is_Duplicate"].iloc[200:].all()
+    assert "Is_Duplicate" not in doubled.columns
+
+
+@pytest.mark.parametrize("chunks", [1, 3, 7])
+def test_deduplicate_rows_with_seen_set_across_chunks(chunks):
+    df = shipments(3_000, seed=2)
+    # Repeats both inside the data and spanning chunk boundaries
+    data = pd.concat([df, df.sample(600, random_state=3)], ignore_index=True).sample(frac=1, random_state=4)
+
+    whole, whole_report = deduplicate_rows(data, mode="drop")
+    seen = RowHashSet()
+    kept, duplicates = [], 0
+    for rows in np.array_split(np.arange(len(data)), chunks):
+        chunk = data.iloc[rows]
+        chunk, report = deduplicate_rows(chunk, mode="drop", seen=seen)
+        kept.append(chunk)
+        duplicates += report["duplicates"]
+
+    assert duplicates == whole_report["duplicates"] == 600
+    assert pd.concat(kept).index.tolist() == whole.index.tolist()
+    assert len(seen) == 3_000
+
+
+def test_seen_set_excludes_rows_of_an_earlier_file():
+    earlier, new = shipments(500, seed=5), shipments(500, seed=6)
+    new["BE_No"] += 400     # 100 overlapping shipments with identical values
+    new.iloc[:100, 1:] = earlier.iloc[400:, 1:].to_numpy()
+
+    seen = RowHashSet(row_hashes(earlier, resolve_dedup_keys(earlier.columns)))
+    result, report = deduplicate_rows(new, mode="drop", seen=seen)
+    assert report["duplicates"] == 100
+    assert result["BE_No"].min() == 500
+
+
+def test_deduplicate_rows_without_keys_checks_nothing():
+    df = pd.concat([shipments(10)] * 2, ignore_index=True)
+    result, report = deduplicate_rows(df, key_cols=[], mode="drop")
+    assert len(result) == 20 and report["duplicates"] == 0 and report["key_columns"] == []
+
+
+def test_default_dedup_mode_drops_only_with_an_identifier():
+    assert default_dedup_mode(["BE_No", "Month"]) == "drop"
+    assert default_dedup_mode(["be_number"]) == "drop"
+    assert default_dedup_mode(["Month", "CTH_HSCODE", "Quantity"]) == "flag"
@@ -0,0 +1,21 @@
+from master_dataset import append_to_master, load_cube
+from out_of_core import process_out_of_core
+from synthetic_data import generate_trade_data
+
+
+def test_append_to_flagged_master_counts_overlapping_rows_once(tmp_path):
+    df = generate_trade_data(2_000, seed=3).drop(columns=["BE_No"], errors="ignore")
+    df.iloc[:1_200].to_csv(tmp_path / "first.csv", index=False)
+    df.iloc[800:].to_csv(tmp_path / "second.csv", index=False)      # 400 rows overlap the first file
+    df.to_csv(tmp_path / "whole.csv", index=False)
+
+    master, reference = str(tmp_path / "master"), str(tmp_path / "reference")
+    for path, root in ((tmp_path / "first.csv", master), (tmp_path / "whole.csv", reference)):
+        process_out_of_core(str(path), root, chunk_rows=500, config={"dedup_mode": "flag"}, cluster_column=None)
+
+    result = append_to_master(str(tmp_path / "second.csv"), master, chunk_rows=500)
+    assert result["duplicate_rows"] == 400
+    assert load_cube(master)["records"].sum() == load_cube(reference)["records"].sum()
+
+    append_to_master(str(tmp_path / "second.csv"), master, chunk_rows=500)
+    assert load_cube(master)["records"].sum() == load_cube(reference)["records"].sum()
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from pipeline import CheckpointStore, Stage, run_pipeline
+
+
+def test_saves_never_trim_checkpoints_the_run_still_needs(tmp_path):
+    rows = pd.DataFrame({"v": range(20_000)})
+    stages = [
+        Stage("a", lambda raw, ctx: rows, ["raw"], ["a"]),
+        Stage("x", lambda raw, ctx: rows.assign(w=ctx["n"]), ["raw"], ["x"], config_keys=("n",)),
+        Stage("c", lambda a, x, ctx: a.head(3), ["a", "x"], ["c"]),
+    ]
+    store = CheckpointStore(str(tmp_path), max_bytes=10**9)
+    raw = pd.DataFrame({"r": [1]})
+    run_pipeline(raw, {"n": 1}, stages, outputs=("c",), store=store)
+
+    # "a" is cached but only loaded by "c", after "x" has saved and trimmed
+    store.max_bytes = 1
+    artifacts, report = run_pipeline(raw, {"n": 2}, stages, outputs=("c",), store=store)
+    assert [r["status"] for r in report] == ["cached", "ran", "ran"]
+    assert len(artifacts["c"]) == 3
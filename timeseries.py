@@ -0,0 +1,184 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+SERIES_METRICS = ["Quantity", "Unit_Price_USD", "Total_Ass_Value_USD"]
+
+
+class MonthlySeriesStore:
+    """
+    Dense item x metric x month arrays built once from the raw rows.
+
+    Missing months are zero-filled, and a parallel record-count array keeps
+    track of which months actually had shipments.
+    """
+
+    def __init__(self, key_cols, key_index, metrics, months, values, counts):
+        self.key_cols = list(key_cols)
+        self.key_index = key_index      # MultiIndex of item keys
+        self.metrics = list(metrics)
+        self.months = months            # PeriodIndex, freq="M"
+        self.values = values            # float64 [n_keys, n_metrics, n_months]
+        self.counts = counts            # int64   [n_keys, n_months]
+
+    @classmethod
+    def from_frame(cls, df, key_cols=("CTH_HSCODE", "Item_Description_cluster"), metrics=None, date_col="Month"):
+        """Build the store in one vectorized pass over the rows."""
+        key_cols = list(key_cols)
+        metrics = [m for m in (metrics or SERIES_METRICS) if m in df.columns]
+
+        dates = pd.to_datetime(df[date_col], errors="coerce")
+        mask = dates.notna() & df[key_cols].notna().all(axis=1)
+        dates = dates[mask]
+
+        if dates.empty:
+            empty_keys = pd.MultiIndex.from_tuples([], names=key_cols)
+            return cls(key_cols, empty_keys, metrics, pd.PeriodIndex([], freq="M"),
+                       np.zeros((0, len(metrics), 0)), np.zeros((0, 0), dtype=np.int64))
+
+        start = dates.min().to_period("M")
+        months = pd.period_range(start, dates.max().to_period("M"), freq="M")
+        month_pos = ((dates.dt.year - start.year) * 12 + dates.dt.month - start.month).to_numpy()
+
+        codes, key_index = pd.MultiIndex.from_frame(df.loc[mask, key_cols]).factorize()
+        n_keys, n_months = len(key_index), len(months)
+        flat = codes * n_months + month_pos
+        size = n_keys * n_months
+
+        counts = np.bincount(flat, minlength=size).reshape(n_keys, n_months)
+        values = np.zeros((n_keys, len(metrics), n_months))
+        for i, metric in enumerate(metrics):
+            weights = pd.to_numeric(df.loc[mask, metric], errors="coerce").fillna(0).to_numpy(dtype=float)
+            values[:, i, :] = np.bincount(flat, weights=weights, minlength=size).reshape(n_keys, n_months)
+
+        return cls(key_cols, key_index, metrics, months, values, counts)
+
+    @classmethod
+    def from_cells(cls, cells, key_cols=("CTH_HSCODE", "Item_Description_cluster"), metrics=None):
+        """
+        Build the store from monthly cells instead of rows: one row per key
+        and month with key columns, "year", "month", metric sums and a
+        "records" count (e.g. the cube stored with a partitioned dataset).
+        """
+        key_cols = list(key_cols)
+        metrics = [m for m in (metrics or SERIES_METRICS) if m in cells.columns]
+        store = cls(key_cols, pd.MultiIndex.from_tuples([], names=key_cols), metrics,
+                    pd.PeriodIndex([], freq="M"), np.zeros((0, len(metrics), 0)), np.zeros((0, 0), dtype=np.int64))
+        store.add_cells(cells)
+        return store
+
+    def add_cells(self, cells):
+        """
+        Add monthly cells in place, growing the key and month axes when the
+        cells bring new items or months. Used to fold a newly appended month
+        into an existing store without rebuilding it.
+        """
+        cells = cells.dropna(subset=self.key_cols + ["year", "month"])
+        if cells.empty:
+            return
+        month_no = (cells["year"].astype(int) * 12 + cells["month"].astype(int) - 1).to_numpy()
+        new_first, new_last = int(month_no.min()), int(month_no.max())
+        if len(self.months):
+            first = min(new_first, self.months[0].year * 12 + self.months[0].month - 1)
+            last = max(new_last, self.months[-1].year * 12 + self.months[-1].month - 1)
+        else:
+            first, last = new_first, new_last
+
+        cell_keys = pd.MultiIndex.from_frame(cells[self.key_cols])
+        key_index = self.key_index.append(cell_keys.difference(self.key_index, sort=False))
+        n_keys, n_months = len(key_index), last - first + 1
+        if (n_keys, n_months) != self.counts.shape:
+            # Grow the arrays; existing data keeps its rows and shifts by the months added in front
+            offset = (self.months[0].year * 12 + self.months[0].month - 1 - first) if len(self.months) else 0
+            values = np.zeros((n_keys, len(self.metrics), n_months))
+            counts = np.zeros((n_keys, n_months), dtype=np.int64)
+            values[:len(self.key_index), :, offset:offset + len(self.months)] = self.values
+            counts[:len(self.key_index), offset:offset + len(self.months)] = self.counts
+            self.values, self.counts = values, counts
+            self.key_index = key_index
+            self.months = pd.period_range(pd.Period(year=first // 12, month=first % 12 + 1, freq="M"),
+                                          periods=n_months, freq="M")
+
+        key_pos = self.key_index.get_indexer(cell_keys)
+        month_pos = month_no - first
+        for i, metric in enumerate(self.metrics):
+            if metric in cells.columns:
+                weights = pd.to_numeric(cells[metric], errors="coerce").fillna(0).to_numpy(dtype=float)
+                np.add.at(self.values[:, i, :], (key_pos, month_pos), weights)
+        if "records" in cells.columns:
+            np.add.at(self.counts, (key_pos, month_pos), cells["records"].to_numpy(dtype=np.int64))
+
+    def __len__(self):
+        return len(self.key_index)
+
+    def _key_pos(self, key):
+        return self.key_index.get_loc(tuple(key))
+
+    def _metric_pos(self, metric):
+        if metric not in self.metrics:
+            raise KeyError(f"Metric '{metric}' is not in the series store")
+        return self.metrics.index(metric)
+
+    def months_present(self):
+        """Number of distinct months with at least one record, per key."""
+        return pd.Series((self.counts > 0).sum(axis=1), index=self.key_index)
+
+    def first_level_values(self):
+        """Sorted unique values of the first key column (e.g. HS codes)."""
+        return sorted(self.key_index.get_level_values(0).unique())
+
+    def years(self):
+        return sorted(self.months.year.unique())
+
+    def items_for(self, first_key, min_months=0):
+        """Second-level keys under first_key with at least min_months months of data."""
+        present = self.months_present()
+        level0 = self.key_index.get_level_values(0)
+        selected = present[(level0 == first_key) & (present.to_numpy() >= min_months)]
+        return sorted(selected.index.get_level_values(1))
+
+    def history(self, key, metric):
+        """Monthly ds/y frame for one key, trimmed to its first..last active month."""
+        pos = self._key_pos(key)
+        active = np.flatnonzero(self.counts[pos])
+        if active.size == 0:
+            return pd.DataFrame({"ds": pd.DatetimeIndex([]), "y": []})
+
+        span = slice(active[0], active[-1] + 1)
+        return pd.DataFrame({
+            "ds": self.months[span].to_timestamp(how="end").normalize(),
+            "y": self.values[pos, self._metric_pos(metric), span],
+        })
+
+    def quarterly(self, key, metric):
+        """Quarter totals and record counts for one key, only quarters with records."""
+        pos = self._key_pos(key)
+        frame = pd.DataFrame({
+            "Year": self.months.year,
+            "Quarter": self.months.quarter,
+            "Total": self.values[pos, self._metric_pos(metric)],
+            "Records": self.counts[pos],
+        })
+        summary = frame.groupby(["Year", "Quarter"])[["Total", "Records"]].sum().reset_index()
+        return summary[summary["Records"] > 0].reset_index(drop=True)
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def _cached_series_store(_df, key_cols, metrics, date_col, version):
+    return MonthlySeriesStore.from_frame(_df, key_cols=key_cols, metrics=metrics, date_col=date_col)
+
+
+def get_series_store(df, key_cols=("CTH_HSCODE", "Item_Description_cluster"), metrics=None, date_col="Month",
+                     version=None):
+    """
+    Shared, read-only series store per dataset version.
+
+    version is the dataset-store key of df (see dataset_store.session_version);
+    without one the full content hash of df is used, since Streamlit's own
+    argument hashing only samples large frames.
+    """
+    if version is None:
+        from pipeline import frame_fingerprint
+
+        version = frame_fingerprint(df)
+    return _cached_series_store(df, tuple(key_cols), tuple(metrics) if metrics else None, date_col, version)